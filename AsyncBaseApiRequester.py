@@ -0,0 +1,406 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+import httpx
+from typing import Dict, Any, Union, Callable, List, Tuple, AsyncIterator, Awaitable, Iterable, Hashable, Set
+from .BaseApiRequester import BaseApiRequester
+from .exceptions import RequestError, UnexpectedResponse, CircuitOpenError
+from .instrumentation import INSTRUMENTATION
+from .tracing import TRACER
+from .response_cache import CachedResponse
+from .multipart import MultipartEncoder
+from .invalidation import INVALIDATION_BUS
+from .timeouts import remaining_time
+
+
+class AsyncClientsRegistry:
+    """
+    Реестр httpx.AsyncClient: один клиент (и один пул соединений) на хост в рамках event loop'а
+    """
+    def __init__(self, max_connections: int = int(os.getenv('REQUESTERS_ASYNC_MAX_CONNECTIONS', 200)),
+                 max_keepalive_connections: int = int(os.getenv('REQUESTERS_ASYNC_MAX_KEEPALIVE', 50))):
+        """
+        @param max_connections: Максимум одновременных соединений на хост
+        @param max_keepalive_connections: Сколько простаивающих соединений держать открытыми
+        """
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections)
+        self._clients: Dict[Tuple[int, str], httpx.AsyncClient] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, host: str) -> httpx.AsyncClient:
+        """
+        Получение клиента для хоста в текущем event loop'е
+        @param host: Хост сервиса
+        @return: Клиент, общий для всех асинхронных реквестеров этого хоста
+        """
+        # Клиент привязан к loop'у, в котором создан, поэтому ключ -- пара (loop, host)
+        key = (id(asyncio.get_running_loop()), host)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self.limits)
+                self._clients[key] = client
+            return client
+
+    async def close(self):
+        """
+        Закрытие всех клиентов текущего event loop'а (вызывать при shutdown ASGI-приложения)
+        """
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            keys = [key for key in self._clients if key[0] == loop_id]
+            clients = [self._clients.pop(key) for key in keys]
+        for client in clients:
+            await client.aclose()
+
+
+ASYNC_CLIENTS = AsyncClientsRegistry()
+# Фоновые обновления get_cache: ссылки, чтобы задачи не собрал GC
+_REFRESH_TASKS: Set[asyncio.Task] = set()
+
+
+class AsyncBaseApiRequester(BaseApiRequester):
+    """
+    Асинхронный базовый класс для общения микросервисов.
+    Методы те же, что у BaseApiRequester, но корутины. Наследники ставят его в MRO перед
+    синхронным реквестером, так что методы вида `return self._base_get(...)` становятся асинхронными сами
+    """
+    response_class = httpx.Response
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Асинхронный клиент, общий для всех реквестеров с тем же хостом
+        """
+        return ASYNC_CLIENTS.get(self.host)
+
+    def _get_httpx_timeout(self, timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Timeout:
+        """
+        Таймауты запроса в формате httpx, урезанные до дедлайна
+        """
+        connect, read = self._get_timeout(timeout)
+        return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+    async def _make_request(self, method: Callable, uri, headers, params, data,
+                            timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Непосредственно делает запрос на сторонний сервис, через брейкер хоста
+        @param method: Строка-метод HTTP
+        @param uri: Куда стучимся
+        @param headers: Хэдеры
+        @param params: Кьюери-параметры
+        @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова, по умолчанию connect_timeout/read_timeout реквестера
+        @return: Ответ внешнего сервиса
+        """
+        # Подписчик шины инвалидации -- до того, как ответ попадет в кэши (в том числе в воркере после форка)
+        INVALIDATION_BUS.start()
+        headers, body = self._encode_body(headers, data)
+        observed = INSTRUMENTATION.enabled or TRACER.enabled
+        if observed:
+            call, span, headers = self._start_call(method, uri, headers, body)
+        try:
+            # Истекший дедлайн -- DeadlineExceeded до брейкера: запрос не ушел, хост тут ни при чем
+            self._get_timeout(timeout)
+            breaker = self._before_request(uri)
+            try:
+                response = await self._send_request(method, uri, headers, params, body, timeout)
+            except Exception as e:
+                self._after_request(breaker, error=e)
+                raise e
+            self._after_request(breaker, response.status_code)
+        except Exception as e:
+            if observed:
+                self._end_call(call, span, error=e)
+            raise e
+        if observed:
+            self._end_call(call, span, response)
+        return response
+
+    async def _send_request(self, method: Callable, uri, headers, params, body: Union[bytes, None],
+                            timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Запрос с повторами по retry_policy
+        @param body: Уже закодированное боди
+        """
+        attempt, response, error = 0, None, None
+        while True:
+            if attempt:
+                left = remaining_time()
+                if left is not None and left <= 0:
+                    # Бюджет кончился за паузу перед повтором: результат прошлой попытки, а не DeadlineExceeded
+                    break
+                if response is not None:
+                    await response.aclose()
+            request_timeout = self._get_httpx_timeout(timeout)
+            # Потоковое боди: на каждую попытку -- новый асинхронный обход
+            content = body.aiter() if isinstance(body, MultipartEncoder) else body
+            response, error = None, None
+            try:
+                response = await self.client.request(method, uri, params=params, content=content, headers=headers,
+                                                     timeout=request_timeout)
+            except httpx.HTTPError as e:
+                error = e
+            except Exception as e:
+                print(f'=== REQUEST EXCEPTION {str(e)} ===')
+                raise e
+            backoff = self._get_retry_backoff(method, attempt, None if response is None else response.status_code)
+            if backoff is None:
+                break
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.retry(self, method, uri)
+            await asyncio.sleep(backoff)
+            attempt += 1
+        if error is not None:
+            print(f'=== REQUEST ERROR {str(error)} ===')
+            raise RequestError()
+        return response
+
+    async def make_request(self, method: Union[BaseApiRequester.METHODS, str], path_suffix: str,
+                           headers: Union[Dict[str, Any], None] = None,
+                           data: Union[Dict[str, Any], List[Any], None] = None,
+                           params: Union[Dict[str, Any], None] = None,
+                           timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Публичный метод реквеста, самый-самый базовый
+        @param method: Строка из внутреннего класса-енума METHODS
+        @param path_suffix: Суффикс, добавляемый после self.api_url
+        @param headers: Хэдеры
+        @param params: Кьюери-параметры
+        @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова, одно число, либо (connect, read)
+        @return: Ответ внешнего сервиса
+        """
+        if isinstance(method, self.METHODS):
+            method = method.value
+        if method not in [x.value for x in self.METHODS]:
+            raise RequestError('Wrong HTTP method')
+        return await self._make_request(method=method, uri=self.api_url + path_suffix, headers=headers,
+                                        params=params, data=data, timeout=timeout)
+
+    async def get(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
+                  data: Union[Dict[str, Any], List[Any], None] = None,
+                  params: Union[Dict[str, Any], None] = None,
+                  timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Гет-запрос
+        """
+        return await self.make_request(self.METHODS.GET, path_suffix=path_suffix, headers=headers, data=data,
+                                       params=params, timeout=timeout)
+
+    async def post(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
+                   data: Union[Dict[str, Any], List[Any], None] = None,
+                   params: Union[Dict[str, Any], None] = None,
+                   timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Пост-запрос
+        """
+        return await self.make_request(self.METHODS.POST, path_suffix=path_suffix, headers=headers, data=data,
+                                       params=params, timeout=timeout)
+
+    async def patch(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
+                    data: Union[Dict[str, Any], List[Any], None] = None,
+                    params: Union[Dict[str, Any], None] = None,
+                    timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Патч-запрос
+        """
+        return await self.make_request(self.METHODS.PATCH, path_suffix=path_suffix, headers=headers, data=data,
+                                       params=params, timeout=timeout)
+
+    async def delete(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
+                     data: Union[Dict[str, Any], List[Any], None] = None,
+                     params: Union[Dict[str, Any], None] = None,
+                     timeout: Union[float, Tuple[float, float], None] = None) -> httpx.Response:
+        """
+        Делет-запрос
+        """
+        return await self.make_request(self.METHODS.DELETE, path_suffix=path_suffix, headers=headers, data=data,
+                                       params=params, timeout=timeout)
+
+    async def _base_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[httpx.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Базовый метод для получения списка сущностей, в том числе пагинированного и одной сущности
+        """
+        if self._get_cache_ttl(path_suffix) is not None:
+            cached = await self._get_cached_response(token, path_suffix, params)
+            if cached is not None:
+                return cached
+        return await self._fetch_get(token, path_suffix, params)
+
+    async def _coalesce_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[httpx.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        # В event loop'е GET_FLIGHTS не нужен
+        return await self._fetch_get(token, path_suffix, params)
+
+    async def _fetch_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[httpx.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Сам GET-запрос для _base_get
+        """
+        started = time.monotonic()
+        headers = self._create_auth_header_dict(token)
+        entry = self._get_conditional_entry(token, path_suffix, params, headers)
+        try:
+            response = await self.get(path_suffix=path_suffix, headers=headers, params=params)
+        except CircuitOpenError as e:
+            return self._get_breaker_fallback(e, token, path_suffix, params)
+        if entry is not None and response.status_code == 304:
+            return self._revalidate_conditional_entry(entry, response, path_suffix, params)
+        self._validate_return_code(response, 200)
+        res_json = self.get_json_from_response(response)
+        self._remember_for_fallback(token, path_suffix, params, response, res_json)
+        self._remember_conditional_entry(token, path_suffix, params, response)
+        self._remember_cached_response(token, path_suffix, params, response, time.monotonic() - started)
+        return response, res_json
+
+    async def _get_cached_response(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Union[Tuple[httpx.Response, Any], None]:
+        """
+        Ответ и джсон из get_cache: L1 -- сразу, поход в редис -- в пуле потоков, чтобы не блокировать loop.
+        Устаревшая запись отдается сразу, а обновляется фоновой задачей
+        """
+        key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+        entry = self.get_cache.get_local(key)
+        if (entry is None or entry.is_stale()) and self.get_cache.l2_available:
+            shared = await asyncio.get_running_loop().run_in_executor(None, self.get_cache.get_shared, key)
+            entry = shared or entry
+        if entry is None:
+            return None
+        if entry.is_stale() and self.get_cache.begin_refresh(key):
+            # Задача создается в пустом контексте: дедлайн текущего запроса на обновление не распространяется
+            task = contextvars.Context().run(asyncio.get_running_loop().create_task,
+                                             self._refresh_cached_response(key, token, path_suffix, params))
+            _REFRESH_TASKS.add(task)
+            task.add_done_callback(_REFRESH_TASKS.discard)
+        return self._from_cached_response(key[1], entry)
+
+    async def _refresh_cached_response(self, key: Tuple, token: str, path_suffix: str, params: Dict[str, Any]):
+        """
+        Фоновое обновление устаревшей записи get_cache, если его не делает другой процесс
+        """
+        loop = asyncio.get_running_loop()
+        claimed, failed = False, self._is_breaker_open(path_suffix)
+        try:
+            claimed = not failed and await loop.run_in_executor(None, self.get_cache.claim_refresh, key)
+            if claimed:
+                await self._coalesce_get(token, path_suffix, params)
+        except Exception as e:
+            failed = True
+            print(f'=== GET CACHE REFRESH ERROR {path_suffix} {str(e)} ===')
+        finally:
+            await loop.run_in_executor(None, self.get_cache.end_refresh, key, claimed, failed)
+
+    @staticmethod
+    def _build_cached_response(url: str, entry: CachedResponse) -> httpx.Response:
+        return httpx.Response(200, headers=entry.headers, content=entry.body, request=httpx.Request('GET', url))
+
+    def _put_cached_response(self, key: Tuple, entry: CachedResponse):
+        """
+        L1 -- сразу, запись в редис уходит в пул потоков без ожидания
+        """
+        self.get_cache.set_local(key, entry)
+        if self.get_cache.l2_available:
+            asyncio.get_running_loop().run_in_executor(None, self.get_cache.set_shared, key, entry)
+
+    async def _iter_paginated(self, get_page: Callable[[int, int], Awaitable[Tuple[httpx.Response, Any]]],
+                              page_size: int, prefetch: bool) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех страниц пагинированного эндпоинта (async for)
+        @param get_page: Корутина (limit, offset) -> (ответ, джсон страницы)
+        @param page_size: Размер страницы
+        @param prefetch: Запрашивать ли следующую страницу, пока отдается текущая
+        """
+        offset, previous = 0, None
+        _, page = await get_page(page_size, offset)
+        next_page = None
+        try:
+            while True:
+                results, has_next = self._parse_page(page, page_size)
+                if results and results == previous:
+                    # Сервис не учитывает offset и отдает ту же страницу -- дальше ничего нового нет
+                    return
+                previous = results
+                offset += len(results)
+                next_page = asyncio.ensure_future(get_page(page_size, offset)) if has_next and prefetch else None
+                for item in results:
+                    yield item
+                if not has_next:
+                    return
+                _, page = await (next_page if next_page else get_page(page_size, offset))
+        finally:
+            if next_page and not next_page.done():
+                next_page.cancel()
+
+    async def _fetch_by_ids(self, ids: List[Any], token: str,
+                            get_one: Callable[[Any], Awaitable[Tuple[httpx.Response, Any]]],
+                            path_suffix: str, params: Dict[str, Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Одна пачка get_*_by_ids: либо один запрос с ?id__in, либо по запросу на айди подряд. 404 пропускаются
+        """
+        if self.supports_id_in:
+            _, res_json = await self._base_get(token=token, path_suffix=path_suffix,
+                                               params=self._get_id_in_params(ids, params))
+            return self._index_by_id(ids, res_json)
+        fetched = dict()
+        for obj_id in ids:
+            try:
+                _, fetched[obj_id] = await get_one(obj_id)
+            except UnexpectedResponse as e:
+                if e.code != 404:
+                    raise e
+        return fetched
+
+    async def _get_by_ids(self, ids: Iterable[Hashable], token: str,
+                          get_one: Callable[[Any], Awaitable[Tuple[httpx.Response, Any]]],
+                          path_suffix: str, params: Dict[str, Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Получение набора сущностей по айди, пачки запрашиваются конкурентно в текущем event loop'е
+        """
+        ids = list(dict.fromkeys(ids))
+        found, missing = self._get_cached_by_ids(ids, token, path_suffix, params)
+        if missing:
+            results = await asyncio.gather(*(self._fetch_by_ids(chunk, token, get_one, path_suffix, params)
+                                             for chunk in self._split_by_ids(missing)))
+            for fetched in results:
+                self._cache_by_ids(fetched, token, path_suffix, params)
+                found.update(fetched)
+        return {obj_id: found[obj_id] for obj_id in ids if obj_id in found}
+
+    async def _base_post(self, token: str, path_suffix: str, data: Dict[str, Any]) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Базовый метод для добавления сущностей
+        """
+        headers = self._create_auth_header_dict(token)
+        response = await self.post(path_suffix=path_suffix, headers=headers, data=data)
+        self._validate_return_code(response, 201)
+        res_json = self.get_json_from_response(response)
+        self._publish_invalidation(path_suffix, data, res_json)
+        return response, res_json
+
+    async def _base_patch(self, token: str, path_suffix: str, data: Dict[str, Any]) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Базовый метод для изменения сущностей
+        """
+        headers = self._create_auth_header_dict(token)
+        response = await self.patch(path_suffix=path_suffix, headers=headers, data=data)
+        self._validate_return_code(response, 202)
+        res_json = self.get_json_from_response(response)
+        self._publish_invalidation(path_suffix, data, res_json)
+        return response, res_json
+
+    async def _base_delete(self, token: str, path_suffix: str) -> httpx.Response:
+        """
+        Базовый метод для удаления сущностей
+        """
+        headers = self._create_auth_header_dict(token)
+        response = await self.delete(path_suffix=path_suffix, headers=headers)
+        self._validate_return_code(response, 204)
+        self._publish_invalidation(path_suffix)
+        return response
@@ -1,6 +1,7 @@
 from typing import Union
 from rest_framework.views import Response
 from .AuthRequester import AuthRequester
+from .AppTokenManager import AppTokenManager
 from ..exceptions import BaseApiRequestError, UnexpectedResponse
 
 
@@ -10,10 +11,10 @@ class AppAuthMixin:
     """
     def get_app_token(self, app_id: str, app_secret: str, **kwargs) -> Union[dict, Response]:
         """
-        Получение токенов
+        Получение токенов (из общего на процесс AppTokenManager)
         """
         try:
-            _, token_pair = AuthRequester().app_get_token(app_id, app_secret, kwargs)
+            token_pair = AppTokenManager.for_app(app_id, app_secret).get_token_pair(**kwargs)
         except UnexpectedResponse as e:
             return Response(e.body, status=e.code)
         except BaseApiRequestError as e:
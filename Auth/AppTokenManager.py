@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from typing import Dict, Tuple, Union
+from django.conf import settings
+from .AuthRequester import AuthRequester
+from ..utils import get_jwt_claims
+from ..exceptions import BaseApiRequestError
+
+
+class AppTokenManager:
+    """
+    Процессный держатель пары токенов приложения (access/refresh) с фоновым обновлением до истечения.
+    Один менеджер на (app_id, host), получать через AppTokenManager.for_app
+    """
+    # За сколько секунд до exp обновлять access-токен (для короткоживущих токенов -- не больше половины их жизни)
+    refresh_margin = float(os.getenv('APP_TOKEN_REFRESH_MARGIN', 30))
+    # Время жизни токена, если в нем нет клейма exp
+    default_lifetime = float(os.getenv('APP_TOKEN_DEFAULT_LIFETIME', 300))
+
+    _managers: Dict[Tuple[str, str], 'AppTokenManager'] = dict()
+    _managers_lock = threading.Lock()
+
+    @classmethod
+    def for_app(cls, app_id: str, app_secret: str, host: Union[str, None] = None) -> 'AppTokenManager':
+        """
+        Менеджер токенов приложения
+        @param app_id: Айди приложения
+        @param app_secret: Секрет приложения
+        @param host: Хост сервиса авторизации, по умолчанию AUTH_HOST
+        @return: Общий на процесс менеджер для этой пары (app_id, host)
+        """
+        host = host or settings.ENV['AUTH_HOST']
+        key = (app_id, host)
+        with cls._managers_lock:
+            manager = cls._managers.get(key)
+            if manager is None:
+                manager = cls(app_id, app_secret, host)
+                cls._managers[key] = manager
+            return manager
+
+    def __init__(self, app_id: str, app_secret: str, host: str):
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.host = host
+        self._access = None
+        self._refresh = None
+        self._access_expires_at = 0
+        self._refresh_expires_at = 0
+        # Запас до exp для текущих токенов, см. _get_margin
+        self._access_margin = 0
+        self._refresh_margin = 0
+        self._timer = None
+        self._fetch_lock = threading.Lock()
+
+    def _get_requester(self) -> AuthRequester:
+        r = AuthRequester()
+        r.host = self.host
+        return r
+
+    def _expires_at(self, token: str) -> float:
+        exp = get_jwt_claims(token).get('exp')
+        return exp if isinstance(exp, (int, float)) else time.time() + self.default_lifetime
+
+    def _get_margin(self, expires_at: float) -> float:
+        """
+        Запас до истечения: refresh_margin, но не больше половины оставшейся жизни токена,
+        иначе токен, живущий меньше refresh_margin, считался бы истекшим сразу и обновлялся бы без конца
+        """
+        return min(self.refresh_margin, max(expires_at - time.time(), 0) / 2)
+
+    def _is_fresh(self) -> bool:
+        return self._access is not None and time.time() < self._access_expires_at - self._access_margin
+
+    def get_access_token(self, **kwargs) -> str:
+        """
+        Актуальный access-токен приложения. Если его нет или он вот-вот истечет, то
+        ровно один поток идет за новым, остальные ждут его результат
+        @param kwargs: Прокидываются в app_get_token (нужны мокам в тестах)
+        @return: Access-токен
+        """
+        if self._is_fresh():
+            return self._access
+        with self._fetch_lock:
+            if not self._is_fresh():
+                self._fetch(**kwargs)
+            return self._access
+
+    def get_token_pair(self, **kwargs) -> Dict[str, str]:
+        """
+        Актуальная пара токенов в формате ответа app-token-auth/
+        """
+        access = self.get_access_token(**kwargs)
+        return {'access': access, 'refresh': self._refresh}
+
+    def _fetch(self, **kwargs):
+        """
+        Обновление access-токена по refresh-токену, либо получение новой пары. Вызывать под _fetch_lock
+        """
+        r = self._get_requester()
+        if self._refresh is not None and time.time() < self._refresh_expires_at - self._refresh_margin:
+            try:
+                _, access = r.app_refresh_token(self._refresh)
+                self._set_tokens(access, self._refresh)
+                return
+            except BaseApiRequestError:
+                pass
+        _, tokens = r.app_get_token(self.app_id, self.app_secret, **kwargs)
+        self._set_tokens(tokens['access'], tokens['refresh'])
+
+    def _set_tokens(self, access: str, refresh: str):
+        self._access = access
+        self._access_expires_at = self._expires_at(access)
+        self._access_margin = self._get_margin(self._access_expires_at)
+        if refresh != self._refresh:
+            self._refresh = refresh
+            self._refresh_expires_at = self._expires_at(refresh)
+            self._refresh_margin = self._get_margin(self._refresh_expires_at)
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        """
+        Таймер на фоновое обновление за _access_margin секунд до истечения access-токена
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(self._access_expires_at - self._access_margin - time.time(), 1)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._fetch_lock:
+            try:
+                self._fetch()
+            except (BaseApiRequestError, KeyError) as e:
+                # Не вышло -- следующий get_access_token сходит за токеном синхронно
+                print(f'=== APP TOKEN REFRESH ERROR {str(e)} ===')
+
+    def invalidate(self):
+        """
+        Забыть токены (например, после 401 с ними)
+        """
+        with self._fetch_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._access = self._refresh = self._timer = None
+            self._access_expires_at = self._refresh_expires_at = 0
+            self._access_margin = self._refresh_margin = 0
@@ -1,14 +1,19 @@
 from django.conf import settings
 from ._AuthRequester import AuthRequester as __a
 from ._MockAuthRequester import MockAuthRequester as __m
+from ._AsyncAuthRequester import AsyncAuthRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 __tst = settings.TESTING
 try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         AuthRequester = __a if __art else __m
+        AsyncAuthRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         AuthRequester = __a if __ar else __m
+        AsyncAuthRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     AuthRequester = __a if not __tst else __m
+    AsyncAuthRequester = __aa if not __tst else async_mock_class(__m)
@@ -0,0 +1,100 @@
+import httpx
+from typing import Tuple, Dict
+from ._AuthRequester import AuthRequester
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+from ..exceptions import UnexpectedResponse
+
+
+class AsyncAuthRequester(AsyncBaseApiRequester, AuthRequester):
+    """
+    Асинхронный реквестер к сервису авторизации
+    """
+    async def get_user_info(self, token: str) -> Tuple[httpx.Response, dict]:
+        """
+        Получение инфы о юзере по токену (/api/user_info/)
+        """
+        cached = self._get_cached_user_info(token)
+        if cached is not None:
+            return cached
+        response = await self.get('user_info/', headers=self._create_auth_header_dict(token))
+        return self._cache_user_info(token, response)
+
+    async def sign_up(self, username: str, password: str, email: str):
+        """
+        Регистрация пользователя
+        """
+        data = {
+            'username': username,
+            'password': password,
+            'email': email,
+        }
+        response = await self.post('register/', data=data)
+        self._validate_return_code(response, 201)
+        token_json = self.get_json_from_response(response)
+        return response, token_json
+
+    async def is_moderator(self, token: str) -> Tuple[httpx.Response, bool]:
+        """
+        Проверка по токену, является ли юзер модератором
+        """
+        response, user_json = await self.get_user_info(token)
+        try:
+            return response, user_json['is_moderator']
+        except KeyError:
+            raise UnexpectedResponse(response=response, message='В джсоне юзера отсутствует поле is_moderator')
+
+    async def is_superuser(self, token: str) -> Tuple[httpx.Response, bool]:
+        """
+        Проверка по токену, является ли юзер суперюзером
+        """
+        response, user_json = await self.get_user_info(token)
+        try:
+            return response, user_json['is_superuser']
+        except KeyError:
+            raise UnexpectedResponse(response=response, message='В джсоне юзера отсутствует поле is_superuser')
+
+    async def is_token_valid(self, token: str) -> Tuple[httpx.Response, bool]:
+        """
+        Проверка валидности токена, так же работает как IsAuthenticated
+        """
+        is_valid = self.jwt_verifier.verify(token)
+        if is_valid is not None:
+            return self._get_local_verify_response(is_valid), is_valid
+        response = await self.post('api-token-verify/', data={'token': token})
+        return response, self._validate_return_code(response, 200, throw=False)
+
+    async def app_get_token(self, app_id: str, app_secret: str, **kwargs) -> Tuple[httpx.Response, Dict[str, str]]:
+        """
+        Получение токена приложения
+        """
+        data = {
+            'id': app_id,
+            'secret': app_secret,
+        }
+        response = await self.post(path_suffix='app-token-auth/', data=data)
+        self._validate_return_code(response, 200)
+        r_json = self.get_json_from_response(response)
+        return response, r_json
+
+    async def app_verify_token(self, token: str) -> Tuple[httpx.Response, bool]:
+        """
+        Верификация токена (работает как IsAuthenticated для приложений)
+        """
+        is_valid = self.jwt_verifier.verify(token)
+        if is_valid is not None:
+            return self._get_local_verify_response(is_valid), is_valid
+        response = await self.post(path_suffix='app-token-verify/', data={'token': token})
+        return response, self._validate_return_code(response, 200, throw=False)
+
+    async def app_refresh_token(self, token: str) -> Tuple[httpx.Response, str]:
+        """
+        Рефреш токена приложения
+        """
+        response = await self.post(path_suffix='app-token-refresh/', data={'refresh': token})
+        self._validate_return_code(response, 200)
+        r_json = self.get_json_from_response(response)
+        try:
+            new_token = r_json['access']
+        except KeyError:
+            raise UnexpectedResponse(response, message='В ответе нет поля "access"')
+        return response, new_token
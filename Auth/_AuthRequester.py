@@ -1,14 +1,44 @@
+import os
+import time
 import requests
-from typing import Tuple, List, Dict, Any
+from typing import Tuple, List, Dict, Any, Union
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
+from ..cache import TTLCache
+from ..utils import get_jwt_claims
+from ._jwt import LocalJwtVerifier
 from ..exceptions import JsonDecodeError, UnexpectedResponse, RequestError
 
 
+def _fetch_jwt_key() -> Union[Dict[str, str], None]:
+    """
+    Забирает ключ подписи с сервиса авторизации (путь в AUTH_JWT_KEY_PATH), если он не задан в ENV
+    """
+    path = os.getenv('AUTH_JWT_KEY_PATH')
+    if not path:
+        return None
+    r = AuthRequester()
+    response = r.get(path)
+    r._validate_return_code(response, 200)
+    return r.get_json_from_response(response)
+
+
 class AuthRequester(BaseApiRequester):
     """
     Реквестер к сервису авторизации
     """
+    # Локальная проверка JWT для is_token_valid/app_verify_token (AUTH_LOCAL_JWT_VERIFY=True)
+    jwt_verifier = LocalJwtVerifier(key_loader=_fetch_jwt_key)
+    # Кэш get_user_info по токену, общий на процесс
+    user_info_cache = TTLCache(maxsize=int(os.getenv('AUTH_USER_INFO_CACHE_SIZE', 4096)),
+                               ttl=float(os.getenv('AUTH_USER_INFO_CACHE_TTL', 30)))
+    # Сколько помнить 401/403 на токен
+    user_info_negative_ttl = float(os.getenv('AUTH_USER_INFO_NEGATIVE_TTL', 5))
+    # Не держать запись дольше, чем живет сам токен (клейм exp)
+    user_info_ttl_from_jwt = os.getenv('AUTH_USER_INFO_TTL_FROM_JWT', 'False') == 'True'
+    # Список приложений меняется редко -- условные GET по ETag/Last-Modified
+    conditional_get_ttls = {'apps/': float(os.getenv('AUTH_APPS_CACHE_TTL', 300))}
+
     def __init__(self):
         super().__init__()
         self.host = settings.ENV['AUTH_HOST']
@@ -16,16 +46,68 @@ class AuthRequester(BaseApiRequester):
     def get_user_info(self, token: str) -> Tuple[requests.Response, dict]:
         """
         Получение инфы о юзере по токену (/api/user_info/)
+        Ответы (и 401/403) кэшируются в user_info_cache
         @param token: Токен
         @return: Джсон-описание юзера
         """
+        cached = self._get_cached_user_info(token)
+        if cached is not None:
+            return cached
         auth_tuple = self._create_auth_header_tuple(token)
         auth_header = {auth_tuple[0]: auth_tuple[1]}
         response = self.get('user_info/', headers=auth_header)
-        self._validate_return_code(response, 200)
+        return self._cache_user_info(token, response)
+
+    def _get_cached_user_info(self, token: str) -> Union[Tuple[requests.Response, dict], None]:
+        """
+        Ответ get_user_info из кэша
+        @param token: Токен
+        @return: Закэшированная пара (ответ, джсон), либо None
+        """
+        cached = self.user_info_cache.get(token)
+        if isinstance(cached, UnexpectedResponse):
+            raise cached.with_traceback(None)
+        return cached
+
+    def _cache_user_info(self, token: str, response: requests.Response) -> Tuple[requests.Response, dict]:
+        """
+        Валидация ответа user_info/ и сохранение его в кэш (401/403 -- на user_info_negative_ttl)
+        @param token: Токен
+        @param response: Ответ сервиса авторизации
+        @return: Ответ, и джсон-описание юзера
+        """
+        try:
+            self._validate_return_code(response, 200)
+        except UnexpectedResponse as e:
+            if e.code in (401, 403):
+                self.user_info_cache.set(token, e, ttl=self._get_user_info_ttl(token, self.user_info_negative_ttl))
+            raise e
         user_json = self.get_json_from_response(response)
+        self.user_info_cache.set(token, (response, user_json), ttl=self._get_user_info_ttl(token))
         return response, user_json
 
+    def _get_user_info_ttl(self, token: str, ttl: Union[float, None] = None) -> float:
+        """
+        TTL записи в кэше юзеров
+        @param token: Токен
+        @param ttl: Базовый TTL, по умолчанию TTL кэша
+        @return: TTL, урезанный до exp токена, если включен user_info_ttl_from_jwt
+        """
+        ttl = self.user_info_cache.ttl if ttl is None else ttl
+        if self.user_info_ttl_from_jwt:
+            exp = get_jwt_claims(token).get('exp')
+            if isinstance(exp, (int, float)):
+                ttl = min(ttl, exp - time.time())
+        return ttl
+
+    @classmethod
+    def invalidate_user_info(cls, token: Union[str, None] = None):
+        """
+        Сброс кэша юзеров
+        @param token: Токен, запись которого сбрасываем; None -- сбросить весь кэш
+        """
+        cls.user_info_cache.invalidate(token)
+
     def sign_up(self, username: str, password: str, email: str):
         """
         Регистрация пользователя
@@ -70,9 +152,21 @@ class AuthRequester(BaseApiRequester):
         @param token: Токен
         @return: True, если токен валиден
         """
+        is_valid = self.jwt_verifier.verify(token)
+        if is_valid is not None:
+            return self._get_local_verify_response(is_valid), is_valid
         response = self.post('api-token-verify/', data={'token': token})
         return response, self._validate_return_code(response, 200, throw=False)
 
+    @staticmethod
+    def _get_local_verify_response(is_valid: bool) -> requests.Response:
+        """
+        Ответ-заглушка для токена, проверенного локально (коды как у api-token-verify/)
+        """
+        response = requests.Response()
+        response.status_code = 200 if is_valid else 401
+        return response
+
     def app_get_list(self, token: str) -> Tuple[requests.Response, List[Dict[str, Any]]]:
         """
         Получение списка приложений
@@ -102,6 +196,9 @@ class AuthRequester(BaseApiRequester):
         """
         Верификация токена (работает как IsAuthenticated для приложений)
         """
+        is_valid = self.jwt_verifier.verify(token)
+        if is_valid is not None:
+            return self._get_local_verify_response(is_valid), is_valid
         data = {
             'token': token,
         }
@@ -0,0 +1,153 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import threading
+from typing import Union, Callable, Dict, Any
+from django.conf import settings
+from ..codec import loads
+
+
+class LocalJwtVerifier:
+    """
+    Проверка JWT внутри процесса (подпись HMAC, exp/nbf, тип токена), без похода в сервис авторизации.
+    verify возвращает None, если решить локально не получилось -- тогда надо спросить сервис
+    """
+    HASHES = {
+        'HS256': hashlib.sha256,
+        'HS384': hashlib.sha384,
+        'HS512': hashlib.sha512,
+    }
+
+    def __init__(self, enabled: bool = os.getenv('AUTH_LOCAL_JWT_VERIFY', 'False') == 'True',
+                 key_loader: Union[Callable[[], Union[Dict[str, str], None]], None] = None,
+                 leeway: float = float(os.getenv('AUTH_JWT_LEEWAY', 0)),
+                 token_type: Union[str, None] = os.getenv('AUTH_JWT_TOKEN_TYPE', 'access'),
+                 key_retry_interval: float = float(os.getenv('AUTH_JWT_KEY_RETRY_INTERVAL', 30))):
+        """
+        @param enabled: Включена ли локальная проверка
+        @param key_loader: Функция, возвращающая {'key': ..., 'algorithm': ...}, если ключа нет в ENV
+        @param leeway: Допустимое расхождение часов, в секундах
+        @param token_type: Ожидаемое значение клейма token_type (если он есть в токене)
+        @param key_retry_interval: Не чаще чем раз во столько секунд звать key_loader: после неудачной загрузки
+        и для перезагрузки ключа, когда подпись не сошлась (ротация)
+        """
+        self.enabled = enabled
+        self.key_loader = key_loader
+        self.leeway = leeway
+        self.token_type = token_type
+        self.key_retry_interval = key_retry_interval
+        self._key = None
+        self._algorithm = None
+        # Ключ получен из key_loader (его могут ротировать), и когда key_loader звали в последний раз
+        self._key_from_loader = False
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _b64decode(part: str) -> bytes:
+        return base64.urlsafe_b64decode((part + '=' * (-len(part) % 4)).encode('ascii'))
+
+    def _can_call_loader(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.key_retry_interval
+
+    def _load_key(self):
+        """
+        Ключ из ENV (AUTH_JWT_KEY, AUTH_JWT_ALGORITHM), либо из key_loader. Неудача key_loader'а (исключение
+        или пустой ответ) запоминается на key_retry_interval: пока сервис авторизации лежит, проверки
+        не ходят за ключом на каждый токен
+        """
+        if self._key is not None:
+            return
+        with self._lock:
+            if self._key is not None:
+                return
+            env = getattr(settings, 'ENV', dict())
+            key = env.get('AUTH_JWT_KEY') or os.getenv('AUTH_JWT_KEY')
+            algorithm = env.get('AUTH_JWT_ALGORITHM') or os.getenv('AUTH_JWT_ALGORITHM', 'HS256')
+            from_loader = False
+            if not key and self.key_loader is not None:
+                if not self._can_call_loader():
+                    return
+                self._loaded_at = time.monotonic()
+                try:
+                    loaded = self.key_loader() or dict()
+                except Exception as e:
+                    print(f'=== JWT KEY LOAD ERROR {str(e)} ===')
+                    return
+                key, algorithm = loaded.get('key'), loaded.get('algorithm', algorithm)
+                from_loader = True
+            if key:
+                self._key, self._algorithm, self._key_from_loader = key.encode('utf-8'), algorithm, from_loader
+
+    def reset_key(self):
+        """
+        Забыть ключ (например, после ротации), при следующей проверке он загрузится заново
+        """
+        with self._lock:
+            self._key = self._algorithm = None
+            self._loaded_at = None
+
+    def _reload_rotated_key(self) -> bool:
+        """
+        Подпись не сошлась: возможно, ключ ротировали. Ключ из key_loader перезагружается,
+        но не чаще key_retry_interval (иначе каждый поддельный токен стоил бы похода в сервис)
+        @return: Загружен ли ключ заново
+        """
+        with self._lock:
+            if not self._key_from_loader or not self._can_call_loader():
+                return False
+            self._key = self._algorithm = None
+        self._load_key()
+        return self._key is not None
+
+    def _check_signature(self, header: Dict[str, Any], signing_input: str, signature: bytes) -> Union[bool, None]:
+        """
+        @return: Сошлась ли подпись, None -- алгоритм не тот, что у ключа (решает сервис)
+        """
+        key, algorithm = self._key, self._algorithm
+        if key is None or header.get('alg') != algorithm or algorithm not in self.HASHES:
+            return None
+        expected = hmac.new(key, signing_input.encode('ascii'), self.HASHES[algorithm]).digest()
+        return hmac.compare_digest(expected, signature)
+
+    def verify(self, token: str) -> Union[bool, None]:
+        """
+        Проверка токена
+        @param token: Токен
+        @return: True/False, если удалось решить локально, иначе None
+        """
+        if not self.enabled or not token:
+            return None
+        self._load_key()
+        if self._key is None:
+            return None
+        try:
+            header_b64, payload_b64, signature_b64 = token.split('.')
+            header = loads(self._b64decode(header_b64))
+            claims: Dict[str, Any] = loads(self._b64decode(payload_b64))
+            signature = self._b64decode(signature_b64)
+        except (ValueError, UnicodeError):
+            return False
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            return False
+        signed = self._check_signature(header, f'{header_b64}.{payload_b64}', signature)
+        if signed is False and self._key_from_loader:
+            # Ключ из сервиса могли ротировать: перезагружаем и проверяем еще раз, а если перезагружать пока
+            # рано -- решает сервис
+            signed = self._check_signature(header, f'{header_b64}.{payload_b64}', signature) \
+                if self._reload_rotated_key() else None
+        if not signed:
+            return signed
+        now = time.time()
+        exp, nbf = claims.get('exp'), claims.get('nbf')
+        if not isinstance(exp, (int, float)):
+            return None
+        if exp + self.leeway < now:
+            return False
+        if isinstance(nbf, (int, float)) and nbf - self.leeway > now:
+            return False
+        if self.token_type and 'token_type' in claims and claims['token_type'] != self.token_type:
+            return False
+        return True
@@ -1,6 +1,8 @@
 from django.conf import settings
 from ._AwardsRequester import AwardsRequester as __a
 from ._MockAwardsRequester import MockAwardsRequester as __m
+from ._AsyncAwardsRequester import AsyncAwardsRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 
 __tst = settings.TESTING
@@ -8,8 +10,11 @@ try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         AwardsRequester = __a if __art else __m
+        AsyncAwardsRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         AwardsRequester = __a if __ar else __m
+        AsyncAwardsRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     AwardsRequester = __a if not __tst else __m
+    AsyncAwardsRequester = __aa if not __tst else async_mock_class(__m)
@@ -0,0 +1,9 @@
+from ._AwardsRequester import AwardsRequester
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+
+
+class AsyncAwardsRequester(AsyncBaseApiRequester, AwardsRequester):
+    """
+    Асинхронный реквестер на сервак призов, все методы AwardsRequester -- корутины
+    """
+    pass
@@ -1,6 +1,7 @@
+import os
 import requests
 from enum import Enum
-from typing import Tuple, List, Dict, Any, Union
+from typing import Tuple, List, Dict, Any, Union, Iterator, Iterable
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
 
@@ -9,6 +10,29 @@ class AwardsRequester(BaseApiRequester):
     """
     Реквестер на сервак призов
     """
+    # Умеет ли сервис ?id__in=1,2,3 для get_*_by_ids
+    supports_id_in = os.getenv('AWARDS_SUPPORTS_ID_IN', 'False') == 'True'
+    # Ачивки и пины меняются редко -- условные GET по ETag/Last-Modified
+    conditional_get_ttls = {
+        'achievements/': float(os.getenv('AWARDS_CATALOG_CACHE_TTL', 300)),
+        'pins/': float(os.getenv('AWARDS_CATALOG_CACHE_TTL', 300)),
+    }
+    # С AWARDS_READ_CACHE=True списки ачивок и пинов -- из get_cache: устаревший ответ отдается сразу
+    # и обновляется в фоне, а при открытом брейкере отдается еще AWARDS_READ_CACHE_STALE_IF_ERROR_TTL секунд
+    if os.getenv('AWARDS_READ_CACHE', 'False') == 'True':
+        get_cache_ttls = {
+            'achievements/$': float(os.getenv('AWARDS_READ_CACHE_TTL', 10)),
+            'pins/$': float(os.getenv('AWARDS_READ_CACHE_TTL', 10)),
+        }
+        get_cache_stale_ttls = {
+            'achievements/$': float(os.getenv('AWARDS_READ_CACHE_STALE_TTL', 60)),
+            'pins/$': float(os.getenv('AWARDS_READ_CACHE_STALE_TTL', 60)),
+        }
+        get_cache_stale_if_error_ttls = {
+            'achievements/$': float(os.getenv('AWARDS_READ_CACHE_STALE_IF_ERROR_TTL', 600)),
+            'pins/$': float(os.getenv('AWARDS_READ_CACHE_STALE_IF_ERROR_TTL', 600)),
+        }
+
     def __init__(self):
         super().__init__()
         self.achievement_suffix = 'achievements/'
@@ -33,6 +57,14 @@ class AwardsRequester(BaseApiRequester):
         params = {'limit': limit, 'offset': offset, self.deleted_qparam: with_deleted}
         return self._base_get(token=token, path_suffix=self.achievement_suffix, params=params)
 
+    def iter_achievements(self, token: str, with_deleted: bool = False, page_size: int = 100,
+                          prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех ачивок постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_achievements_paginated(
+            limit, offset, token, with_deleted=with_deleted), page_size, prefetch)
+
     def get_achievement(self, achievement_id: int, token: str, with_deleted: bool = False) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -41,6 +73,17 @@ class AwardsRequester(BaseApiRequester):
         params = {self.deleted_qparam: with_deleted}
         return self._base_get(token=token, path_suffix=f'{self.achievement_suffix}{achievement_id}/', params=params)
 
+    def get_achievements_by_ids(self, achievement_ids: Iterable[int], token: str, with_deleted: bool = False) -> \
+            Dict[int, Dict[str, Any]]:
+        """
+        Получение набора ачивок по айди
+        @return: Словарь айди -> ачивка, ненайденных ачивок в нем нет
+        """
+        params = {self.deleted_qparam: with_deleted}
+        return self._get_by_ids(achievement_ids, token,
+                                lambda x: self.get_achievement(x, token, with_deleted=with_deleted),
+                                path_suffix=self.achievement_suffix, params=params)
+
     def create_achievement(self, name: str, token: str, descr: Union[str, None] = None,
                            pic_id: [int, None] = None) -> Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -100,6 +143,14 @@ class AwardsRequester(BaseApiRequester):
             params[self.pin_type_qparam] = pin_type.value
         return self._base_get(path_suffix=self.pins_suffix, token=token, params=params)
 
+    def iter_pins(self, token: str, pin_type: Union['AwardsRequester.PIN_TYPE', None] = None,
+                  with_deleted: bool = False, page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех пинов постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_pins_paginated(
+            limit, offset, token, pin_type=pin_type, with_deleted=with_deleted), page_size, prefetch)
+
     def get_pin(self, pin_id: int, token: str, with_deleted: bool = False) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Получение пина
@@ -107,6 +158,16 @@ class AwardsRequester(BaseApiRequester):
         params = {self.deleted_qparam: with_deleted}
         return self._base_get(path_suffix=f'{self.pins_suffix}{pin_id}/', token=token, params=params)
 
+    def get_pins_by_ids(self, pin_ids: Iterable[int], token: str, with_deleted: bool = False) -> \
+            Dict[int, Dict[str, Any]]:
+        """
+        Получение набора пинов по айди
+        @return: Словарь айди -> пин, ненайденных пинов в нем нет
+        """
+        params = {self.deleted_qparam: with_deleted}
+        return self._get_by_ids(pin_ids, token, lambda x: self.get_pin(x, token, with_deleted=with_deleted),
+                                path_suffix=self.pins_suffix, params=params)
+
     def create_pin(self, name: str, ptype: PIN_TYPE, price: int, token: str, descr: Union[str, None] = None,
                    pic_id: Union[int, None] = None) -> Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -1,7 +1,46 @@
+import os
+import copy
+import time
 import requests
+import pybreaker
 from enum import Enum
-from typing import Dict, Any, Union, Callable, List, Tuple
-from .exceptions import RequestError, UnexpectedResponse, JsonDecodeError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Union, Callable, List, Tuple, Iterator, Iterable, Hashable
+from .exceptions import RequestError, UnexpectedResponse, JsonDecodeError, CircuitOpenError
+from .sessions import SESSIONS
+from .singleflight import SingleFlight
+from . import codec
+from .cache import TTLCache
+from .fanout import FANOUT, Call
+from .timeouts import RetryPolicy, clamp_timeout, remaining_time
+from .breakers import BREAKERS
+from .conditional import CONDITIONAL_CACHE, ConditionalEntry, get_conditional_ttl
+from .instrumentation import INSTRUMENTATION, RequestCall, normalize_endpoint
+from .tracing import TRACER, Span
+from .invalidation import INVALIDATION_BUS, InvalidationEvent
+from .response_cache import GET_CACHE, CachedResponse
+from .multipart import MultipartEncoder
+
+
+GET_FLIGHTS = SingleFlight()
+# Кэш сущностей для get_*_by_ids, общий на процесс
+BY_ID_CACHE = TTLCache(maxsize=int(os.getenv('REQUESTERS_BY_ID_CACHE_SIZE', 4096)),
+                       ttl=float(os.getenv('REQUESTERS_BY_ID_CACHE_TTL', 10)))
+
+
+def _evict_request_caches(event: Union[InvalidationEvent, None]):
+    """
+    Подписчик шины инвалидации: ключи BY_ID_CACHE и CONDITIONAL_CACHE -- кортежи, второй элемент которых урл
+    """
+    if event is None:
+        BY_ID_CACHE.invalidate()
+        CONDITIONAL_CACHE.invalidate()
+        return
+    BY_ID_CACHE.invalidate_where(lambda key: event.matches_url(key[1]))
+    CONDITIONAL_CACHE.invalidate_where(lambda key: event.matches_url(key[1]))
+
+
+INVALIDATION_BUS.add_listener(_evict_request_caches)
 
 
 class BaseApiRequester:
@@ -17,6 +56,49 @@ class BaseApiRequester:
         PATCH = 'PATCH'
         DELETE = 'DELETE'
 
+    # Класс ответов реквестера
+    response_class = requests.Response
+    # Размер пула соединений к хосту, None -- дефолт из SESSIONS
+    pool_maxsize = None
+    # Схлопывать ли одинаковые параллельные GET-запросы в _base_get
+    coalesce_gets = True
+    # Кэш для get_*_by_ids, None -- не кэшировать
+    by_id_cache = BY_ID_CACHE
+    # Сколько запросов по одной сущности get_*_by_ids делает параллельно
+    by_ids_parallelism = int(os.getenv('REQUESTERS_BY_IDS_PARALLELISM', 8))
+    # Умеет ли сервис фильтр ?id__in=1,2,3 на списочных эндпоинтах
+    supports_id_in = False
+    id_in_qparam = 'id__in'
+    id_in_chunk_size = 100
+    # Таймауты на соединение и чтение, в секундах (урезаются дедлайном из timeouts.deadline)
+    connect_timeout = float(os.getenv('REQUESTERS_CONNECT_TIMEOUT', 3.05))
+    read_timeout = float(os.getenv('REQUESTERS_READ_TIMEOUT', 10))
+    # Повторы запросов, NO_RETRY -- без повторов
+    retry_policy = RetryPolicy()
+    # Брейкер на хост (или на эндпоинт -- первый сегмент пути после /api/), общий для всех реквестеров
+    breaker_enabled = os.getenv('REQUESTERS_BREAKERS', 'False') == 'True'
+    breaker_per_endpoint = False
+    # Параметры брейкера, None -- дефолты BREAKERS
+    breaker_fail_max = None
+    breaker_reset_timeout = None
+    # Фолбэки _base_get при открытом брейкере: последние удачные ответы (TTLCache), и дефолтные джсоны
+    # по префиксу path_suffix (значение, либо функция (path_suffix, params) -> джсон)
+    breaker_stale_cache = None
+    breaker_fallbacks: Dict[str, Any] = dict()
+    # Условные GET (If-None-Match/If-Modified-Since) для редко меняющихся справочников: префикс path_suffix -> TTL.
+    # На 304 _base_get собирает ответ из закэшированных байтов: у каждого вызывающего свои ответ и джсон
+    conditional_get_ttls: Dict[str, float] = dict()
+    # Кэш ответов _base_get (L1 в памяти процесса + L2 в редисе): префикс path_suffix -> TTL, пусто -- не кэшировать.
+    # Ключ включает токен, так что ответы разных юзеров не смешиваются
+    get_cache = GET_CACHE
+    get_cache_ttls: Dict[str, float] = dict()
+    # Stale-while-revalidate: сколько после TTL отдавать устаревший ответ, обновляя его в фоне (один раз на ключ).
+    # Stale-if-error: сколько после TTL отдавать его, пока брейкер сервиса открыт. Тоже префикс path_suffix -> секунды
+    get_cache_stale_ttls: Dict[str, float] = dict()
+    get_cache_stale_if_error_ttls: Dict[str, float] = dict()
+    # Публиковать ли удачные POST/PATCH/DELETE в шину инвалидации (см. invalidation.INVALIDATION_BUS)
+    publish_invalidations = True
+
     def __init__(self):
         self.host = 'http://127.0.0.1:8000'
         self.token_prefix = 'Bearer'
@@ -26,6 +108,22 @@ class BaseApiRequester:
     def api_url(self):
         return self.host + '/api/'
 
+    @property
+    def session(self) -> requests.Session:
+        """
+        Keep-alive сессия, общая для всех реквестеров с тем же хостом
+        """
+        return SESSIONS.get(self.host, self.pool_maxsize)
+
+    def get_app_access_token(self) -> str:
+        """
+        Access-токен текущего приложения (settings.APP_ID/APP_SECRET) из общего AppTokenManager
+        @return: Токен для запросов от имени приложения
+        """
+        from django.conf import settings
+        from .Auth.AppTokenManager import AppTokenManager
+        return AppTokenManager.for_app(settings.APP_ID, settings.APP_SECRET).get_access_token()
+
     def _validate_return_code(self, response: requests.Response, expected_code: int, throw: bool = True) -> bool:
         """
         Валидация кода возврата с ожидаемым
@@ -50,7 +148,8 @@ class BaseApiRequester:
         @return: Джсон, либо текст ответа, если throw = False
         """
         try:
-            return response.json()
+            # Прямо из байтов, без промежуточного response.text
+            return codec.loads(response.content)
         except ValueError:
             if throw:
                 raise JsonDecodeError(body_text=response.text)
@@ -74,103 +173,290 @@ class BaseApiRequester:
         auth_tuple = self._create_auth_header_tuple(token)
         return {auth_tuple[0]: auth_tuple[1]}
 
-    def _make_request(self, method: Callable, uri, headers, params, data) -> requests.Response:
+    def _get_timeout(self, timeout: Union[float, Tuple[float, float], None] = None) -> Tuple[float, float]:
+        """
+        Таймауты запроса (connect, read): переданные в вызов, либо реквестера, урезанные до дедлайна
+        @param timeout: Таймаут вызова, одно число на оба, либо пара (connect, read)
+        """
+        if timeout is None:
+            connect, read = self.connect_timeout, self.read_timeout
+        elif isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        return clamp_timeout(connect, read)
+
+    def _get_breaker(self, uri: str) -> Union[pybreaker.CircuitBreaker, None]:
         """
-        Непосредственно делает запрос на сторонний сервис
-        @param method: Функция из либы requests
+        Брейкер для запроса, None -- если брейкеры выключены
+        """
+        if not self.breaker_enabled:
+            return None
+        name = self.host
+        if self.breaker_per_endpoint and uri.startswith(self.api_url):
+            name += '/' + uri[len(self.api_url):].split('/')[0]
+        return BREAKERS.get(name, fail_max=self.breaker_fail_max, reset_timeout=self.breaker_reset_timeout)
+
+    def _before_request(self, uri: str) -> Union[pybreaker.CircuitBreaker, None]:
+        """
+        Проверка брейкера перед запросом
+        @raise CircuitOpenError: Брейкер открыт, запрос не делается
+        """
+        breaker = self._get_breaker(uri)
+        if breaker is not None:
+            try:
+                BREAKERS.before_call(breaker)
+            except pybreaker.CircuitBreakerError:
+                raise CircuitOpenError(breaker.name)
+        return breaker
+
+    @staticmethod
+    def _after_request(breaker: Union[pybreaker.CircuitBreaker, None], status_code: Union[int, None] = None,
+                       error: Union[Exception, None] = None):
+        """
+        Запись результата в брейкер: ошибка соединения/таймаут и 5xx -- отказ
+        """
+        if breaker is None:
+            return
+        if error is None and status_code is not None and status_code >= 500:
+            error = RequestError(f'Server error {status_code}')
+        BREAKERS.record(breaker, error)
+
+    def _make_request(self, method: Callable, uri, headers, params, data,
+                      timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
+        """
+        Непосредственно делает запрос на сторонний сервис, через брейкер хоста
+        @param method: Метод сессии (self.session.get и т.п.)
         @param uri: Куда стучимся
         @param headers: Хэдеры
         @param params: Кьюери-параметры
         @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова, по умолчанию connect_timeout/read_timeout реквестера
         @return: Ответ внешнего сервиса
         """
+        # Подписчик шины инвалидации -- до того, как ответ попадет в кэши (в том числе в воркере после форка)
+        INVALIDATION_BUS.start()
+        headers, body = self._encode_body(headers, data)
+        observed = INSTRUMENTATION.enabled or TRACER.enabled
+        if observed:
+            call, span, headers = self._start_call(self._get_method_name(method), uri, headers, body)
         try:
-            return method(uri, params, json=data, headers=headers) \
-                if params is not None \
-                else method(uri, json=data, headers=headers)
-        except requests.exceptions.RequestException as e:
-            print(f'=== REQUEST ERROR {str(e)} ===')
-            raise RequestError()
+            # Истекший дедлайн -- DeadlineExceeded до брейкера: запрос не ушел, хост тут ни при чем
+            self._get_timeout(timeout)
+            breaker = self._before_request(uri)
+            try:
+                response = self._send_request(method, uri, headers, params, body, timeout)
+            except Exception as e:
+                self._after_request(breaker, error=e)
+                raise e
+            self._after_request(breaker, response.status_code)
         except Exception as e:
-            print(f'=== REQUEST EXCEPTION {str(e)} ===')
+            if observed:
+                self._end_call(call, span, error=e)
             raise e
+        if observed:
+            self._end_call(call, span, response)
+        return response
+
+    def _start_call(self, method: str, uri: str, headers: Union[Dict[str, Any], None], body: Union[bytes, None]) -> \
+            Tuple[Union[RequestCall, None], Union[Span, None], Union[Dict[str, Any], None]]:
+        """
+        Начало вызова для инструментации и трейсинга: клиентский спан и traceparent в хэдерах
+        @return: Вызов для хуков, спан, и хэдеры, с которыми надо идти
+        """
+        span = None
+        if TRACER.enabled:
+            path = uri[len(self.api_url):] if uri.startswith(self.api_url) else uri
+            span = TRACER.start_span(f'{method} {normalize_endpoint(path)}', kind='client', attributes={
+                'http.method': method, 'http.host': self.host, 'http.path': path, 'requester': type(self).__name__,
+            })
+            headers = {**(headers or dict()), 'traceparent': span.context.traceparent}
+        call = None
+        if INSTRUMENTATION.enabled:
+            call = INSTRUMENTATION.start(self, method, uri, headers, body)
+            headers = call.headers
+        return call, span, headers
+
+    @staticmethod
+    def _end_call(call: Union[RequestCall, None], span: Union[Span, None], response: Any = None,
+                  error: Union[Exception, None] = None):
+        """
+        Конец вызова: метрики, хуки и закрытие спана
+        """
+        if call is not None:
+            if error is None:
+                INSTRUMENTATION.finish(call, response)
+            else:
+                INSTRUMENTATION.fail(call, error)
+        if span is not None:
+            if response is not None:
+                span.set_attribute('http.status_code', response.status_code)
+                if response.status_code >= 500:
+                    span.status = f'Server error {response.status_code}'
+            TRACER.end_span(span, error)
+
+    @staticmethod
+    def _get_method_name(method: Union[Callable, str]) -> str:
+        """
+        Имя HTTP-метода: метод сессии (session.get) у синхронных реквестеров, строка -- у асинхронных
+        """
+        return method if isinstance(method, str) else method.__name__.upper()
+
+    @staticmethod
+    def _encode_body(headers: Union[Dict[str, Any], None], data: Any) -> Tuple[Union[Dict[str, Any], None],
+                                                                              Union[bytes, None]]:
+        """
+        Кодирование боди в джсон кодеком из codec (вместо json= у requests/httpx).
+        MultipartEncoder идет как есть, потоком
+        @return: Хэдеры с Content-Type и байты боди
+        """
+        if data is None:
+            return headers, None
+        headers = dict(headers or dict())
+        if isinstance(data, MultipartEncoder):
+            headers['Content-Type'] = data.content_type
+            if data.len is not None:
+                headers['Content-Length'] = str(data.len)
+            return headers, data
+        headers.setdefault('Content-Type', 'application/json')
+        return headers, codec.dumps(data)
+
+    def _send_request(self, method: Callable, uri, headers, params, body: Union[bytes, None],
+                      timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
+        """
+        Запрос с повторами по retry_policy
+        @param body: Уже закодированное боди
+        """
+        method_name = self._get_method_name(method)
+        attempt, response, error = 0, None, None
+        while True:
+            if attempt:
+                left = remaining_time()
+                if left is not None and left <= 0:
+                    # Бюджет кончился за паузу перед повтором: результат прошлой попытки, а не DeadlineExceeded
+                    break
+                if response is not None:
+                    response.close()
+            request_timeout = self._get_timeout(timeout)
+            response, error = None, None
+            try:
+                response = method(uri, params=params, data=body, headers=headers, timeout=request_timeout)
+            except requests.exceptions.RequestException as e:
+                error = e
+            except Exception as e:
+                print(f'=== REQUEST EXCEPTION {str(e)} ===')
+                raise e
+            backoff = self._get_retry_backoff(method_name, attempt, None if response is None else response.status_code)
+            if backoff is None:
+                break
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.retry(self, method_name, uri)
+            time.sleep(backoff)
+            attempt += 1
+        if error is not None:
+            print(f'=== REQUEST ERROR {str(error)} ===')
+            raise RequestError()
+        return response
+
+    def _get_retry_backoff(self, method: str, attempt: int, status_code: Union[int, None] = None) -> \
+            Union[float, None]:
+        """
+        Задержка перед повтором, либо None, если повторять не надо
+        """
+        if not self.retry_policy.should_retry(method, attempt, status_code):
+            return None
+        return self.retry_policy.get_backoff(attempt)
 
     def make_request(self, method: Union[METHODS, str], path_suffix: str, headers: Union[Dict[str, Any], None] = None,
                      data: Union[Dict[str, Any], List[Any], None] = None,
-                     params: Union[Dict[str, Any], None] = None) -> requests.Response:
+                     params: Union[Dict[str, Any], None] = None,
+                     timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
         """
         Публичный метод реквеста, самый-самый базовый
         @param method: Строка из внутреннего класса-енума METHODS
         @param path_suffix: Суффикс, добавляемый после self.api_url
         @param headers: Хэдеры
         @param params: Кьюери-параметры
-        @param data: - Боди (джсон)
+        @param data: - Боди (джсон) или MultipartEncoder
+        @param timeout: Таймаут вызова, одно число, либо (connect, read)
         @return: Ответ внешнего сервиса
         """
         if isinstance(method, self.METHODS):
             method = method.value
         if method == self.METHODS.GET.value:
-            return self._make_request(method=requests.get, uri=self.api_url + path_suffix, headers=headers,
-                                      params=params, data=data)
+            return self._make_request(method=self.session.get, uri=self.api_url + path_suffix, headers=headers,
+                                      params=params, data=data, timeout=timeout)
         elif method == self.METHODS.POST.value:
-            return self._make_request(method=requests.post, uri=self.api_url + path_suffix, headers=headers,
-                                      params=params, data=data)
+            return self._make_request(method=self.session.post, uri=self.api_url + path_suffix, headers=headers,
+                                      params=params, data=data, timeout=timeout)
         elif method == self.METHODS.PATCH.value:
-            return self._make_request(method=requests.patch, uri=self.api_url + path_suffix, headers=headers,
-                                      params=params, data=data)
+            return self._make_request(method=self.session.patch, uri=self.api_url + path_suffix, headers=headers,
+                                      params=params, data=data, timeout=timeout)
         elif method == self.METHODS.DELETE.value:
-            return self._make_request(method=requests.delete, uri=self.api_url + path_suffix, headers=headers,
-                                      params=params, data=data)
+            return self._make_request(method=self.session.delete, uri=self.api_url + path_suffix, headers=headers,
+                                      params=params, data=data, timeout=timeout)
         else:
             raise RequestError('Wrong HTTP method')
 
     def get(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
-            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None) -> requests.Response:
+            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None,
+            timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
         """
         Гет-запрос
         @param path_suffix: Суффикс, добавляемый после self.api_url
         @param headers: Хэдеры
         @param params: Кьюери-параметры
         @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова
         @return: Ответ внешнего сервиса
         """
-        return self.make_request(self.METHODS.GET, path_suffix=path_suffix, headers=headers, data=data, params=params)
+        return self.make_request(self.METHODS.GET, path_suffix=path_suffix, headers=headers, data=data, params=params,
+                                 timeout=timeout)
 
     def post(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
-            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None) -> requests.Response:
+            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None,
+            timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
         """
         Пост-запрос
         @param path_suffix: Суффикс, добавляемый после self.api_url
         @param headers: Хэдеры
         @param params: Кьюери-параметры
-        @param data: - Боди (джсон)
+        @param data: - Боди (джсон) или MultipartEncoder
+        @param timeout: Таймаут вызова
         @return: Ответ внешнего сервиса
         """
-        return self.make_request(self.METHODS.POST, path_suffix=path_suffix, headers=headers, data=data, params=params)
+        return self.make_request(self.METHODS.POST, path_suffix=path_suffix, headers=headers, data=data, params=params,
+                                 timeout=timeout)
 
     def patch(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
-            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None) -> requests.Response:
+            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None,
+            timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
         """
         Патч-запрос
         @param path_suffix: Суффикс, добавляемый после self.api_url
         @param headers: Хэдеры
         @param params: Кьюери-параметры
         @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова
         @return: Ответ внешнего сервиса
         """
-        return self.make_request(self.METHODS.PATCH, path_suffix=path_suffix, headers=headers, data=data, params=params)
+        return self.make_request(self.METHODS.PATCH, path_suffix=path_suffix, headers=headers, data=data, params=params,
+                                 timeout=timeout)
 
     def delete(self, path_suffix: str, headers: Union[Dict[str, Any], None] = None,
-            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None) -> requests.Response:
+            data: Union[Dict[str, Any], List[Any], None] = None, params: Union[Dict[str, Any], None] = None,
+            timeout: Union[float, Tuple[float, float], None] = None) -> requests.Response:
         """
         Делет-запрос
         @param path_suffix: Суффикс, добавляемый после self.api_url
         @param headers: Хэдеры
         @param params: Кьюери-параметры
         @param data: - Боди (джсон)
+        @param timeout: Таймаут вызова
         @return: Ответ внешнего сервиса
         """
-        return self.make_request(self.METHODS.DELETE, path_suffix=path_suffix, headers=headers, data=data, params=params)
+        return self.make_request(self.METHODS.DELETE, path_suffix=path_suffix, headers=headers, data=data,
+                                 params=params, timeout=timeout)
 
     def _base_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
             Tuple[requests.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
@@ -181,12 +467,339 @@ class BaseApiRequester:
         @param params: Кьюери-параметры
         @return: Ответ внешнего сервиса, и джсон-ответ
         """
+        if self._get_cache_ttl(path_suffix) is not None:
+            cached = self._get_cached_response(token, path_suffix, params)
+            if cached is not None:
+                return cached
+        return self._coalesce_get(token, path_suffix, params)
+
+    def _coalesce_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[requests.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Запрос для _base_get, одинаковые параллельные запросы схлопываются в один
+        """
+        if not self.coalesce_gets:
+            return self._fetch_get(token, path_suffix, params)
+        key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+        (response, res_json), shared = GET_FLIGHTS.do(key, lambda: self._fetch_get(token, path_suffix, params),
+                                                       metrics_key=key[:-1])
+        if shared:
+            # Один джсон на несколько потоков -- каждому своя копия
+            res_json = copy.deepcopy(res_json)
+        return response, res_json
+
+    def _get_request_key(self, method: METHODS, token: str, path_suffix: str,
+                         params: Union[Dict[str, Any], None]) -> Tuple:
+        """
+        Ключ запроса: метод, урл, кьюери-параметры и токен (от него зависит, что вернет сервис)
+        """
+        params_key = tuple(sorted((str(k), str(v)) for k, v in (params or dict()).items()))
+        return method.value, self.api_url + path_suffix, params_key, token
+
+    def _fetch_get(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[requests.Response, Union[List[Dict[str, Any]], Dict[str, Any]]]:
+        """
+        Сам GET-запрос для _base_get
+        """
+        started = time.monotonic()
         headers = self._create_auth_header_dict(token)
-        response = self.get(path_suffix=path_suffix, headers=headers, params=params)
+        entry = self._get_conditional_entry(token, path_suffix, params, headers)
+        try:
+            response = self.get(path_suffix=path_suffix, headers=headers, params=params)
+        except CircuitOpenError as e:
+            return self._get_breaker_fallback(e, token, path_suffix, params)
+        if entry is not None and response.status_code == 304:
+            return self._revalidate_conditional_entry(entry, response, path_suffix, params)
         self._validate_return_code(response, 200)
         res_json = self.get_json_from_response(response)
+        self._remember_for_fallback(token, path_suffix, params, response, res_json)
+        self._remember_conditional_entry(token, path_suffix, params, response)
+        self._remember_cached_response(token, path_suffix, params, response, time.monotonic() - started)
+        return response, res_json
+
+    def _get_cache_ttl(self, path_suffix: str) -> Union[float, None]:
+        if self.get_cache is None or not self.get_cache_ttls:
+            return None
+        return get_conditional_ttl(self.get_cache_ttls, path_suffix)
+
+    def _get_cached_response(self, token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Union[Tuple[requests.Response, Any], None]:
+        """
+        Ответ и джсон из get_cache, None -- промах (или пора обновить запись).
+        Устаревшая запись (stale-while-revalidate) отдается сразу, а обновляется в фоне
+        """
+        key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+        entry = self.get_cache.get(key)
+        if entry is None:
+            return None
+        if entry.is_stale() and self.get_cache.begin_refresh(key):
+            # Контекст пула пустой: дедлайн текущего запроса на фоновое обновление не распространяется
+            FANOUT.pool.submit(self._refresh_cached_response, key, token, path_suffix, params)
+        return self._from_cached_response(key[1], entry)
+
+    def _is_breaker_open(self, path_suffix: str) -> bool:
+        breaker = self._get_breaker(self.api_url + path_suffix)
+        return breaker is not None and BREAKERS.is_open(breaker)
+
+    def _from_cached_response(self, url: str, entry: CachedResponse) -> Tuple[requests.Response, Any]:
+        response = self._build_cached_response(url, entry)
+        # Джсон разбирается заново на каждое попадание, так что у каждого вызывающего своя копия
+        return response, self.get_json_from_response(response)
+
+    def _refresh_cached_response(self, key: Tuple, token: str, path_suffix: str, params: Dict[str, Any]):
+        """
+        Фоновое обновление устаревшей записи get_cache, если его не делает другой процесс
+        """
+        claimed, failed = False, self._is_breaker_open(path_suffix)
+        try:
+            claimed = not failed and self.get_cache.claim_refresh(key)
+            if claimed:
+                self._coalesce_get(token, path_suffix, params)
+        except Exception as e:
+            # Брейкер открыт, сервис лежит -- запись продолжат отдавать до stale_until
+            failed = True
+            print(f'=== GET CACHE REFRESH ERROR {path_suffix} {str(e)} ===')
+        finally:
+            self.get_cache.end_refresh(key, claimed, failed)
+
+    @staticmethod
+    def _build_cached_response(url: str, entry: CachedResponse) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = url
+        response.headers = requests.structures.CaseInsensitiveDict(entry.headers)
+        response._content = entry.body
+        return response
+
+    def _remember_cached_response(self, token: str, path_suffix: str, params: Dict[str, Any], response: Any,
+                                  delta: float):
+        """
+        Запись удачного ответа в get_cache
+        @param delta: Сколько занял запрос -- от него зависит, насколько заранее запись начнут обновлять
+        """
+        ttl = self._get_cache_ttl(path_suffix)
+        if ttl is None:
+            return
+        key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+        entry = CachedResponse.from_response(response, delta, ttl,
+                                             get_conditional_ttl(self.get_cache_stale_ttls, path_suffix) or 0,
+                                             get_conditional_ttl(self.get_cache_stale_if_error_ttls, path_suffix) or 0)
+        self._put_cached_response(key, entry)
+
+    def _put_cached_response(self, key: Tuple, entry: CachedResponse):
+        self.get_cache.set(key, entry)
+
+    def _get_conditional_key(self, path_suffix: str, params: Dict[str, Any]) -> Tuple:
+        # Без токена: запись общая, см. ConditionalEntry.get_conditional_headers.
+        # Синхронным и асинхронным реквестерам -- разные записи, у них разные классы ответа
+        return (self.response_class, ) + self._get_request_key(self.METHODS.GET, '', path_suffix, params)[1:-1]
+
+    def _get_conditional_entry(self, token: str, path_suffix: str, params: Dict[str, Any],
+                               headers: Dict[str, str]) -> Union[ConditionalEntry, None]:
+        """
+        Закэшированный ответ для условного GET, его валидаторы дописываются в headers
+        """
+        if not self.conditional_get_ttls or get_conditional_ttl(self.conditional_get_ttls, path_suffix) is None:
+            return None
+        entry = CONDITIONAL_CACHE.get(self._get_conditional_key(path_suffix, params))
+        if entry is None:
+            return None
+        conditional_headers = entry.get_conditional_headers(token)
+        if not conditional_headers:
+            return None
+        headers.update(conditional_headers)
+        return entry
+
+    def _revalidate_conditional_entry(self, entry: ConditionalEntry, not_modified: Any, path_suffix: str,
+                                      params: Dict[str, Any]) -> Tuple[Any, Any]:
+        """
+        Ответ 304: запись актуальна, продлеваем ее и отдаем без скачивания. Ответ собирается из байтов записи
+        заново (запрос в нем -- текущий, с токеном вызывающего), джсон тоже разбирается заново -- у каждого свой
+        @param not_modified: Сам ответ 304
+        """
+        ttl = get_conditional_ttl(self.conditional_get_ttls, path_suffix)
+        CONDITIONAL_CACHE.set(self._get_conditional_key(path_suffix, params), entry, ttl=ttl)
+        response, res_json = self._from_cached_response(entry.url, entry)
+        response.request = not_modified.request
         return response, res_json
 
+    def _remember_conditional_entry(self, token: str, path_suffix: str, params: Dict[str, Any], response: Any):
+        if not self.conditional_get_ttls:
+            return
+        ttl = get_conditional_ttl(self.conditional_get_ttls, path_suffix)
+        if ttl is None:
+            return
+        entry = ConditionalEntry(response, token)
+        if entry.has_validators:
+            CONDITIONAL_CACHE.set(self._get_conditional_key(path_suffix, params), entry, ttl=ttl)
+
+    def _remember_for_fallback(self, token: str, path_suffix: str, params: Dict[str, Any],
+                               response: requests.Response, res_json: Any):
+        if self.breaker_stale_cache is not None:
+            key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+            self.breaker_stale_cache.set(key, (response, copy.deepcopy(res_json)))
+
+    def _get_breaker_fallback(self, error: CircuitOpenError, token: str, path_suffix: str,
+                              params: Dict[str, Any]) -> Tuple[Union[requests.Response, None], Any]:
+        """
+        Ответ _base_get, когда брейкер открыт: устаревшая запись get_cache (в пределах stale-if-error),
+        последний удачный ответ из breaker_stale_cache, либо дефолт из breaker_fallbacks (тогда вместо ответа None)
+        @raise CircuitOpenError: Фолбэка нет
+        """
+        if self._get_cache_ttl(path_suffix) is not None:
+            # Stale-if-error из get_cache
+            key = self._get_request_key(self.METHODS.GET, token, path_suffix, params)
+            entry = self.get_cache.get_stale_if_error(key)
+            if entry is not None:
+                return self._from_cached_response(key[1], entry)
+        if self.breaker_stale_cache is not None:
+            cached = self.breaker_stale_cache.get(self._get_request_key(self.METHODS.GET, token, path_suffix, params))
+            if cached is not None:
+                return cached[0], copy.deepcopy(cached[1])
+        for prefix, fallback in self.breaker_fallbacks.items():
+            if path_suffix.startswith(prefix):
+                return None, fallback(path_suffix, params) if callable(fallback) else copy.deepcopy(fallback)
+        raise error
+
+    @staticmethod
+    def _parse_page(page: Union[Dict[str, Any], List[Any]], page_size: int) -> Tuple[List[Any], bool]:
+        """
+        Разбор страницы пагинации (limit/offset DRF)
+        @param page: Джсон страницы
+        @param page_size: Запрошенный limit
+        @return: Элементы страницы, и есть ли следующая
+        """
+        if isinstance(page, list):
+            # Больше limit -- сервис не пагинирует и отдал весь список сразу
+            return page, len(page) == page_size
+        if not isinstance(page, dict) or 'results' not in page:
+            return [page], False
+        results = page['results']
+        has_next = page['next'] is not None if 'next' in page else len(results) == page_size
+        return results, bool(results) and has_next
+
+    def _iter_paginated(self, get_page: Callable[[int, int], Tuple[requests.Response, Any]], page_size: int,
+                        prefetch: bool) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех страниц пагинированного эндпоинта
+        @param get_page: Функция (limit, offset) -> (ответ, джсон страницы), обычно get_*_paginated
+        @param page_size: Размер страницы
+        @param prefetch: Запрашивать ли следующую страницу в фоне, пока отдается текущая
+        @return: Генератор элементов
+        """
+        pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            offset, previous = 0, None
+            _, page = get_page(page_size, offset)
+            while True:
+                results, has_next = self._parse_page(page, page_size)
+                if results and results == previous:
+                    # Сервис не учитывает offset и отдает ту же страницу -- дальше ничего нового нет
+                    return
+                previous = results
+                offset += len(results)
+                next_page = pool.submit(get_page, page_size, offset) if has_next and pool else None
+                yield from results
+                if not has_next:
+                    return
+                _, page = next_page.result() if next_page else get_page(page_size, offset)
+        finally:
+            if pool:
+                pool.shutdown(wait=False)
+
+    def _get_by_ids_key(self, token: str, path_suffix: str, params: Dict[str, Any], obj_id: Any) -> Tuple:
+        return self._get_request_key(self.METHODS.GET, token, f'{path_suffix}{obj_id}/', params)
+
+    def _get_cached_by_ids(self, ids: List[Any], token: str, path_suffix: str, params: Dict[str, Any]) -> \
+            Tuple[Dict[Any, Dict[str, Any]], List[Any]]:
+        """
+        Что из ids есть в by_id_cache
+        @return: Найденные сущности по айди, и айди, за которыми надо сходить
+        """
+        found, missing = dict(), list()
+        for obj_id in ids:
+            cached = None
+            if self.by_id_cache is not None:
+                cached = self.by_id_cache.get(self._get_by_ids_key(token, path_suffix, params, obj_id))
+            if cached is None:
+                missing.append(obj_id)
+            else:
+                found[obj_id] = copy.deepcopy(cached)
+        return found, missing
+
+    def _cache_by_ids(self, objects: Dict[Any, Dict[str, Any]], token: str, path_suffix: str,
+                      params: Dict[str, Any]):
+        if self.by_id_cache is None:
+            return
+        for obj_id, obj in objects.items():
+            self.by_id_cache.set(self._get_by_ids_key(token, path_suffix, params, obj_id), copy.deepcopy(obj))
+
+    def _split_by_ids(self, ids: List[Any]) -> List[List[Any]]:
+        """
+        Разбивка айди на пачки: по id_in_chunk_size для ?id__in, либо на by_ids_parallelism потоков
+        """
+        if self.supports_id_in:
+            return [ids[i:i + self.id_in_chunk_size] for i in range(0, len(ids), self.id_in_chunk_size)]
+        lanes = max(min(self.by_ids_parallelism, len(ids)), 1)
+        return [ids[i::lanes] for i in range(lanes)]
+
+    def _get_id_in_params(self, ids: List[Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        return {**params, self.id_in_qparam: ','.join(str(x) for x in ids)}
+
+    @staticmethod
+    def _index_by_id(ids: List[Any], res_json: Union[Dict[str, Any], List[Dict[str, Any]]]) -> \
+            Dict[Any, Dict[str, Any]]:
+        """
+        Ответ списочного эндпоинта (в том числе пагинированного) -- в словарь по запрошенным айди
+        """
+        items = res_json.get('results', []) if isinstance(res_json, dict) else res_json
+        by_str_id = {str(x): x for x in ids}
+        return {by_str_id[str(item['id'])]: item for item in items
+                if isinstance(item, dict) and str(item.get('id')) in by_str_id}
+
+    def _fetch_by_ids(self, ids: List[Any], token: str, get_one: Callable[[Any], Tuple[requests.Response, Any]],
+                      path_suffix: str, params: Dict[str, Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Одна пачка get_*_by_ids: либо один запрос с ?id__in, либо по запросу на айди подряд. 404 пропускаются
+        """
+        if self.supports_id_in:
+            _, res_json = self._base_get(token=token, path_suffix=path_suffix,
+                                         params=self._get_id_in_params(ids, params))
+            return self._index_by_id(ids, res_json)
+        fetched = dict()
+        for obj_id in ids:
+            try:
+                _, fetched[obj_id] = get_one(obj_id)
+            except UnexpectedResponse as e:
+                if e.code != 404:
+                    raise e
+        return fetched
+
+    def _get_by_ids(self, ids: Iterable[Hashable], token: str, get_one: Callable[[Any], Tuple[requests.Response, Any]],
+                    path_suffix: str, params: Dict[str, Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Получение набора сущностей по айди: дубли схлопываются, часть берется из by_id_cache,
+        остальное запрашивается параллельно на пуле FANOUT
+        @param ids: Айди сущностей
+        @param token: Токен
+        @param get_one: Получение одной сущности по айди, например lambda x: self.get_place(x, token)
+        @param path_suffix: Суффикс списочного эндпоинта, одна сущность лежит по f'{path_suffix}{id}/'
+        @param params: Кьюери-параметры запроса одной сущности
+        @return: Словарь айди -> джсон сущности, ненайденных айди в нем нет
+        """
+        ids = list(dict.fromkeys(ids))
+        found, missing = self._get_cached_by_ids(ids, token, path_suffix, params)
+        if missing:
+            chunks = self._split_by_ids(missing)
+            results = FANOUT.gather({i: Call(self._fetch_by_ids, chunk, token, get_one, path_suffix, params)
+                                     for i, chunk in enumerate(chunks)})
+            for result in results.values():
+                fetched = result.unwrap()
+                self._cache_by_ids(fetched, token, path_suffix, params)
+                found.update(fetched)
+        return {obj_id: found[obj_id] for obj_id in ids if obj_id in found}
+
     def _base_post(self, token: str, path_suffix: str, data: Dict[str, Any]) -> Tuple[
         requests.Response, Dict[str, Any]]:
         """
@@ -200,6 +813,7 @@ class BaseApiRequester:
         response = self.post(path_suffix=path_suffix, headers=headers, data=data)
         self._validate_return_code(response, 201)
         res_json = self.get_json_from_response(response)
+        self._publish_invalidation(path_suffix, data, res_json)
         return response, res_json
 
     def _base_patch(self, token: str, path_suffix: str, data: Dict[str, Any]) -> Tuple[
@@ -215,6 +829,7 @@ class BaseApiRequester:
         response = self.patch(path_suffix=path_suffix, headers=headers, data=data)
         self._validate_return_code(response, 202)
         res_json = self.get_json_from_response(response)
+        self._publish_invalidation(path_suffix, data, res_json)
         return response, res_json
 
     def _base_delete(self, token: str, path_suffix: str) -> requests.Response:
@@ -227,4 +842,12 @@ class BaseApiRequester:
         headers = self._create_auth_header_dict(token)
         response = self.delete(path_suffix=path_suffix, headers=headers)
         self._validate_return_code(response, 204)
+        self._publish_invalidation(path_suffix)
         return response
+
+    def _publish_invalidation(self, path_suffix: str, data: Any = None, res_json: Any = None):
+        """
+        Событие об удачной записи: чистит кэши этого процесса и, если шина включена, всех подписанных
+        """
+        if self.publish_invalidations:
+            INVALIDATION_BUS.publish(self.host, path_suffix, data, res_json)
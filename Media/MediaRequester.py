@@ -1,6 +1,8 @@
 from django.conf import settings
 from ._MediaRequester import MediaRequester as __me
 from ._MockMediaRequester import MockMediaRequester as __m
+from ._AsyncMediaRequester import AsyncMediaRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 
 __tst = settings.TESTING
@@ -8,8 +10,11 @@ try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         MediaRequester = __me if __art else __m
+        AsyncMediaRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         MediaRequester = __me if __ar else __m
+        AsyncMediaRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     MediaRequester = __me if not __tst else __m
+    AsyncMediaRequester = __aa if not __tst else async_mock_class(__m)
@@ -0,0 +1,29 @@
+import httpx
+from typing import Tuple, Dict, Any, Union, Callable
+from ._MediaRequester import MediaRequester
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+from ..exceptions import RequestError
+
+
+class AsyncMediaRequester(AsyncBaseApiRequester, MediaRequester):
+    """
+    Асинхронный реквестер к сервису медиа
+    """
+    async def create_image(self, object_type: MediaRequester.IMAGE_OBJ_TYPES, object_id: int, created_by: int,
+                           file_data, filename: str, token: str,
+                           progress: Union[Callable[[int, Union[int, None]], None], None] = None) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание изображения, файл уходит потоком
+        """
+        headers = self._create_auth_header_dict(token)
+        headers['Content-Disposition'] = f'attachment; filename={filename}'
+        body = self._get_image_body(object_type, object_id, created_by, file_data, filename, progress)
+        try:
+            response = await self.post(path_suffix=self.images_suffix, headers=headers, data=body)
+        except RequestError:
+            raise RequestError('Can\'t upload image')
+        self._validate_return_code(response, 201)
+        i_json = self.get_json_from_response(response)
+        self._publish_invalidation(self.images_suffix, res_json=i_json)
+        return response, i_json
@@ -1,15 +1,20 @@
+import os
 import requests
 from enum import Enum
-from typing import Tuple, List, Dict, Any, Union
+from typing import Tuple, List, Dict, Any, Union, Iterable, Callable
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
 from ..exceptions import RequestError, UnexpectedResponse, JsonDecodeError
+from ..multipart import MultipartEncoder
 
 
 class MediaRequester(BaseApiRequester):
     """
     Реквестер к сервису медиа
     """
+    # Умеет ли сервис ?id__in=1,2,3 для get_*_by_ids
+    supports_id_in = os.getenv('MEDIA_SUPPORTS_ID_IN', 'False') == 'True'
+
     def __init__(self):
         super().__init__()
         self.images_suffix = 'images/'
@@ -28,6 +33,14 @@ class MediaRequester(BaseApiRequester):
         """
         return self._base_get(token=token, path_suffix=f'{self.images_suffix}{image_id}/', params=dict())
 
+    def get_images_by_ids(self, image_ids: Iterable[int], token: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Получение инфы о наборе изображений по айди
+        @return: Словарь айди -> инфа об изображении, ненайденных изображений в нем нет
+        """
+        return self._get_by_ids(image_ids, token, lambda x: self.get_image_info(x, token),
+                                path_suffix=self.images_suffix, params=dict())
+
     def get_typed_images(self, object_type: IMAGE_OBJ_TYPES, object_id: int, token: str) -> \
             Tuple[requests.Response, List[Dict[str, Any]]]:
         """
@@ -37,19 +50,33 @@ class MediaRequester(BaseApiRequester):
                               params=dict())
 
     def create_image(self, object_type: IMAGE_OBJ_TYPES, object_id: int, created_by: int, file_data, filename: str,
-                     token: str) -> Tuple[requests.Response, Dict[str, Any]]:
+                     token: str, progress: Union[Callable[[int, Union[int, None]], None], None] = None) -> \
+            Tuple[requests.Response, Dict[str, Any]]:
         """
-        Создание изображения
+        Создание изображения. Файл уходит потоком через сессию из пула, целиком в память не читается
+        @param file_data: Байты, memoryview, UploadedFile джанги, файл или итерируемое байтов
+        @param progress: Колбэк (отправлено байт, всего байт либо None, если размер неизвестен)
         """
         headers = self._create_auth_header_dict(token)
         headers['Content-Disposition'] = f'attachment; filename={filename}'
-        data = {'object_type': object_type.value, 'object_id': object_id, 'created_by': created_by}
-        files = {'image': file_data}
+        body = self._get_image_body(object_type, object_id, created_by, file_data, filename, progress)
         try:
-            response = requests.post(url=self.host + '/api/' + self.images_suffix, data=data, files=files,
-                                     headers=headers)
-        except requests.exceptions.RequestException:
+            response = self.post(path_suffix=self.images_suffix, headers=headers, data=body)
+        except RequestError:
             raise RequestError('Can\'t upload image')
         self._validate_return_code(response, 201)
         i_json = self.get_json_from_response(response)
+        self._publish_invalidation(self.images_suffix, res_json=i_json)
         return response, i_json
+
+    @staticmethod
+    def _get_image_body(object_type: IMAGE_OBJ_TYPES, object_id: int, created_by: int, file_data, filename: str,
+                        progress: Union[Callable[[int, Union[int, None]], None], None]) -> MultipartEncoder:
+        """
+        Потоковое multipart-боди для create_image. Имя файла в части, как раньше у requests, -- имя самого файла,
+        если оно есть, иначе filename
+        """
+        data = {'object_type': object_type.value, 'object_id': object_id, 'created_by': created_by}
+        name = getattr(file_data, 'name', None)
+        name = os.path.basename(name) if isinstance(name, str) and name else filename
+        return MultipartEncoder(data, {'image': (name, file_data, None)}, progress=progress)
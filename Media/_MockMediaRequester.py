@@ -39,7 +39,7 @@ class MockMediaRequester(MediaRequester, MockRequesterMixin):
         return resp, [dictt]
 
     def create_image(self, object_type: MediaRequester.IMAGE_OBJ_TYPES, object_id: int, created_by: int, file_data,
-                     filename: str, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
+                     filename: str, token: str, progress=None) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Создание изображения
         """
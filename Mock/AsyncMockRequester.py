@@ -0,0 +1,30 @@
+import inspect
+from typing import Type
+
+
+class AsyncMockRequester:
+    """
+    Асинхронная обертка над мок-реквестером: публичные методы мока становятся корутинами
+    """
+    mock_class = None
+
+    def __init__(self):
+        self._mock = self.mock_class()
+
+    def __getattr__(self, item):
+        attr = getattr(self._mock, item)
+        if item.startswith('_') or not callable(attr) or inspect.isclass(attr):
+            return attr
+
+        async def wrapper(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return wrapper
+
+
+def async_mock_class(mock_class: Type) -> Type[AsyncMockRequester]:
+    """
+    Создание асинхронного мок-класса для мок-реквестера
+    @param mock_class: Синхронный мок, например MockPlacesRequester
+    @return: Класс, инстансы которого ведут себя как асинхронный реквестер
+    """
+    return type(f'Async{mock_class.__name__}', (AsyncMockRequester, ), {'mock_class': mock_class})
@@ -1,6 +1,8 @@
 from django.conf import settings
 from ._PlacesRequester import PlacesRequester as __p
 from ._MockPlacesRequester import MockPlacesRequester as __m
+from ._AsyncPlacesRequester import AsyncPlacesRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 
 __tst = settings.TESTING
@@ -8,9 +10,12 @@ try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         PlacesRequester = __p if __art else __m
+        AsyncPlacesRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         PlacesRequester = __p if __ar else __m
+        AsyncPlacesRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     PlacesRequester = __p if not __tst else __m
+    AsyncPlacesRequester = __aa if not __tst else async_mock_class(__m)
 
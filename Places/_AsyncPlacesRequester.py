@@ -0,0 +1,25 @@
+import asyncio
+import httpx
+from typing import Tuple, List, Dict, Any
+from ._PlacesRequester import PlacesRequester
+from ._geo_cache import BBox
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+
+
+class AsyncPlacesRequester(AsyncBaseApiRequester, PlacesRequester):
+    """
+    Асинхронный реквестер к серваку мест, все методы PlacesRequester -- корутины
+    """
+    async def _get_places_tiled(self, token: str, params: Dict[str, Any], bbox: BBox) -> \
+            Tuple[httpx.Response, List[Dict[str, Any]]]:
+        """
+        get_places по прямоугольнику через geo_cache: недостающие тайлы запрашиваются конкурентно
+        """
+        plan = self._plan_places_tiles(token, params, bbox)
+        if plan is None:
+            return await self._base_get(token=token, path_suffix=self.places_suffix,
+                                        params=self._get_bbox_params(params, bbox))
+        scope, _, found, plans = plan
+        fetched = await asyncio.gather(*(self._base_get(token, self.places_suffix, self._get_bbox_params(params, rect))
+                                         for rect, _ in plans))
+        return self._merge_places_tiles(scope, found, plans, list(fetched), bbox)
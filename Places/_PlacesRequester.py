@@ -1,13 +1,21 @@
+import os
 import requests
-from typing import Tuple, List, Dict, Any, Union
+from typing import Tuple, List, Dict, Any, Union, Iterator, Iterable
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
+from ..fanout import FANOUT, Call
+from ._geo_cache import GEO_TILE_CACHE, BBox, Cell
 
 
 class PlacesRequester(BaseApiRequester):
     """
     Реквестер к серваку мест
     """
+    # Умеет ли сервис ?id__in=1,2,3 для get_*_by_ids
+    supports_id_in = os.getenv('PLACES_SUPPORTS_ID_IN', 'False') == 'True'
+    # Кэш get_places по тайлам для запросов с прямоугольником, None -- без кэша (по умолчанию выключен)
+    geo_cache = GEO_TILE_CACHE if os.getenv('PLACES_GEO_CACHE', 'False') == 'True' else None
+
     def __init__(self):
         super().__init__()
         self.places_suffix = 'places/'
@@ -42,6 +50,14 @@ class PlacesRequester(BaseApiRequester):
             params[self.place_id_qparam] = place_id
         return self._base_get(token=token, path_suffix=self.place_images_suffix, params=params)
 
+    def iter_place_images(self, token: str, place_id: Union[int, None] = None, with_deleted: bool = False,
+                          page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех картинок мест постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_place_images_paginated(
+            limit, offset, token, place_id=place_id, with_deleted=with_deleted), page_size, prefetch)
+
     def get_place_image(self, place_image_id: int, token: str, with_deleted: bool = False) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -93,6 +109,14 @@ class PlacesRequester(BaseApiRequester):
             params[self.place_id_qparam] = place_id
         return self._base_get(token=token, path_suffix=self.ratings_suffix, params=params)
 
+    def iter_ratings(self, token: str, place_id: Union[int, None] = None, with_deleted: bool = False,
+                     page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех рейтингов постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_ratings_paginated(
+            limit, offset, token, place_id=place_id, with_deleted=with_deleted), page_size, prefetch)
+
     def get_rating(self, rating_id: int, token: str, with_deleted: bool = False) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -136,6 +160,14 @@ class PlacesRequester(BaseApiRequester):
             params[self.place_id_qparam] = place_id
         return self._base_get(token=token, path_suffix=self.accepts_suffix, params=params)
 
+    def iter_accepts(self, token: str, place_id: Union[int, None] = None, with_deleted: bool = False,
+                     page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех подтверждений постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_accepts_paginated(
+            limit, offset, token, place_id=place_id, with_deleted=with_deleted), page_size, prefetch)
+
     def get_acceptance(self, acceptance_id: int, token: str, with_deleted: bool = False) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -178,8 +210,70 @@ class PlacesRequester(BaseApiRequester):
             params[self.lat2_qparam] = lat2
         if long2:
             params[self.long2_qparam] = long2
+        if self.geo_cache is not None and None not in (lat1, long1, lat2, long2):
+            bbox = (min(lat1, lat2), min(long1, long2), max(lat1, lat2), max(long1, long2))
+            return self._get_places_tiled(token, {k: v for k, v in params.items() if k not in self._bbox_qparams}, bbox)
         return self._base_get(token=token, path_suffix=self.places_suffix, params=params)
 
+    @property
+    def _bbox_qparams(self) -> Tuple[str, str, str, str]:
+        return self.lat1_qparam, self.long1_qparam, self.lat2_qparam, self.long2_qparam
+
+    def _get_bbox_params(self, params: Dict[str, Any], bbox: BBox) -> Dict[str, Any]:
+        return {**params, **dict(zip(self._bbox_qparams, bbox))}
+
+    def _plan_places_tiles(self, token: str, params: Dict[str, Any], bbox: BBox) -> \
+            Union[Tuple[Any, List[Cell], Dict[Cell, Tuple[requests.Response, List[Dict[str, Any]]]],
+                        List[Tuple[BBox, List[Cell]]]], None]:
+        """
+        Что из прямоугольника есть в geo_cache, и какими прямоугольниками дозапросить остальное
+        @return: (scope, клетки, найденные тайлы, план запросов), либо None, если тайлов слишком много
+        """
+        cells = self.geo_cache.get_cells(bbox)
+        if cells is None:
+            return None
+        # В местах есть поля текущего юзера (is_created_by_me, my_rating), так что тайлы -- свои на каждый токен
+        scope = (type(self).__name__, self.host, token, tuple(sorted(params.items())))
+        found, missing = self.geo_cache.get_tiles(scope, cells)
+        return scope, cells, found, self.geo_cache.plan(missing)
+
+    def _merge_places_tiles(self, scope: Any, found: Dict[Cell, Tuple[requests.Response, List[Dict[str, Any]]]],
+                            plans: List[Tuple[BBox, List[Cell]]],
+                            fetched: List[Tuple[requests.Response, List[Dict[str, Any]]]], bbox: BBox) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Сохранение дозапрошенных прямоугольников в geo_cache и сборка ответа на исходный прямоугольник
+        @return: Последний полученный ответ (либо ответ одного из тайлов) и места
+        """
+        tiles = [places for _, places in found.values()]
+        response = next(iter(found.values()))[0] if found else None
+        for (_, cells), (response, places) in zip(plans, fetched):
+            if not isinstance(places, list):
+                # Сервис ответил не списком (например, пагинацией) -- такое не кэшируем
+                return response, places
+            self.geo_cache.put(scope, cells, response, places)
+            tiles.append(places)
+        return response, self.geo_cache.merge(tiles, bbox)
+
+    def _get_places_tiled(self, token: str, params: Dict[str, Any], bbox: BBox) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        get_places по прямоугольнику через geo_cache: недостающие тайлы запрашиваются параллельно
+        """
+        plan = self._plan_places_tiles(token, params, bbox)
+        if plan is None:
+            return self._base_get(token=token, path_suffix=self.places_suffix,
+                                  params=self._get_bbox_params(params, bbox))
+        scope, _, found, plans = plan
+        if len(plans) == 1:
+            fetched = [self._base_get(token, self.places_suffix, self._get_bbox_params(params, plans[0][0]))]
+        else:
+            results = FANOUT.gather({i: Call(self._base_get, token, self.places_suffix,
+                                             self._get_bbox_params(params, rect))
+                                     for i, (rect, _) in enumerate(plans)})
+            fetched = [results[i].unwrap() for i in range(len(plans))]
+        return self._merge_places_tiles(scope, found, plans, fetched, bbox)
+
     def get_places_paginated(self, user_id: int, limit: int, offset: int, token: str, with_deleted: bool = False,
                              only_mine: Union[bool, None] = None,
                              lat1: Union[float, None] = None, long1: Union[float, None] = None,
@@ -201,6 +295,17 @@ class PlacesRequester(BaseApiRequester):
             params[self.long2_qparam] = long2
         return self._base_get(token=token, path_suffix=self.places_suffix, params=params)
 
+    def iter_places(self, user_id: int, token: str, with_deleted: bool = False, only_mine: Union[bool, None] = None,
+                    lat1: Union[float, None] = None, long1: Union[float, None] = None,
+                    lat2: Union[float, None] = None, long2: Union[float, None] = None,
+                    page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех мест постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_places_paginated(
+            user_id, limit, offset, token, with_deleted=with_deleted, only_mine=only_mine,
+            lat1=lat1, long1=long1, lat2=lat2, long2=long2), page_size, prefetch)
+
     def get_place(self, place_id: int, token: str, with_deleted: bool = False) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -209,6 +314,16 @@ class PlacesRequester(BaseApiRequester):
         params = {self.deleted_qparam: with_deleted}
         return self._base_get(token=token, path_suffix=f'{self.places_suffix}{place_id}/', params=params)
 
+    def get_places_by_ids(self, place_ids: Iterable[int], token: str, with_deleted: bool = False) -> \
+            Dict[int, Dict[str, Any]]:
+        """
+        Получение набора мест по айди
+        @return: Словарь айди -> место, ненайденных мест в нем нет
+        """
+        params = {self.deleted_qparam: with_deleted}
+        return self._get_by_ids(place_ids, token, lambda x: self.get_place(x, token, with_deleted=with_deleted),
+                                path_suffix=self.places_suffix, params=params)
+
     def create_place(self, name: str, address: str, lat: float, long: float, created_by: int, token: str) -> \
             Tuple[requests.Response, Dict[str, Any]]:
         """
@@ -0,0 +1,243 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Set, Tuple, Union
+from ..invalidation import INVALIDATION_BUS, InvalidationEvent
+
+
+Cell = Tuple[int, int]
+BBox = Tuple[float, float, float, float]
+
+
+class GeoTileCache:
+    """
+    Кэш мест по тайлам сетки: запрос по прямоугольнику (lat1, long1, lat2, long2) разбивается на тайлы
+    фиксированного размера, закэшированные тайлы берутся из памяти, недостающие запрашиваются
+    прямоугольниками, а ответ раскладывается по тайлам. Сама сетка и служит пространственным индексом
+    """
+    def __init__(self, tile_size: float = float(os.getenv('PLACES_TILE_SIZE', 0.05)),
+                 ttl: float = float(os.getenv('PLACES_TILE_TTL', 30)),
+                 maxsize: int = int(os.getenv('PLACES_TILE_CACHE_SIZE', 4096)),
+                 max_tiles_per_query: int = int(os.getenv('PLACES_TILE_MAX_PER_QUERY', 64))):
+        """
+        @param tile_size: Сторона тайла в градусах
+        @param ttl: Время жизни тайла, в секундах
+        @param maxsize: Максимум тайлов (по всем scope), при превышении вытесняются самые давно использованные
+        @param max_tiles_per_query: Запросы по большему числу тайлов идут мимо кэша
+        """
+        self.tile_size = tile_size
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_tiles_per_query = max_tiles_per_query
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        # (scope, cell) -> (expires_at, response, места тайла)
+        self._tiles: 'OrderedDict[Tuple[Hashable, Cell], Tuple[float, Any, List[Dict[str, Any]]]]' = OrderedDict()
+        # cell -> ключи тайлов этой клетки по всем scope, и айди места -> клетки, где оно лежит
+        self._by_cell: Dict[Cell, Set[Tuple[Hashable, Cell]]] = dict()
+        self._by_place: Dict[Any, Set[Cell]] = dict()
+        self._lock = threading.Lock()
+
+    def get_cell(self, lat: float, long: float) -> Cell:
+        return math.floor(lat / self.tile_size), math.floor(long / self.tile_size)
+
+    def get_cells(self, bbox: BBox) -> Union[List[Cell], None]:
+        """
+        Клетки, покрывающие прямоугольник, None -- если их больше max_tiles_per_query
+        """
+        lat1, long1, lat2, long2 = bbox
+        (row1, col1), (row2, col2) = self.get_cell(lat1, long1), self.get_cell(lat2, long2)
+        if (row2 - row1 + 1) * (col2 - col1 + 1) > self.max_tiles_per_query:
+            self.bypassed += 1
+            return None
+        return [(row, col) for row in range(row1, row2 + 1) for col in range(col1, col2 + 1)]
+
+    def get_tiles(self, scope: Hashable, cells: List[Cell]) -> \
+            Tuple[Dict[Cell, Tuple[Any, List[Dict[str, Any]]]], List[Cell]]:
+        """
+        Закэшированные тайлы и список недостающих клеток
+        @return: (клетка -> (ответ, места), недостающие клетки)
+        """
+        found, missing = dict(), list()
+        now = time.monotonic()
+        with self._lock:
+            for cell in cells:
+                key = (scope, cell)
+                item = self._tiles.get(key)
+                if item is None or item[0] <= now:
+                    if item is not None:
+                        self._remove(key)
+                    missing.append(cell)
+                    continue
+                self._tiles.move_to_end(key)
+                found[cell] = item[1:]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def plan(self, cells: List[Cell]) -> List[Tuple[BBox, List[Cell]]]:
+        """
+        Недостающие клетки -- в как можно меньше прямоугольников: отрезки подряд идущих клеток в строке,
+        а одинаковые отрезки соседних строк склеиваются
+        @return: Список (прямоугольник запроса, клетки, которые он покрывает)
+        """
+        runs: Dict[int, List[Tuple[int, int]]] = dict()
+        for row, col in sorted(cells):
+            row_runs = runs.setdefault(row, [])
+            if row_runs and row_runs[-1][1] == col - 1:
+                row_runs[-1] = (row_runs[-1][0], col)
+            else:
+                row_runs.append((col, col))
+        rects: List[List[int]] = list()
+        open_rects: Dict[Tuple[int, int], List[int]] = dict()
+        for row in sorted(runs):
+            next_open = dict()
+            for run in runs[row]:
+                rect = open_rects.get(run)
+                if rect is not None and rect[1] == row - 1:
+                    rect[1] = row
+                else:
+                    rect = [row, row, run[0], run[1]]
+                    rects.append(rect)
+                next_open[run] = rect
+            open_rects = next_open
+        t = self.tile_size
+        return [((row1 * t, col1 * t, (row2 + 1) * t, (col2 + 1) * t),
+                 [(row, col) for row in range(row1, row2 + 1) for col in range(col1, col2 + 1)])
+                for row1, row2, col1, col2 in rects]
+
+    def put(self, scope: Hashable, cells: List[Cell], response: Any, places: List[Dict[str, Any]]):
+        """
+        Раскладка ответа по прямоугольнику на тайлы (пустые тайлы тоже кэшируются)
+        """
+        by_cell: Dict[Cell, List[Dict[str, Any]]] = {cell: list() for cell in cells}
+        for place in places:
+            try:
+                cell = self.get_cell(place['latitude'], place['longitude'])
+            except (KeyError, TypeError):
+                continue
+            if cell in by_cell:
+                by_cell[cell].append(place)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for cell, cell_places in by_cell.items():
+                key = (scope, cell)
+                if key in self._tiles:
+                    self._remove(key)
+                self._tiles[key] = (expires_at, response, cell_places)
+                self._by_cell.setdefault(cell, set()).add(key)
+                for place in cell_places:
+                    self._by_place.setdefault(place.get('id'), set()).add(cell)
+            while len(self._tiles) > self.maxsize:
+                self._remove(next(iter(self._tiles)))
+
+    @staticmethod
+    def merge(tiles: List[List[Dict[str, Any]]], bbox: BBox) -> List[Dict[str, Any]]:
+        """
+        Места из тайлов, попадающие в прямоугольник, без дублей по айди. Места без координат пропускаются
+        """
+        lat1, long1, lat2, long2 = bbox
+        seen, result = set(), list()
+        for places in tiles:
+            for place in places:
+                try:
+                    inside = lat1 <= place['latitude'] <= lat2 and long1 <= place['longitude'] <= long2
+                except (KeyError, TypeError):
+                    continue
+                place_id = place.get('id')
+                if not inside or place_id is not None and place_id in seen:
+                    continue
+                if place_id is not None:
+                    seen.add(place_id)
+                result.append(place)
+        return result
+
+    def _remove(self, key: Tuple[Hashable, Cell]):
+        """
+        Удаление тайла вместе с индексами. Вызывать под _lock
+        """
+        _, _, places = self._tiles.pop(key)
+        cell = key[1]
+        keys = self._by_cell.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_cell[cell]
+        if cell not in self._by_cell:
+            for place in places:
+                cells = self._by_place.get(place.get('id'))
+                if cells is not None:
+                    cells.discard(cell)
+                    if not cells:
+                        del self._by_place[place.get('id')]
+
+    def invalidate_cells(self, cells: List[Cell]):
+        """
+        Удаление тайлов клеток во всех scope
+        """
+        with self._lock:
+            for cell in cells:
+                for key in list(self._by_cell.get(cell, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidate_point(self, lat: Union[float, None], long: Union[float, None]):
+        """
+        Инвалидация тайла, в который попадает точка (создание или перенос места)
+        """
+        if lat is not None and long is not None:
+            self.invalidate_cells([self.get_cell(lat, long)])
+
+    def invalidate_place(self, place_id: Any):
+        """
+        Инвалидация тайлов, в которых лежит место (изменение, удаление, новая оценка)
+        """
+        with self._lock:
+            cells = list(self._by_place.get(place_id, ()))
+        self.invalidate_cells(cells)
+
+    def invalidate(self):
+        with self._lock:
+            self._tiles.clear()
+            self._by_cell.clear()
+            self._by_place.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tiles)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'invalidations': self.invalidations,
+                'size': len(self._tiles),
+            }
+
+
+# Тайлы мест, общие на процесс
+GEO_TILE_CACHE = GeoTileCache()
+
+
+def _evict_geo_tiles(event: Union[InvalidationEvent, None]):
+    """
+    Подписчик шины инвалидации: записи мест, а также оценок и подтверждений (по place_id из подсказок)
+    """
+    if event is None:
+        GEO_TILE_CACHE.invalidate()
+        return
+    if event.entity == 'places' and event.entity_id is not None:
+        GEO_TILE_CACHE.invalidate_place(event.entity_id if not event.entity_id.isdigit() else int(event.entity_id))
+    if event.hints.get('place_id') is not None:
+        GEO_TILE_CACHE.invalidate_place(event.hints['place_id'])
+    GEO_TILE_CACHE.invalidate_point(event.hints.get('latitude'), event.hints.get('longitude'))
+
+
+INVALIDATION_BUS.add_listener(_evict_geo_tiles)
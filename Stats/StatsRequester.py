@@ -1,6 +1,8 @@
 from django.conf import settings
 from ._StatsRequester import StatsRequester as __s
 from ._MockStatsRequester import MockStatsRequester as __m
+from ._AsyncStatsRequester import AsyncStatsRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 
 __tst = settings.TESTING
@@ -8,8 +10,11 @@ try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         StatsRequester = __s if __art else __m
+        AsyncStatsRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         StatsRequester = __s if __ar else __m
+        AsyncStatsRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     StatsRequester = __s if not __tst else __m
+    AsyncStatsRequester = __aa if not __tst else async_mock_class(__m)
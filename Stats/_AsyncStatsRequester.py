@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import httpx
+import pybreaker
+from typing import Tuple, Dict, List, Any, Union, Optional, Callable
+from ._StatsRequester import StatsRequester
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+from ..exceptions import BaseApiRequestError
+
+
+class AsyncStatsRequester(AsyncBaseApiRequester, StatsRequester):
+    """
+    Асинхронный реквестер на сервак статы. Делит DB_BREAKER и очередь с синхронным
+    """
+    async def _make_request(self, method: Callable, uri, headers, params, data, timeout=None) -> httpx.Response:
+        try:
+            return await super()._make_request(method, uri, headers, params, data, timeout=timeout)
+        except BaseApiRequestError as e:
+            raise pybreaker.CircuitBreakerError
+
+    async def _create_statistics(self, path_suffix: str, data: Dict[str, Any], token: str,
+                                 enqueue: Callable[[], None]) -> Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Общая часть create_*_statistics: пост, либо сохранение в очередь, если сервак статы лежит
+        @param path_suffix: Суффикс, добавляемый к апи-урлу
+        @param data: Боди запроса
+        @param token: Токен
+        @param enqueue: Функция, кладущая стату в очередь
+        @return: Ответ внешнего сервиса, и джсон-ответ
+        """
+        try:
+            ans = await self._base_post(token=token, path_suffix=path_suffix, data=data)
+            asyncio.get_running_loop().run_in_executor(None, self.queue.fire)
+            return ans
+        except pybreaker.CircuitBreakerError:
+            enqueue()
+            return httpx.Response(201), dict()
+
+    async def _create_statistics_bulk(self, stat_type: str, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[httpx.Response, List[Dict[str, Any]]]:
+        """
+        Отправка пачки событий одним POST'ом, фолбэк в очередь на всю пачку
+        """
+        data = [self._prepare_statistics_event(e) for e in events]
+        return await self._create_statistics(self._get_statistics_suffix(stat_type), data, token,
+                                             lambda: self.queue.add_stats(stat_type, data, token))
+
+    async def create_request_statistics(self, method: StatsRequester.REQUEST_METHODS, user_id: Optional[int],
+                                        endpoint: str, process_time: float, status_code: int,
+                                        request_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Добавление статы по реквесту
+        """
+        data = {
+            'method': method if isinstance(method, str) else method.value,
+            'user_id': user_id,
+            'endpoint': endpoint,
+            'process_time': process_time,
+            'status_code': status_code,
+            'request_dt': request_dt
+        }
+        return await self._create_statistics(self.requests_suffix, data, token, lambda: self.queue.add_requests_stat(
+            method, user_id, endpoint, process_time, status_code, request_dt, token))
+
+    async def create_place_statistics(self, action: StatsRequester.PLACES_ACTIONS, place_id: int,
+                                      user_id: Optional[int], action_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание статы по месту
+        """
+        data = {
+            'action': action.value,
+            'place_id': place_id,
+            'user_id': user_id,
+            'action_dt': action_dt
+        }
+        return await self._create_statistics(self.places_suffix, data, token, lambda: self.queue.add_place_stat(
+            action, place_id, user_id, action_dt, token))
+
+    async def create_accept_statistics(self, action: StatsRequester.ACCEPTS_ACTIONS, place_id: int, user_id: int,
+                                       action_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание статы по подтверждению
+        """
+        data = {
+            'action': action.value,
+            'place_id': place_id,
+            'user_id': user_id,
+            'action_dt': action_dt
+        }
+        return await self._create_statistics(self.accepts_suffix, data, token, lambda: self.queue.add_accept_stat(
+            action, place_id, user_id, action_dt, token))
+
+    async def create_rating_statistics(self, old_rating: int, new_rating: int, place_id: int, user_id: int,
+                                       action_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание статы по рейтингу
+        """
+        data = {
+            'old_rating': old_rating,
+            'new_rating': new_rating,
+            'place_id': place_id,
+            'user_id': user_id,
+            'action_dt': action_dt
+        }
+        return await self._create_statistics(self.ratings_suffix, data, token, lambda: self.queue.add_rating_stat(
+            old_rating, new_rating, place_id, user_id, action_dt, token))
+
+    async def create_pin_purchase_statistics(self, pin_id: int, user_id: int,
+                                             purchase_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание статы по оплате пинов
+        """
+        data = {
+            'pin_id': pin_id,
+            'user_id': user_id,
+            'purchase_dt': purchase_dt
+        }
+        return await self._create_statistics(self.pins_suffix, data, token, lambda: self.queue.add_pin_purchase_stat(
+            pin_id, user_id, purchase_dt, token))
+
+    async def create_achievement_statistics(self, achievement_id: int, user_id: int,
+                                            achievement_dt: Union[str, datetime.datetime], token: str) -> \
+            Tuple[httpx.Response, Dict[str, Any]]:
+        """
+        Создание статы по получению достижения
+        """
+        data = {
+            'achievement_id': achievement_id,
+            'user_id': user_id,
+            'achievement_dt': achievement_dt,
+        }
+        return await self._create_statistics(self.achievement_suffix, data, token,
+                                             lambda: self.queue.add_achievement_stat(achievement_id, user_id,
+                                                                                     achievement_dt, token))
@@ -246,3 +246,12 @@ class MockStatsRequester(StatsRequester, MockRequesterMixin):
         Создание статы по получению достижения
         """
         return self._mock_token_handler(token, list_object=True)
+
+    # MARK: - Bulk
+    def _create_statistics_bulk(self, stat_type: str, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы
+        """
+        resp, dictt = self._mock_token_handler(token, list_object=True)
+        return resp, [dictt for _ in events]
@@ -3,14 +3,16 @@ import requests
 import datetime
 import pybreaker
 from enum import Enum
-from typing import Tuple, List, Dict, Any, Union, Optional, Callable
+from typing import Tuple, List, Dict, Any, Union, Optional, Callable, Iterator
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
+from ..breakers import BREAKERS
 from ..exceptions import JsonDecodeError, UnexpectedResponse, RequestError, BaseApiRequestError
 from ._request_queue import StatsRequestsQueue
 
 
-DB_BREAKER = pybreaker.CircuitBreaker(fail_max=5, reset_timeout=60, exclude=[])
+DB_BREAKER = pybreaker.CircuitBreaker(fail_max=5, reset_timeout=60, exclude=[], name='stats')
+BREAKERS.register(DB_BREAKER)
 
 
 class StatsRequester(BaseApiRequester):
@@ -18,6 +20,10 @@ class StatsRequester(BaseApiRequester):
     Реквестер на сервак статы
     """
     queue = StatsRequestsQueue()
+    # Стата всегда ходит через свой DB_BREAKER, независимо от REQUESTERS_BREAKERS
+    breaker_enabled = True
+    # Стату никто не кэширует, инвалидировать нечего
+    publish_invalidations = False
 
     def __init__(self):
         super().__init__()
@@ -29,13 +35,63 @@ class StatsRequester(BaseApiRequester):
         self.achievement_suffix = 'achievements/'
         self.host = settings.ENV['STATS_HOST']
 
-    @DB_BREAKER
-    def _make_request(self, method: Callable, uri, headers, params, data) -> requests.Response:
+    def _get_breaker(self, uri: str) -> pybreaker.CircuitBreaker:
+        return DB_BREAKER
+
+    def _make_request(self, method: Callable, uri, headers, params, data, timeout=None) -> requests.Response:
         try:
-            return super()._make_request(method, uri, headers, params, data)
+            return super()._make_request(method, uri, headers, params, data, timeout=timeout)
         except BaseApiRequestError as e:
             raise pybreaker.CircuitBreakerError
 
+    def _get_statistics_suffix(self, stat_type: str) -> str:
+        """
+        Суффикс эндпоинта по типу статы (типы как в StatsRequestsQueue)
+        """
+        return {
+            'request': self.requests_suffix,
+            'place': self.places_suffix,
+            'accept': self.accepts_suffix,
+            'rating': self.ratings_suffix,
+            'pin_purchase': self.pins_suffix,
+            'achievement': self.achievement_suffix,
+        }[stat_type]
+
+    @staticmethod
+    def _prepare_statistics_event(event: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Приведение события к джсону: енумы -- в значения, даты -- в isoformat
+        """
+        data = dict()
+        for k, v in event.items():
+            if isinstance(v, Enum):
+                v = v.value
+            elif isinstance(v, (datetime.datetime, datetime.date)):
+                v = v.isoformat()
+            data[k] = v
+        return data
+
+    def _create_statistics_bulk(self, stat_type: str, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Отправка пачки событий одним POST'ом с джсон-массивом в боди.
+        Брейкер и фолбэк в очередь работают на всю пачку целиком
+        @param stat_type: Тип статы (request, place, accept, rating, pin_purchase, achievement)
+        @param events: События, ключи как у аргументов соответствующего create_*_statistics
+        @param token: Токен
+        @return: Ответ внешнего сервиса, и джсон-ответ
+        """
+        data = [self._prepare_statistics_event(e) for e in events]
+        try:
+            ans = self._base_post(token=token, path_suffix=self._get_statistics_suffix(stat_type), data=data)
+            self.queue.fire()
+            return ans
+        except pybreaker.CircuitBreakerError:
+            self.queue.add_stats(stat_type, data, token)
+            resp = requests.Response()
+            resp.status_code = 201
+            return resp, []
+
     # MARK: - Request stats
     class REQUEST_METHODS(Enum):
         GET = 'GET'
@@ -63,6 +119,14 @@ class StatsRequester(BaseApiRequester):
             params['user_id'] = user_id
         return self._base_get(token=token, path_suffix=self.requests_suffix, params=params)
 
+    def iter_request_statistics(self, token: str, user_id: Optional[int] = None, page_size: int = 100,
+                                prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по реквестам постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_request_statistics_paginated(
+            limit, offset, token, user_id=user_id), page_size, prefetch)
+
     def get_request_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Получение одной записи статы по реквестам
@@ -93,6 +157,14 @@ class StatsRequester(BaseApiRequester):
             resp.status_code = 201
             return resp, dict()
 
+    def create_request_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Добавление пачки статы по реквестам
+        @param events: Словари с аргументами create_request_statistics (без token)
+        """
+        return self._create_statistics_bulk('request', events, token)
+
     # MARK: - Places stats
     class PLACES_ACTIONS(Enum):
         OPENED = 'OPENED'
@@ -124,6 +196,14 @@ class StatsRequester(BaseApiRequester):
             params['place_id'] = place_id
         return self._base_get(token=token, path_suffix=self.places_suffix, params=params)
 
+    def iter_place_statistics(self, token: str, user_id: Optional[int] = None, place_id: Optional[int] = None,
+                              page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по местам постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_place_statistics_paginated(
+            limit, offset, token, user_id, place_id), page_size, prefetch)
+
     def get_place_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Получение статы по месту
@@ -152,6 +232,14 @@ class StatsRequester(BaseApiRequester):
             resp.status_code = 201
             return resp, dict()
 
+    def create_place_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы по местам
+        @param events: Словари с аргументами create_place_statistics (без token)
+        """
+        return self._create_statistics_bulk('place', events, token)
+
     # MARK: - Accepts stats
     class ACCEPTS_ACTIONS(Enum):
         ACCEPTED = 'ACCEPTED'
@@ -181,6 +269,14 @@ class StatsRequester(BaseApiRequester):
             params['place_id'] = place_id
         return self._base_get(token=token, path_suffix=self.accepts_suffix, params=params)
 
+    def iter_accept_statistics(self, token: str, user_id: Optional[int] = None, place_id: Optional[int] = None,
+                               page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по подтверждениям постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_accept_statistics_paginated(
+            limit, offset, token, user_id, place_id), page_size, prefetch)
+
     def get_accept_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Стата по подтверждению
@@ -209,6 +305,14 @@ class StatsRequester(BaseApiRequester):
             resp.status_code = 201
             return resp, dict()
 
+    def create_accept_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы по подтверждениям
+        @param events: Словари с аргументами create_accept_statistics (без token)
+        """
+        return self._create_statistics_bulk('accept', events, token)
+
     # MARK: - Rating stats
     def get_rating_statistics_list(self, token: str, user_id: Optional[int], place_id: Optional[int]) -> \
             Tuple[requests.Response, List[Dict[str, Any]]]:
@@ -234,6 +338,14 @@ class StatsRequester(BaseApiRequester):
             params['place_id'] = place_id
         return self._base_get(token=token, path_suffix=self.ratings_suffix, params=params)
 
+    def iter_rating_statistics(self, token: str, user_id: Optional[int] = None, place_id: Optional[int] = None,
+                               page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по рейтингам постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_rating_statistics_paginated(
+            limit, offset, token, user_id, place_id), page_size, prefetch)
+
     def get_rating_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Стата по рейтингу
@@ -263,6 +375,14 @@ class StatsRequester(BaseApiRequester):
             resp.status_code = 201
             return resp, dict()
 
+    def create_rating_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы по рейтингам
+        @param events: Словари с аргументами create_rating_statistics (без token)
+        """
+        return self._create_statistics_bulk('rating', events, token)
+
     # MARK: - Pin purchase stats
     def get_pin_purchase_statistics_list(self, token: str, user_id: Optional[int], pin_id: Optional[int]) -> \
             Tuple[requests.Response, List[Dict[str, Any]]]:
@@ -288,6 +408,14 @@ class StatsRequester(BaseApiRequester):
             params['pin_id'] = pin_id
         return self._base_get(token=token, path_suffix=self.pins_suffix, params=params)
 
+    def iter_pin_purchase_statistics(self, token: str, user_id: Optional[int] = None, pin_id: Optional[int] = None,
+                                     page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по оплате пинов постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_pin_purchase_statistics_paginated(
+            limit, offset, token, user_id, pin_id), page_size, prefetch)
+
     def get_pin_purchase_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Стата по оплате пинов
@@ -314,6 +442,14 @@ class StatsRequester(BaseApiRequester):
             resp.status_code = 201
             return resp, dict()
 
+    def create_pin_purchase_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы по оплате пинов
+        @param events: Словари с аргументами create_pin_purchase_statistics (без token)
+        """
+        return self._create_statistics_bulk('pin_purchase', events, token)
+
     # MARK: - Achievement stats
     def get_achievement_statistics_list(self, token: str, user_id: Optional[int], achievement_id: Optional[int]) -> \
             Tuple[requests.Response, List[Dict[str, Any]]]:
@@ -340,6 +476,14 @@ class StatsRequester(BaseApiRequester):
             params['achievement_id'] = achievement_id
         return self._base_get(token=token, path_suffix=self.achievement_suffix, params=params)
 
+    def iter_achievement_statistics(self, token: str, user_id: Optional[int] = None, achievement_id: Optional[int] = None,
+                                    page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всей статы по получению достижений постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_achievement_statistics_paginated(
+            limit, offset, token, user_id, achievement_id), page_size, prefetch)
+
     def get_achievement_statistics(self, stat_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Стата по оплате получению достижения
@@ -366,3 +510,11 @@ class StatsRequester(BaseApiRequester):
             resp = requests.Response()
             resp.status_code = 201
             return resp, dict()
+
+    def create_achievement_statistics_bulk(self, events: List[Dict[str, Any]], token: str) -> \
+            Tuple[requests.Response, List[Dict[str, Any]]]:
+        """
+        Создание пачки статы по получению достижений
+        @param events: Словари с аргументами create_achievement_statistics (без token)
+        """
+        return self._create_statistics_bulk('achievement', events, token)
@@ -0,0 +1,131 @@
+import os
+import atexit
+import threading
+import timeit
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple, Union
+from ..tracing import TRACER
+
+
+class StatsBatcher:
+    """
+    Микро-батчер статы: копит события по (тип, токен) до max_items штук или max_delay_ms
+    и отправляет их одним create_*_statistics_bulk из фонового потока
+    """
+    def __init__(self, enabled: bool = os.getenv('STATS_BATCHING', 'False') == 'True',
+                 max_items: int = int(os.getenv('STATS_BATCH_MAX_ITEMS', 100)),
+                 max_delay_ms: float = float(os.getenv('STATS_BATCH_MAX_DELAY_MS', 200))):
+        """
+        @param enabled: Включен ли батчинг (иначе CollectStatsMixin шлет события по одному)
+        @param max_items: Размер пачки, при котором она уходит сразу
+        @param max_delay_ms: Сколько максимум ждет первое событие пачки
+        """
+        self.enabled = enabled
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000
+        self.sent_batches = 0
+        self.sent_events = 0
+        self.failed_events = 0
+        self._buffers: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+        self._first_added: Dict[Tuple[str, str], float] = dict()
+        # traceparent'ы событий в буфере, параллельно self._buffers
+        self._traces: Dict[Tuple[str, str], List[Union[str, None]]] = defaultdict(list)
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _get_requester(self):
+        from .StatsRequester import StatsRequester
+        return StatsRequester()
+
+    def add(self, stat_type: str, token: str, event: Dict[str, Any]):
+        """
+        Добавление события в буфер
+        @param stat_type: Тип статы (request, place, accept, rating, pin_purchase, achievement)
+        @param token: Токен приложения
+        @param event: Аргументы create_<stat_type>_statistics без token
+        """
+        key = (stat_type, token)
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='StatsBatcher', daemon=True)
+                self._thread.start()
+            buffer = self._buffers[key]
+            if not buffer:
+                self._first_added[key] = timeit.default_timer()
+            buffer.append(event)
+            self._traces[key].append(TRACER.get_traceparent() if TRACER.enabled else None)
+            if len(buffer) >= self.max_items:
+                self._cond.notify()
+
+    def _take_due(self, force: bool = False) -> List[Tuple[str, str, List[Dict[str, Any]], List[Union[str, None]]]]:
+        """
+        Забрать пачки, которые пора отправлять. Вызывать под _cond
+        """
+        now = timeit.default_timer()
+        due = []
+        for key, buffer in list(self._buffers.items()):
+            if force or len(buffer) >= self.max_items or now - self._first_added[key] >= self.max_delay:
+                del self._buffers[key]
+                del self._first_added[key]
+                traces = self._traces.pop(key, [])
+                for i in range(0, len(buffer), self.max_items):
+                    due.append((key[0], key[1], buffer[i:i + self.max_items], traces[i:i + self.max_items]))
+        return due
+
+    def _next_timeout(self) -> float:
+        if not self._first_added:
+            return self.max_delay
+        oldest = min(self._first_added.values())
+        return max(oldest + self.max_delay - timeit.default_timer(), 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=self._next_timeout())
+                due = self._take_due()
+            self._send(due)
+
+    def _send(self, due: List[Tuple[str, str, List[Dict[str, Any]], List[Union[str, None]]]]):
+        if not due:
+            return
+        r = None
+        for stat_type, token, events, traceparents in due:
+            # Любая ошибка пачки (в том числе неизвестный тип или несериализуемое событие) -- только эта пачка,
+            # иначе фоновый поток умер бы, а события копились бы в буфере навсегда
+            try:
+                if r is None:
+                    r = self._get_requester()
+                with TRACER.batch_span('stats.batch', traceparents, {'stats.type': stat_type,
+                                                                     'stats.events': len(events)}):
+                    getattr(r, f'create_{stat_type}_statistics_bulk')(events, token)
+            except Exception as e:
+                print(f'=== STATS BATCH ERROR {str(e)} ===')
+                with self._cond:
+                    self.failed_events += len(events)
+                continue
+            # _send идет и из фонового потока, и из flush -- счетчики под тем же локом, что и буферы
+            with self._cond:
+                self.sent_batches += 1
+                self.sent_events += len(events)
+
+    def flush(self):
+        """
+        Немедленная отправка всего, что накоплено
+        """
+        with self._cond:
+            due = self._take_due(force=True)
+        self._send(due)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'buffered': sum(len(x) for x in self._buffers.values()),
+                'sent_batches': self.sent_batches,
+                'sent_events': self.sent_events,
+                'failed_events': self.failed_events,
+            }
+
+
+STATS_BATCHER = StatsBatcher()
+atexit.register(STATS_BATCHER.flush)
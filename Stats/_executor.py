@@ -0,0 +1,160 @@
+import os
+import queue
+import atexit
+import threading
+from enum import Enum
+from typing import Callable, Dict, Any, Union
+from ..tracing import TRACER
+
+
+class StatsExecutor:
+    """
+    Ограниченный пул фоновых потоков для сбора статы с ограниченной очередью задач
+    """
+    class OVERFLOW(Enum):
+        """
+        Что делать с задачей, если очередь заполнена
+        """
+        DROP = 'drop'
+        SPILL = 'spill'
+        BLOCK = 'block'
+
+    def __init__(self, workers: int = int(os.getenv('STATS_EXECUTOR_WORKERS', 8)),
+                 queue_size: int = int(os.getenv('STATS_EXECUTOR_QUEUE_SIZE', 1000)),
+                 overflow: str = os.getenv('STATS_EXECUTOR_OVERFLOW', 'spill'),
+                 block_timeout: float = float(os.getenv('STATS_EXECUTOR_BLOCK_TIMEOUT', 1))):
+        """
+        @param workers: Число потоков
+        @param queue_size: Размер очереди задач
+        @param overflow: Поведение при переполнении: drop, spill (вызов spill задачи) или block
+        @param block_timeout: Сколько ждать места в очереди в режиме block, потом задача отбрасывается
+        """
+        self.workers = workers
+        self.overflow = self.OVERFLOW(overflow)
+        self.block_timeout = block_timeout
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        # Счетчики меняют и потоки запросов, и воркеры
+        self._metrics_lock = threading.Lock()
+        self._is_shutdown = False
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f'StatsExecutor-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _count(self, name: str):
+        with self._metrics_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                fn, args, kwargs, trace_context = task
+                try:
+                    with TRACER.use_context(trace_context):
+                        fn(*args, **kwargs)
+                    self._count('completed')
+                except Exception as e:
+                    self._count('failed')
+                    print(f'=== STATS TASK ERROR {str(e)} ===')
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn: Callable, args: tuple = (), kwargs: Union[Dict[str, Any], None] = None,
+               spill: Union[Callable[[], None], None] = None) -> bool:
+        """
+        Постановка задачи в очередь
+        @param fn: Функция
+        @param args: Позиционные аргументы
+        @param kwargs: Именованные аргументы
+        @param spill: Что сделать вместо задачи при переполнении в режиме spill (например, положить стату в редис)
+        @return: True, если задача принята в очередь
+        """
+        if self._is_shutdown:
+            self._count('dropped')
+            return False
+        if not self._threads:
+            self._start()
+        # Контекст трейса едет с задачей, чтобы запросы в стату из фонового потока попали в тот же трейс
+        task = (fn, args, kwargs or dict(), TRACER.current_context() if TRACER.enabled else None)
+        try:
+            if self.overflow == self.OVERFLOW.BLOCK:
+                self._queue.put(task, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(task)
+            self._count('submitted')
+            return True
+        except queue.Full:
+            pass
+        if self.overflow == self.OVERFLOW.SPILL and spill is not None:
+            try:
+                spill()
+                self._count('spilled')
+                return False
+            except Exception as e:
+                print(f'=== STATS SPILL ERROR {str(e)} ===')
+        self._count('dropped')
+        return False
+
+    def flush(self, timeout: Union[float, None] = None) -> bool:
+        """
+        Ожидание выполнения всех поставленных задач
+        @param timeout: Сколько максимум ждать
+        @return: True, если очередь разобрана
+        """
+        done = threading.Event()
+
+        def wait():
+            self._queue.join()
+            done.set()
+        threading.Thread(target=wait, daemon=True).start()
+        return done.wait(timeout)
+
+    def shutdown(self, timeout: Union[float, None] = 5):
+        """
+        Перестать принимать задачи, доделать поставленные и остановить потоки
+        @param timeout: Сколько максимум ждать разбора очереди
+        """
+        self._is_shutdown = True
+        if not self._threads:
+            return
+        self.flush(timeout)
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._metrics_lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+            }
+
+
+STATS_EXECUTOR = StatsExecutor()
+atexit.register(STATS_EXECUTOR.shutdown)
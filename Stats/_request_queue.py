@@ -1,48 +1,104 @@
-import json
 import os
+import atexit
+import timeit
 import threading
-from redis import StrictRedis, exceptions
+from enum import Enum
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Union
+from redis import exceptions
+from .. import codec
+from ..exceptions import UnexpectedResponse
+from ..utils import get_redis_from_env
+from ..tracing import TRACER
+from ._spill import SpillBuffer
 
 
 class StatsRequestsQueue:
     """
     Очередь неудачных запросов (наполняется из PyBreaker)
     """
+    # Сколько записей забирать из редиса за один раунд-трип
+    batch_size = int(os.getenv('STATS_QUEUE_BATCH_SIZE', 200))
+    # Сколько запросов в сервис статы слать параллельно при разборе очереди
+    fire_workers = int(os.getenv('STATS_QUEUE_FIRE_WORKERS', 4))
+
     def __init__(self):
-        redis_url = os.getenv('REDIS_URL', 'localhost')
-        if redis_url == 'localhost':
-            self.r = StrictRedis(db=1)
-        else:
-            self.r = StrictRedis.from_url(redis_url)
+        self.r = get_redis_from_env()
         self.is_collecting = True
+        # Сюда записи идут, пока редис недоступен, и возвращаются в редис при разборе очереди
+        self.spill = SpillBuffer()
+        atexit.register(self.spill.flush)
         self.lock_mod = threading.Lock()
         self.lock_len = threading.Lock()
         self.lock_tmp = threading.Lock()
+        self.lock_fire = threading.Lock()
+        self.metrics = {
+            'fired': 0,
+            'failed': 0,
+            'requeued': 0,
+            'dropped': 0,
+            'batches': 0,
+            'drains': 0,
+            'last_drain_seconds': 0.0,
+            'last_drain_rps': 0.0,
+        }
+
+    @staticmethod
+    def _get_trace_fields() -> Dict[str, str]:
+        """
+        traceparent текущего трейса для записи в очереди, чтобы отправка при разборе попала в тот же трейс
+        """
+        traceparent = TRACER.get_traceparent() if TRACER.enabled else None
+        return {'traceparent': traceparent} if traceparent else dict()
 
     def __push(self, data):
-        with self.lock_mod:
+        data.update(self._get_trace_fields())
+        self._push_payloads(codec.dumps(data))
+
+    def _push_payloads(self, *payloads: bytes):
+        """
+        Запись в редис, либо в локальный буфер, если редис недоступен или в буфере еще есть более старые записи
+        """
+        self.is_collecting = True
+        if not self.spill.is_active:
+            # LPUSH атомарен, так что продюсеры не ждут ни друг друга, ни разбор очереди
             try:
-                self.r.lpush('requests', json.dumps(data))
-                self.is_collecting = True
+                self.r.lpush('requests', *payloads)
+                return
             except exceptions.RedisError:
                 pass
+        self.spill.append(*payloads)
 
-    def __pop(self):
+    def _pop_batch(self, n: int) -> List[Dict[str, Any]]:
+        """
+        Забрать до n самых старых записей за один раунд-трип (LRANGE+LTRIM в MULTI)
+        @param n: Размер пачки
+        @return: Записи, от старых к новым
+        """
         with self.lock_mod:
-            try:
-                json_str = self.r.lpop('requests').decode('utf-8')
-                return json.loads(json_str)
-            except exceptions.RedisError:
-                return {'type': 'None'}
+            pipe = self.r.pipeline(transaction=True)
+            pipe.lrange('requests', -n, -1)
+            pipe.ltrim('requests', 0, -n - 1)
+            items, _ = pipe.execute()
+        # LPUSH кладет в голову, так что хвост списка -- самые старые записи
+        return [codec.loads(x) for x in reversed(items)]
 
     def __len__(self):
+        """
+        Записи в редисе и в локальном буфере. Если редис недоступен, считаются только локальные
+        """
         with self.lock_len:
-            return self.r.llen('requests')
+            try:
+                redis_len = self.r.llen('requests')
+            except exceptions.RedisError:
+                redis_len = 0
+            return redis_len + len(self.spill)
 
     def add_requests_stat(self, method, user_id, endpoint, process_time, status_code, request_dt, token):
         data = {
             'type': 'request',
-            'method': method,
+            'method': method.value if isinstance(method, Enum) else method,
             'user_id': user_id,
             'endpoint': endpoint,
             'process_time': process_time,
@@ -55,7 +111,7 @@ class StatsRequestsQueue:
     def add_place_stat(self, action, place_id, user_id, action_dt, token):
         data = {
             'type': 'place',
-            'action': action,
+            'action': action.value if isinstance(action, Enum) else action,
             'user_id': user_id,
             'place_id': place_id,
             'action_dt': action_dt if isinstance(action_dt, str) else action_dt.isoformat(),
@@ -66,7 +122,7 @@ class StatsRequestsQueue:
     def add_accept_stat(self, action, place_id, user_id, action_dt, token):
         data = {
             'type': 'accept',
-            'action': action,
+            'action': action.value if isinstance(action, Enum) else action,
             'user_id': user_id,
             'place_id': place_id,
             'action_dt': action_dt if isinstance(action_dt, str) else action_dt.isoformat(),
@@ -98,7 +154,7 @@ class StatsRequestsQueue:
 
     def add_achievement_stat(self, achievement_id, user_id, achievement_dt, token):
         data = {
-            'type': 'pin_purchase',
+            'type': 'achievement',
             'user_id': user_id,
             'achievement_id': achievement_id,
             'achievement_dt': achievement_dt if isinstance(achievement_dt, str) else achievement_dt.isoformat(),
@@ -106,34 +162,131 @@ class StatsRequestsQueue:
         }
         self.__push(data)
 
-    def fire(self):
+    def add_stats(self, stat_type: str, events: List[Dict[str, Any]], token: str):
+        """
+        Добавление пачки событий одного типа одним LPUSH
+        @param stat_type: Тип статы (request, place, accept, rating, pin_purchase, achievement)
+        @param events: События, уже приведенные к джсону
+        @param token: Токен
+        """
+        if not events:
+            return
+        trace_fields = self._get_trace_fields()
+        self._push_payloads(*[codec.dumps({'type': stat_type, **e, 'token': token, **trace_fields}) for e in events])
+
+    def _get_requester(self):
         from .StatsRequester import StatsRequester
+        return StatsRequester()
+
+    def _send_group(self, r, req_type: str, token: str, group: List[Dict[str, Any]],
+                    traceparents: Union[List[Union[str, None]], None] = None) -> Tuple[int, int]:
+        """
+        Отправка записей одного типа и токена одним bulk-запросом. Неотправленные записи уже забраны из редиса,
+        так что fire возвращает их в очередь (что заодно останавливает разбор). Отбрасываются только записи,
+        которые сервис отверг с 4xx: повтор их не исправит, а застрявшая запись стопорила бы каждый разбор
+        @param traceparents: Трейсы, из которых пришли записи
+        @return: (сколько записей не удалось отправить, сколько из них отброшено)
+        """
+        traceparents = traceparents or [None] * len(group)
+        if not hasattr(r, f'create_{req_type}_statistics_bulk'):
+            print(f'=== FIRE ERROR unknown stats type {req_type} ===')
+            return len(group), len(group)
+        try:
+            with TRACER.batch_span('stats.queue.fire', traceparents, {'stats.type': req_type,
+                                                                      'stats.events': len(group)}):
+                getattr(r, f'create_{req_type}_statistics_bulk')(group, token)
+        except UnexpectedResponse as e:
+            print(f'=== FIRE ERROR {str(e)} ===')
+            if 400 <= e.code < 500:
+                return len(group), len(group)
+            return len(group), 0
+        except Exception as e:
+            print(f'=== FIRE ERROR {str(e)} ===')
+            return len(group), 0
+        return 0, 0
+
+    def _requeue(self, records: List[Tuple[str, str, Dict[str, Any], Union[str, None]]]):
+        """
+        Возврат записей в очередь в прежнем порядке. Они старше всего, что осталось в редисе, так что идут
+        в хвост списка (RPUSH в обратном порядке), и следующий _pop_batch заберет их первыми
+        @param records: (тип, токен, запись, traceparent), от старых к новым
+        """
+        payloads = list()
+        for req_type, token, req_json, traceparent in records:
+            data = {'type': req_type, **req_json, 'token': token}
+            if traceparent:
+                data['traceparent'] = traceparent
+            payloads.append(codec.dumps(data))
+        self.is_collecting = True
+        try:
+            self.r.rpush('requests', *reversed(payloads))
+        except exceptions.RedisError:
+            self.spill.append(*payloads)
+
+    def fire(self):
+        """
+        Разбор очереди пачками по batch_size: записи группируются по типу и токену и отправляются
+        bulk-запросами в fire_workers потоков. Если сервис статы снова упал (в очередь что-то добавилось, в том числе
+        вернулись неотправленные записи), разбор прекращается
+        """
         with self.lock_tmp:
             if not self.is_collecting:
                 return
-
-        with self.lock_mod:
+        # Разбирает только один поток, остальные сразу выходят
+        if not self.lock_fire.acquire(blocking=False):
+            return
+        try:
             print('=== Start to fire queue ===')
             self.is_collecting = False
-            r = StatsRequester()
-            while len(self) > 0 and not self.is_collecting:
-                print('=== Fire ===')
-                try:
-                    req_json = self.r.lpop('requests').decode('utf-8')
-                    req_json = json.loads(req_json)
-                except exceptions.RedisError:
-                    req_json = {'type': 'None'}
-                req_type = req_json.pop('type')
-                if req_type == 'request':
-                    r.create_request_statistics(**req_json)
-                elif req_type == 'place':
-                    r.create_place_statistics(**req_json)
-                elif req_type == 'accept':
-                    r.create_accept_statistics(**req_json)
-                elif req_type == 'rating':
-                    r.create_rating_statistics(**req_json)
-                elif req_type == 'pin_purchase':
-                    r.create_pin_purchase_statistics(**req_json)
-                elif req_type == 'achievement':
-                    r.create_achievement_statistics(**req_json)
-            print('=== END FIRING ===')
+            r = self._get_requester()
+            start, fired, failed, dropped = timeit.default_timer(), 0, 0, 0
+            # Сначала в редис возвращается локальный буфер: его записи старше всех, что пришли после
+            if self.spill.is_active:
+                self.spill.replay(lambda payloads: self.r.lpush('requests', *payloads), self.batch_size)
+            with ThreadPoolExecutor(max_workers=self.fire_workers) as pool:
+                while not self.is_collecting:
+                    try:
+                        batch = self._pop_batch(self.batch_size)
+                    except exceptions.RedisError:
+                        break
+                    if not batch:
+                        break
+                    groups, traces, positions = defaultdict(list), defaultdict(list), defaultdict(list)
+                    records = list()
+                    for i, req_json in enumerate(batch):
+                        key = (req_json.pop('type', 'None'), req_json.pop('token', None))
+                        traceparent = req_json.pop('traceparent', None)
+                        groups[key].append(req_json)
+                        traces[key].append(traceparent)
+                        positions[key].append(i)
+                        records.append((*key, req_json, traceparent))
+                    chunks, chunk_positions = [], []
+                    for (req_type, token), group in groups.items():
+                        step = max(-(-len(group) // self.fire_workers), 1)
+                        chunks += [(req_type, token, group[i:i + step], traces[(req_type, token)][i:i + step])
+                                   for i in range(0, len(group), step)]
+                        chunk_positions += [positions[(req_type, token)][i:i + step]
+                                            for i in range(0, len(group), step)]
+                    futures = [pool.submit(self._send_group, r, *chunk) for chunk in chunks]
+                    results = [f.result() for f in futures]
+                    batch_failed, batch_dropped = sum(x[0] for x in results), sum(x[1] for x in results)
+                    # Неотправленное -- обратно одним RPUSH, в порядке, в котором записи лежали в очереди
+                    failed_positions = sorted(i for (n_failed, n_dropped), chunk in zip(results, chunk_positions)
+                                              if n_failed and not n_dropped for i in chunk)
+                    if failed_positions:
+                        self._requeue([records[i] for i in failed_positions])
+                    fired += len(batch) - batch_failed
+                    failed += batch_failed
+                    dropped += batch_dropped
+                    self.metrics['batches'] += 1
+            elapsed = timeit.default_timer() - start
+            self.metrics['fired'] += fired
+            self.metrics['failed'] += failed
+            self.metrics['requeued'] += failed - dropped
+            self.metrics['dropped'] += dropped
+            self.metrics['drains'] += 1
+            self.metrics['last_drain_seconds'] = elapsed
+            self.metrics['last_drain_rps'] = fired / elapsed if elapsed > 0 else 0.0
+            print(f'=== END FIRING: {fired} sent, {failed} failed in {elapsed:.2f}s ===')
+        finally:
+            self.lock_fire.release()
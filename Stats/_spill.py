@@ -0,0 +1,270 @@
+import os
+import time
+import tempfile
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List
+
+
+class SpillBuffer:
+    """
+    Локальный буфер записей очереди статы на время, пока недоступен редис: кольцо в памяти,
+    которое сбрасывается пачками в append-only сегменты на диске (один write и один fsync на пачку).
+    Пока в буфере что-то есть, новые записи тоже идут в него, чтобы при повторе порядок сохранился
+    """
+    def __init__(self, directory: str = os.getenv('STATS_SPILL_DIR',
+                                                  os.path.join(tempfile.gettempdir(), 'requesters_stats_spill')),
+                 ring_size: int = int(os.getenv('STATS_SPILL_RING_SIZE', 1000)),
+                 flush_interval: float = float(os.getenv('STATS_SPILL_FLUSH_INTERVAL', 1)),
+                 segment_bytes: int = int(os.getenv('STATS_SPILL_SEGMENT_BYTES', 4 * 2 ** 20)),
+                 max_bytes: int = int(os.getenv('STATS_SPILL_MAX_BYTES', 256 * 2 ** 20)),
+                 fsync: bool = os.getenv('STATS_SPILL_FSYNC', 'True') == 'True'):
+        """
+        @param directory: Папка сегментов, общая для всех процессов (после рестарта чужие сегменты подбираются)
+        @param ring_size: Сколько записей копится в памяти до сброса на диск
+        @param flush_interval: Сколько секунд запись максимум живет только в памяти
+        @param segment_bytes: Размер сегмента, после которого начинается новый
+        @param max_bytes: Предел сегментов процесса на диске, сверх него выкидываются самые старые
+        @param fsync: Делать ли fsync после каждого сброса
+        """
+        self.directory = directory
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.metrics = {
+            'spilled': 0,
+            'flushes': 0,
+            'replayed': 0,
+            'dropped': 0,
+            'compactions': 0,
+        }
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._ring: Deque[bytes] = deque()
+        self._first_at = 0.0
+        # Сегменты этого процесса от старых к новым
+        self._segments: List[str] = list()
+        self._items: Dict[str, int] = dict()
+        self._sizes: Dict[str, int] = dict()
+        # Сегмент, открытый на запись
+        self._active = None
+        self._file = None
+
+    def _check_fork(self):
+        # После форка кольцо и открытый файл принадлежат родителю
+        if self._pid != os.getpid():
+            self._reset()
+
+    @property
+    def is_active(self) -> bool:
+        """
+        Есть ли в буфере записи (тогда новые записи должны идти сюда же, а не в редис)
+        """
+        return bool(self._ring) or bool(self._segments)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ring) + sum(self._items.values())
+
+    def append(self, *payloads: bytes):
+        """
+        Добавление уже закодированных записей
+        """
+        with self._lock:
+            self._check_fork()
+            if not self._ring:
+                self._first_at = time.monotonic()
+            self._ring.extend(payloads)
+            self.metrics['spilled'] += len(payloads)
+            if len(self._ring) >= self.ring_size or time.monotonic() - self._first_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """
+        Сброс кольца на диск (например, при выходе процесса)
+        """
+        with self._lock:
+            self._check_fork()
+            self._flush()
+
+    def _segment_name(self, created_ns: int) -> str:
+        # Имя начинается со времени создания, так что сортировка по имени -- это порядок записей
+        return os.path.join(self.directory, f'{created_ns:020d}-{self._pid}.seg')
+
+    def _flush(self):
+        """
+        Кольцо -- в текущий сегмент одной записью. Вызывать под _lock
+        """
+        if not self._ring:
+            return
+        data = b''.join(payload + b'\n' for payload in self._ring)
+        try:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._segment_name(time.time_ns())
+                self._file = open(path, 'ab')
+                self._active = path
+                self._segments.append(path)
+                self._items[path], self._sizes[path] = 0, 0
+            path = self._active
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        except OSError as e:
+            print(f'=== STATS SPILL WRITE ERROR {str(e)} ===')
+            # Диск недоступен: в памяти остается не больше ring_size самых новых записей
+            while len(self._ring) > self.ring_size:
+                self._ring.popleft()
+                self.metrics['dropped'] += 1
+            return
+        self._items[path] += len(self._ring)
+        self._sizes[path] += len(data)
+        self._ring.clear()
+        self.metrics['flushes'] += 1
+        if self._sizes[path] >= self.segment_bytes:
+            self._close_active()
+        self._enforce_max_bytes()
+
+    def _close_active(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._active = None
+
+    def _enforce_max_bytes(self):
+        """
+        Выкидывание самых старых закрытых сегментов сверх max_bytes. Вызывать под _lock
+        """
+        closed = [path for path in self._segments if path != self._active]
+        while closed and sum(self._sizes.values()) > self.max_bytes:
+            path = closed.pop(0)
+            self._segments.remove(path)
+            self.metrics['dropped'] += self._items.pop(path)
+            self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            print(f'=== STATS SPILL OVER {self.max_bytes} BYTES, DROPPED {path} ===')
+
+    def _adopt_orphans(self):
+        """
+        Забрать сегменты процессов, которых больше нет (например, после рестарта воркеров).
+        Переименование атомарно, так что один сегмент достается одному процессу
+        """
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.seg'):
+                continue
+            created, _, pid = name[:-len('.seg')].partition('-')
+            if not created.isdigit() or not pid.isdigit() or int(pid) == self._pid or self._is_alive(int(pid)):
+                continue
+            path = self._segment_name(int(created))
+            try:
+                os.rename(os.path.join(self.directory, name), path)
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            with self._lock:
+                self._segments.append(path)
+                self._segments.sort()
+                self._items[path], self._sizes[path] = data.count(b'\n'), len(data)
+
+    @staticmethod
+    def _is_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    def replay(self, sink: Callable[[List[bytes]], None], batch_size: int = 500) -> int:
+        """
+        Повтор записей по порядку: сначала сегменты, потом кольцо. Если sink упал, непереданный остаток
+        сегмента переписывается на место сегмента (компакция), и повтор прекращается до следующего раза
+        @param sink: Куда отдавать пачки записей (например, LPUSH в редис), исключение -- получатель недоступен
+        @param batch_size: Размер пачки
+        @return: Сколько записей передано
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        replayed = 0
+        try:
+            self._adopt_orphans()
+            while True:
+                with self._lock:
+                    self._check_fork()
+                    if not self._segments:
+                        # Остаток кольца отдаем под локом, чтобы новые записи не обогнали его
+                        items = list(self._ring)
+                        if items:
+                            sink(items)
+                            self._ring.clear()
+                            replayed += len(items)
+                        return replayed
+                    self._close_active()
+                    segments = list(self._segments)
+                for path in segments:
+                    replayed += self._replay_segment(path, sink, batch_size)
+        except Exception as e:
+            print(f'=== STATS SPILL REPLAY STOPPED {str(e)} ===')
+            return replayed
+        finally:
+            self.metrics['replayed'] += replayed
+            self._replay_lock.release()
+
+    def _replay_segment(self, path: str, sink: Callable[[List[bytes]], None], batch_size: int) -> int:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # Выкинут по max_bytes, пока шел повтор
+            return 0
+        lines = data.split(b'\n')
+        # Последняя строка без перевода строки -- недописанная при падении процесса запись
+        lines = [line for line in lines[:-1] if line]
+        sent = 0
+        try:
+            for i in range(0, len(lines), batch_size):
+                sink(lines[i:i + batch_size])
+                sent = min(i + batch_size, len(lines))
+        except Exception:
+            self.metrics['replayed'] += sent
+            self._compact(path, lines[sent:])
+            raise
+        with self._lock:
+            if path in self._segments:
+                self._segments.remove(path)
+                os.remove(path)
+            self._items.pop(path, None)
+            self._sizes.pop(path, None)
+        return sent
+
+    def _compact(self, path: str, rest: List[bytes]):
+        """
+        Переписать сегмент, оставив только непереданные записи
+        """
+        data = b''.join(line + b'\n' for line in rest)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        with self._lock:
+            self._items[path], self._sizes[path] = len(rest), len(data)
+        self.metrics['compactions'] += 1
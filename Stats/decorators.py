@@ -1,15 +1,16 @@
 import timeit
-import threading
 from django.conf import settings
-from ..Auth.AuthRequester import AuthRequester
+from ..Auth.AppTokenManager import AppTokenManager
 from ..utils import get_token_from_request
 from ..exceptions import BaseApiRequestError
 from .mixins import CollectStatsMixin
+from ._executor import STATS_EXECUTOR
+from ..tracing import TRACER
 
 
 def collect_request_stats_decorator(app_id=settings.APP_ID, app_secret=settings.APP_SECRET, another_stats_funcs=[]):
     def decorator(func):
-        def wrappe(self: CollectStatsMixin, request, *args, **kwargs):
+        def collect(self: CollectStatsMixin, request, *args, **kwargs):
             try:
                 token = self.app_access_token
             except AttributeError:
@@ -17,10 +18,9 @@ def collect_request_stats_decorator(app_id=settings.APP_ID, app_secret=settings.
                     token = get_token_from_request(request)
                 else:
                     try:
-                        _, tokens = AuthRequester().app_get_token(app_id, app_secret,
-                                                                  token=get_token_from_request(request))
-                        token = tokens['access']
-                    except BaseApiRequestError:
+                        token = AppTokenManager.for_app(app_id, app_secret).get_access_token(
+                            token=get_token_from_request(request))
+                    except (BaseApiRequestError, KeyError):
                         resp = func(self, request, *args, **kwargs)
                         return resp[0] if isinstance(resp, tuple) else resp
 
@@ -33,17 +33,26 @@ def collect_request_stats_decorator(app_id=settings.APP_ID, app_secret=settings.
             process_time = timeit.default_timer() - start_time
             # self.collect_request_stats(app_token=token, process_time=process_time, endpoint=app_id,
             #                            request=request, response=response)
-            mst = threading.Thread(target=self.collect_request_stats, kwargs={
+            stats_kwargs = {
                 'app_token': token, 'process_time': process_time, 'endpoint': app_id, 'request': request,
                 'response': response,
-            })
-            mst.start()
+            }
+            STATS_EXECUTOR.submit(self.collect_request_stats, kwargs=stats_kwargs,
+                                  spill=lambda: self.spill_request_stats(**stats_kwargs))
 
             for stat_func, func_kwargs in zip(another_stats_funcs, additional_kwargs_for_stats_funcs):
                 func_kwargs['app_token'] = token
-                tt = threading.Thread(target=stat_func, args=(self, ), kwargs=func_kwargs)
-                tt.start()
+                STATS_EXECUTOR.submit(stat_func, args=(self, ), kwargs=func_kwargs)
                 # stat_func(self, **func_kwargs)
             return response
+
+        def wrappe(self: CollectStatsMixin, request, *args, **kwargs):
+            if not TRACER.enabled:
+                return collect(self, request, *args, **kwargs)
+            # Серверный спан вьюхи, дочерний к traceparent входящего запроса: в него попадут и вызовы
+            # реквестеров из вьюхи, и фоновая отправка статы
+            with TRACER.span(f'{request.method} {app_id}', kind='server', parent=TRACER.extract(request.META),
+                             attributes={'http.method': request.method, 'http.path': request.path}):
+                return collect(self, request, *args, **kwargs)
         return wrappe
     return decorator
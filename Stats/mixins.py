@@ -3,6 +3,7 @@ from datetime import datetime
 from django.conf import settings
 from rest_framework.views import Request, Response
 from .StatsRequester import StatsRequester
+from ._batcher import STATS_BATCHER
 from ..Auth.AuthRequester import AuthRequester
 from ..exceptions import BaseApiRequestError
 from ..utils import get_token_from_request
@@ -23,6 +24,15 @@ class CollectStatsMixin:
         except BaseApiRequestError:
             return None
 
+    def _create_stats(self, stat_type: str, token: str, **data):
+        """
+        Отправка события статы: в микро-батчер, если он включен, иначе сразу одним запросом
+        """
+        if STATS_BATCHER.enabled and not settings.TESTING:
+            STATS_BATCHER.add(stat_type, token, data)
+        else:
+            getattr(self.r, f'create_{stat_type}_statistics')(token=token, **data)
+
     def collect_request_stats(self, app_token: str, process_time: float, endpoint: str, request: Request,
                               response: Response):
         """
@@ -36,12 +46,23 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'request'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_request_statistics(method=request.method, user_id=auth_json['id'], endpoint=endpoint,
-                                             process_time=process_time, status_code=response.status_code,
-                                             request_dt=datetime.now().isoformat(), token=app_token)
+            self._create_stats('request', app_token, method=request.method, user_id=auth_json['id'],
+                               endpoint=endpoint, process_time=process_time, status_code=response.status_code,
+                               request_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
 
+    def spill_request_stats(self, app_token: str, process_time: float, endpoint: str, request: Request,
+                            response: Response):
+        """
+        Стата по реквесту сразу в очередь StatsRequestsQueue, без сетевых запросов
+        (когда пул фоновых задач переполнен). Юзер берется только из кэша AuthRequester
+        """
+        user_json = AuthRequester.user_info_cache.get(get_token_from_request(request))
+        user_id = user_json[1].get('id') if isinstance(user_json, tuple) else None
+        self.r.queue.add_requests_stat(request.method, user_id, endpoint, process_time, response.status_code,
+                                       datetime.now().isoformat(), app_token)
+
     def collect_place_stats(self, app_token: str, action: r.PLACES_ACTIONS, place_id: int, request: Request):
         """
         Сбор статы по местам
@@ -57,8 +78,8 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'place'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_place_statistics(action=action, place_id=place_id, user_id=auth_json['id'], token=app_token,
-                                           action_dt=datetime.now().isoformat())
+            self._create_stats('place', app_token, action=action, place_id=place_id, user_id=auth_json['id'],
+                               action_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
 
@@ -74,9 +95,8 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'rating'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_rating_statistics(old_rating=old_rating, new_rating=new_rating, place_id=place_id,
-                                            user_id=auth_json['id'], action_dt=datetime.now().isoformat(),
-                                            token=app_token)
+            self._create_stats('rating', app_token, old_rating=old_rating, new_rating=new_rating, place_id=place_id,
+                               user_id=auth_json['id'], action_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
 
@@ -92,8 +112,8 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'accept'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_accept_statistics(action=action, place_id=place_id, user_id=auth_json['id'],
-                                            action_dt=datetime.now().isoformat(), token=app_token)
+            self._create_stats('accept', app_token, action=action, place_id=place_id, user_id=auth_json['id'],
+                               action_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
 
@@ -109,8 +129,8 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'pin_purchase'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_pin_purchase_statistics(pin_id=pin_id, user_id=auth_json['id'],
-                                                  purchase_dt=datetime.now().isoformat(), token=app_token)
+            self._create_stats('pin_purchase', app_token, pin_id=pin_id, user_id=auth_json['id'],
+                               purchase_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
 
@@ -126,7 +146,7 @@ class CollectStatsMixin:
             token_json['stat_type'] = 'achievement'
             app_token = json.dumps(token_json)
         try:
-            self.r.create_achievement_statistics(achievement_id=achievement_id, user_id=auth_json['id'],
-                                                 achievement_dt=datetime.now().isoformat(), token=app_token)
+            self._create_stats('achievement', app_token, achievement_id=achievement_id, user_id=auth_json['id'],
+                               achievement_dt=datetime.now().isoformat())
         except BaseApiRequestError:
             pass
@@ -1,6 +1,8 @@
 from django.conf import settings
 from ._UsersRequester import UsersRequester as __u
 from ._MockUsersRequester import MockUsersRequester as __m
+from ._AsyncUsersRequester import AsyncUsersRequester as __aa
+from ..Mock.AsyncMockRequester import async_mock_class
 
 
 __tst = settings.TESTING
@@ -8,9 +10,12 @@ try:
     if __tst:
         __art = settings.ALLOW_REQUESTS_TEST
         UsersRequester = __u if __art else __m
+        AsyncUsersRequester = __aa if __art else async_mock_class(__m)
     else:
         __ar = settings.ALLOW_REQUESTS
         UsersRequester = __u if __ar else __m
+        AsyncUsersRequester = __aa if __ar else async_mock_class(__m)
 except AttributeError:
     UsersRequester = __u if not __tst else __m
+    AsyncUsersRequester = __aa if not __tst else async_mock_class(__m)
 
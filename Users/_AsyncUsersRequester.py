@@ -0,0 +1,9 @@
+from ._UsersRequester import UsersRequester
+from ..AsyncBaseApiRequester import AsyncBaseApiRequester
+
+
+class AsyncUsersRequester(AsyncBaseApiRequester, UsersRequester):
+    """
+    Асинхронный реквестер к серваку юзеров, все методы UsersRequester -- корутины
+    """
+    pass
@@ -1,5 +1,6 @@
+import os
 import requests
-from typing import Tuple, List, Dict, Any, Union
+from typing import Tuple, List, Dict, Any, Union, Iterator
 from enum import Enum
 from django.conf import settings
 from ..BaseApiRequester import BaseApiRequester
@@ -9,6 +10,13 @@ class UsersRequester(BaseApiRequester):
     """
     Реквестер к серваку юзеров
     """
+    # С USERS_READ_CACHE=True список юзеров -- из get_cache: устаревший ответ отдается сразу и обновляется в фоне,
+    # а при открытом брейкере отдается еще USERS_READ_CACHE_STALE_IF_ERROR_TTL секунд. Профили по айди не кэшируются
+    if os.getenv('USERS_READ_CACHE', 'False') == 'True':
+        get_cache_ttls = {'profiles/$': float(os.getenv('USERS_READ_CACHE_TTL', 10))}
+        get_cache_stale_ttls = {'profiles/$': float(os.getenv('USERS_READ_CACHE_STALE_TTL', 60))}
+        get_cache_stale_if_error_ttls = {'profiles/$': float(os.getenv('USERS_READ_CACHE_STALE_IF_ERROR_TTL', 600))}
+
     class AWARD_TYPE(Enum):
         """
         Тип награды
@@ -34,6 +42,13 @@ class UsersRequester(BaseApiRequester):
         params = {'limit': limit, 'offset': offset}
         return self._base_get(path_suffix='profiles/', token=token, params=params)
 
+    def iter_users(self, token: str, page_size: int = 100, prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Ленивый обход всех юзеров постранично
+        """
+        return self._iter_paginated(lambda limit, offset: self.get_users_paginated(limit, offset, token),
+                                    page_size, prefetch)
+
     def get_user_info(self, user_id: int, token: str) -> Tuple[requests.Response, Dict[str, Any]]:
         """
         Получение инфы о юзере
@@ -0,0 +1,124 @@
+import time
+import threading
+
+
+class FakeRedis:
+    """
+    Стенд-ин редиса в памяти: строки (без протухания), множества, списки и пайплайны,
+    каждый раунд-трип стоит rtt секунд
+    """
+    def __init__(self, rtt: float = 0.0002):
+        self.rtt = rtt
+        self.lists = dict()
+        self.strings = dict()
+        self.sets = dict()
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def _lpush(self, key, *values):
+        lst = self.lists.setdefault(key, [])
+        for v in values:
+            lst.insert(0, v if isinstance(v, bytes) else str(v).encode('utf-8'))
+        return len(lst)
+
+    def _lrange(self, key, start, end):
+        lst = self.lists.get(key, [])
+        end = len(lst) if end == -1 else end + 1 if end >= 0 else len(lst) + end + 1
+        return lst[max(start, -len(lst)) if start < 0 else start:end]
+
+    def _ltrim(self, key, start, end):
+        lst = self.lists.get(key, [])
+        self.lists[key] = self._lrange(key, start, end) if lst else []
+        return True
+
+    def _get(self, key):
+        return self.strings.get(key)
+
+    def _set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value if isinstance(value, bytes) else str(value).encode('utf-8')
+        return True
+
+    def _delete(self, *keys):
+        return sum(self.strings.pop(key, None) is not None for key in keys)
+
+    def _sadd(self, key, *members):
+        s = self.sets.setdefault(key, set())
+        before = len(s)
+        s.update(m if isinstance(m, bytes) else str(m).encode('utf-8') for m in members)
+        return len(s) - before
+
+    def _srem(self, key, *members):
+        s = self.sets.get(key, set())
+        before = len(s)
+        s.difference_update(m if isinstance(m, bytes) else str(m).encode('utf-8') for m in members)
+        return before - len(s)
+
+    def _smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    def _expire(self, key, seconds):
+        return True
+
+    def __getattr__(self, item):
+        # Команды без пайплайна: get, set, sadd, ... -- один раунд-трип
+        impl = getattr(type(self), f'_{item}', None)
+        if impl is None:
+            raise AttributeError(item)
+
+        def command(*args, **kwargs):
+            with self._lock:
+                self._round_trip()
+                return impl(self, *args, **kwargs)
+        return command
+
+    def lpush(self, key, *values):
+        with self._lock:
+            self._round_trip()
+            return self._lpush(key, *values)
+
+    def rpush(self, key, *values):
+        with self._lock:
+            self._round_trip()
+            lst = self.lists.setdefault(key, [])
+            lst.extend(v if isinstance(v, bytes) else str(v).encode('utf-8') for v in values)
+            return len(lst)
+
+    def lpop(self, key):
+        with self._lock:
+            self._round_trip()
+            lst = self.lists.get(key)
+            return lst.pop(0) if lst else None
+
+    def llen(self, key):
+        with self._lock:
+            self._round_trip()
+            return len(self.lists.get(key, []))
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, r: FakeRedis):
+        self.r = r
+        self.commands = []
+
+    def __getattr__(self, item):
+        def command(*args, **kwargs):
+            self.commands.append((item, args, kwargs))
+            return self
+        return command
+
+    def execute(self):
+        with self.r._lock:
+            self.r._round_trip()
+            res = [getattr(self.r, f'_{name}')(*args, **kwargs) for name, args, kwargs in self.commands]
+        self.commands = []
+        return res
@@ -0,0 +1,13 @@
+import os
+import sys
+import importlib
+
+
+def import_package_module(name: str):
+    """
+    Импорт модуля сабмодуля по имени его директории (обычно ApiRequesters)
+    @param name: Модуль внутри пакета, например 'BaseApiRequester'
+    """
+    pkg_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.dirname(pkg_dir))
+    return importlib.import_module(f'{os.path.basename(pkg_dir)}.{name}')
@@ -0,0 +1,42 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    Отвечает на любой запрос маленьким джсоном, держит keep-alive
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    body = json.dumps({'id': 1, 'name': 'stub'}).encode('utf-8')
+
+    def _answer(self, code=200):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def do_GET(self):
+        self._answer(200)
+
+    def do_POST(self):
+        self._answer(201)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    """
+    Поднимает стаб-сервер на свободном порту
+    @return: (server, host)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
@@ -0,0 +1,55 @@
+"""
+Сравнение кодеков джсона на большом ответе (список мест) и на пачке статы
+
+$ python benchmarks/bench_codec.py [n_items]
+"""
+import sys
+import json
+import timeit
+import requests
+from _package import import_package_module
+
+codec = import_package_module('codec')
+
+
+def make_places(n):
+    return [{
+        'id': i,
+        'name': f'Место {i}',
+        'latitude': 55.75 + i / 1e5,
+        'longitude': 37.61 + i / 1e5,
+        'address': f'ул. Тверская, д. {i}',
+        'checked_by_moderator': True,
+        'rating': 4.5,
+        'accepts_cnt': i % 17,
+        'deleted_flg': False,
+        'created_dt': '2020-03-03T12:12:12Z',
+    } for i in range(n)]
+
+
+def fake_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response._content = body
+    response.status_code = 200
+    response.encoding = None
+    return response
+
+
+def bench(name, fn, repeat=20):
+    seconds = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f'{name:<40} {seconds * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    places = make_places(n)
+    body = json.dumps(places).encode('utf-8')
+    print(f'{n} places, {len(body) / 1024:.0f} KiB')
+    bench('decode: response.json() (stdlib)', lambda: fake_response(body).json())
+    for name in ('json', 'ujson', 'orjson'):
+        c = codec.get_codec(name)
+        if c.name != name:
+            print(f'{name} is not installed')
+            continue
+        bench(f'decode: {name}.loads(response.content)', lambda: c.loads(fake_response(body).content))
+        bench(f'encode: {name}.dumps(places)', lambda: c.dumps(places))
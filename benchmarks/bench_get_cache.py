@@ -0,0 +1,53 @@
+"""
+Доля попаданий кэша GET в зависимости от числа воркеров: у каждого свой L1, L2 (редис) -- общий.
+Запросы по ключам с распределением Ципфа, промах -- поход в сервис (считаем их)
+
+$ python benchmarks/bench_get_cache.py [n_requests] [n_keys]
+"""
+import sys
+import json
+import random
+from _package import import_package_module
+from _fake_redis import FakeRedis
+
+response_cache = import_package_module('response_cache')
+TieredResponseCache, CachedResponse = response_cache.TieredResponseCache, response_cache.CachedResponse
+
+BODY = b'{"id":1,"name":"' + b'x' * 600 + b'"}'
+
+
+def run(n_workers: int, n_requests: int, n_keys: int, l2: bool) -> dict:
+    redis = FakeRedis(rtt=0)
+    workers = list()
+    for _ in range(n_workers):
+        cache = TieredResponseCache(l1_size=n_keys // 2, l1_ttl=60, l2_enabled=l2, beta=0)
+        cache._redis = redis
+        workers.append(cache)
+    rnd = random.Random(0)
+    weights = [1 / (i + 1) for i in range(n_keys)]
+    keys = rnd.choices(range(n_keys), weights=weights, k=n_requests)
+    origin = 0
+    for i, k in enumerate(keys):
+        cache = workers[i % n_workers]
+        key = ('GET', f'http://places/api/places/{k}/', (), 'token')
+        if cache.get(key) is None:
+            origin += 1
+            cache.set(key, CachedResponse(BODY, {}, 0.01, 1e12))
+    l1 = sum(c.metrics['l1']['hits'] for c in workers)
+    l2_hits = sum(c.metrics['l2']['hits'] for c in workers)
+    return {'l1': l1 / n_requests, 'l2': l2_hits / n_requests, 'origin': origin / n_requests}
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_keys = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    for n_workers in (1, 4, 16):
+        only_l1, tiered = run(n_workers, n, n_keys, False), run(n_workers, n, n_keys, True)
+        print(f'{n_workers:>2} workers: L1 only -- {only_l1["l1"]:.1%} hits, {only_l1["origin"]:.1%} to service; '
+              f'L1+L2 -- {tiered["l1"]:.1%} L1, {tiered["l2"]:.1%} L2, {tiered["origin"]:.1%} to service')
+    rnd = random.Random(1)
+    page = json.dumps([{'id': i, 'name': f'place {rnd.random():.6f}', 'address': 'Moscow, Tverskaya st.',
+                        'latitude': 55 + rnd.random(), 'longitude': 37 + rnd.random(), 'rating': rnd.randint(1, 5),
+                        'created_by': rnd.randint(1, 1000), 'deleted_flg': False} for i in range(50)]).encode('utf-8')
+    entry = CachedResponse(page, {'Content-Type': 'application/json'}, 0.01, 1e12)
+    print(f'redis value: {len(entry.body)} B body -> {len(entry.encode(1024))} B stored')
@@ -0,0 +1,42 @@
+"""
+Память и время на список мест: словари из джсона против записей models.Place
+
+$ python benchmarks/bench_models.py [n_items]
+"""
+import gc
+import sys
+import json
+import timeit
+import tracemalloc
+from _package import import_package_module
+from bench_codec import make_places
+
+models = import_package_module('models')
+
+
+def retained(build):
+    """
+    Сколько памяти держит результат build и сколько он строился
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = timeit.default_timer()
+    obj = build()
+    seconds = timeit.default_timer() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size, seconds
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    body = json.dumps(make_places(n))
+    dicts, dicts_size, dicts_time = retained(lambda: json.loads(body))
+    lazy, lazy_size, lazy_time = retained(lambda: models.Place.many(json.loads(body)))
+    full, full_size, full_time = retained(lambda: models.Place.many(json.loads(body)).materialize())
+    print(f'{n} places (decode included, values are the same strings/numbers in all three)')
+    print(f'dicts:                   {dicts_size / 2 ** 20:7.2f} MiB  {dicts_time * 1000:7.1f} ms')
+    print(f'ModelList, untouched:    {lazy_size / 2 ** 20:7.2f} MiB  {lazy_time * 1000:7.1f} ms')
+    print(f'ModelList, materialized: {full_size / 2 ** 20:7.2f} MiB  {full_time * 1000:7.1f} ms')
+    print(f'per row container: dict {sys.getsizeof(dicts[0])} B, Place {sys.getsizeof(full[0])} B')
@@ -0,0 +1,42 @@
+"""
+Сравнение пула keep-alive сессий с новым соединением на каждый запрос
+
+$ python benchmarks/bench_sessions.py [n_requests]
+"""
+import sys
+import timeit
+import requests
+from _package import import_package_module
+from _stub_server import start_stub_server
+
+BaseApiRequester = import_package_module('BaseApiRequester').BaseApiRequester
+
+
+class FreshConnectionRequester(BaseApiRequester):
+    """
+    Старое поведение: модульные requests.get, без переиспользования соединений
+    """
+    @property
+    def session(self):
+        return requests
+
+
+def run(requester, n):
+    start = timeit.default_timer()
+    for _ in range(n):
+        requester.get('stub/')
+    return timeit.default_timer() - start
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server, host = start_stub_server()
+    pooled, fresh = BaseApiRequester(), FreshConnectionRequester()
+    pooled.host = fresh.host = host
+    pooled.get('stub/')
+    t_fresh = run(fresh, n)
+    t_pooled = run(pooled, n)
+    print(f'fresh connections: {n} requests in {t_fresh:.3f}s ({n / t_fresh:.0f} rps)')
+    print(f'pooled keep-alive: {n} requests in {t_pooled:.3f}s ({n / t_pooled:.0f} rps)')
+    print(f'speedup: x{t_fresh / t_pooled:.2f}')
+    server.shutdown()
@@ -0,0 +1,67 @@
+"""
+Разбор StatsRequestsQueue: по одной записи (llen + lpop) против пачек (LRANGE+LTRIM) с bulk-отправкой
+
+$ python benchmarks/bench_stats_queue.py [n_items] [send_latency_ms]
+"""
+import sys
+import json
+import time
+import timeit
+from _package import import_package_module
+from _fake_redis import FakeRedis
+
+StatsRequestsQueue = import_package_module('Stats._request_queue').StatsRequestsQueue
+
+
+class FakeStatsRequester:
+    """
+    Вместо HTTP -- задержка send_latency на каждую отправку
+    """
+    def __init__(self, send_latency: float):
+        self.send_latency = send_latency
+
+    def create_request_statistics(self, **kwargs):
+        time.sleep(self.send_latency)
+
+    def create_request_statistics_bulk(self, events, token):
+        time.sleep(self.send_latency)
+
+
+def fill(queue, n):
+    for i in range(n):
+        queue.add_requests_stat('GET', i, 'bench', 0.01, 200, '2020-01-01T00:00:00', 'token')
+
+
+def drain_one_by_one(queue, r):
+    # Старый алгоритм fire(): llen + lpop + отправка на каждую запись
+    while queue.r.llen('requests') > 0:
+        req_json = json.loads(queue.r.lpop('requests').decode('utf-8'))
+        req_json.pop('type')
+        r.create_request_statistics(**req_json)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.001
+    r = FakeStatsRequester(latency)
+
+    queue = StatsRequestsQueue()
+    queue.r = FakeRedis()
+    fill(queue, n)
+    queue.r.round_trips = 0
+    start = timeit.default_timer()
+    drain_one_by_one(queue, r)
+    t_old, rt_old = timeit.default_timer() - start, queue.r.round_trips
+
+    queue = StatsRequestsQueue()
+    queue.r = FakeRedis()
+    queue._get_requester = lambda: r
+    fill(queue, n)
+    queue.r.round_trips = 0
+    start = timeit.default_timer()
+    queue.fire()
+    t_new, rt_new = timeit.default_timer() - start, queue.r.round_trips
+
+    print(f'one by one: {n} items in {t_old:.3f}s ({n / t_old:.0f} items/s), {rt_old} redis round-trips')
+    print(f'batched:    {n} items in {t_new:.3f}s ({n / t_new:.0f} items/s), {rt_new} redis round-trips')
+    print(f'metrics: {queue.metrics}')
@@ -0,0 +1,73 @@
+"""
+Пропускная способность StatsRequestsQueue на каждом уровне: редис, кольцо в памяти, сегменты на диске
+(с fsync и без), и скорость возврата буфера в редис
+
+$ python benchmarks/bench_stats_spill.py [n_items] [redis_rtt_ms]
+"""
+import sys
+import shutil
+import tempfile
+import timeit
+from redis import exceptions
+from _package import import_package_module
+from _fake_redis import FakeRedis
+
+StatsRequestsQueue = import_package_module('Stats._request_queue').StatsRequestsQueue
+SpillBuffer = import_package_module('Stats._spill').SpillBuffer
+
+
+class DownRedis(FakeRedis):
+    """
+    Недоступный редис: каждый LPUSH -- ConnectionError
+    """
+    def lpush(self, *args):
+        raise exceptions.ConnectionError('redis is down')
+
+
+def push(queue, n):
+    start = timeit.default_timer()
+    for i in range(n):
+        queue.add_requests_stat('GET', i, 'bench', 0.01, 200, '2020-01-01T00:00:00', 'token')
+    return timeit.default_timer() - start
+
+
+QUEUES = []
+
+
+def make_queue(redis, **spill_kwargs):
+    queue = StatsRequestsQueue()
+    queue.r = redis
+    queue.spill = SpillBuffer(tempfile.mkdtemp(prefix='bench_spill_'), **spill_kwargs)
+    QUEUES.append(queue)
+    return queue
+
+
+def report(name, n, seconds):
+    print(f'{name:<36} {n / seconds:10.0f} items/s')
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0002
+
+    queue = make_queue(FakeRedis(rtt))
+    report(f'redis (rtt {rtt * 1000:.1f} ms)', n, push(queue, n))
+
+    queue = make_queue(DownRedis(0), ring_size=n + 1, flush_interval=3600)
+    report('spill: memory ring only', n, push(queue, n))
+
+    for fsync in (True, False):
+        queue = make_queue(DownRedis(0), ring_size=1000, fsync=fsync)
+        seconds = push(queue, n)
+        queue.spill.flush()
+        report(f'spill: ring + segments, fsync={fsync}', n, seconds)
+
+    # Возврат последнего буфера (на диске) в живой редис
+    redis = FakeRedis(rtt)
+    start = timeit.default_timer()
+    replayed = queue.spill.replay(lambda payloads: redis.lpush('requests', *payloads), batch_size=200)
+    report('replay: segments -> redis', replayed, timeit.default_timer() - start)
+    print(f'spill metrics: {queue.spill.metrics}')
+    for q in QUEUES:
+        q.spill.flush()
+        shutil.rmtree(q.spill.directory, ignore_errors=True)
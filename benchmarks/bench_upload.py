@@ -0,0 +1,45 @@
+"""
+Пик памяти при подготовке multipart-боди: files= у requests (склеивает всё боди в байты) против MultipartEncoder
+(отдает куски по мере отправки). Файл читается с диска, сеть не нужна
+
+$ python benchmarks/bench_upload.py [size_mb]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+import requests
+from _package import import_package_module
+
+MultipartEncoder = import_package_module('multipart').MultipartEncoder
+
+
+def peak(func) -> int:
+    tracemalloc.start()
+    func()
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_bytes
+
+
+def with_requests(path: str):
+    with open(path, 'rb') as f:
+        request = requests.Request('POST', 'http://media/api/images/', data={'object_id': 1}, files={'image': f})
+        request.prepare()
+
+
+def with_encoder(path: str):
+    with open(path, 'rb') as f:
+        for _ in MultipartEncoder({'object_id': 1}, {'image': ('image.png', f, None)}):
+            pass
+
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as f:
+        f.write(os.urandom(size * 1024 * 1024))
+    try:
+        for name, func in (('requests files=', with_requests), ('MultipartEncoder', with_encoder)):
+            print(f'{name:>16}: peak {peak(lambda: func(f.name)) / 1024 / 1024:.2f} MiB for {size} MiB file')
+    finally:
+        os.remove(f.name)
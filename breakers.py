@@ -0,0 +1,153 @@
+import os
+import datetime
+import threading
+import pybreaker
+from typing import Dict, Any, Union
+
+
+def _replay(error: Union[Exception, None]):
+    """
+    Повтор результата уже выполненного запроса внутри breaker.call
+    """
+    if error is not None:
+        raise error
+
+
+class BreakerMetrics(pybreaker.CircuitBreakerListener):
+    """
+    Счетчики по брейкерам: успехи, ошибки, переходы состояний, отбитые без запроса вызовы
+    """
+    def __init__(self):
+        self._counters: Dict[str, Dict[str, int]] = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, counter: str):
+        with self._lock:
+            counters = self._counters.setdefault(name, {'successes': 0, 'failures': 0, 'rejected': 0,
+                                                        'opened': 0, 'state_changes': 0})
+            counters[counter] += 1
+
+    def success(self, cb: pybreaker.CircuitBreaker):
+        self.inc(cb.name, 'successes')
+
+    def failure(self, cb: pybreaker.CircuitBreaker, exc: BaseException):
+        self.inc(cb.name, 'failures')
+
+    def state_change(self, cb: pybreaker.CircuitBreaker, old_state, new_state):
+        self.inc(cb.name, 'state_changes')
+        if new_state.name == pybreaker.STATE_OPEN:
+            self.inc(cb.name, 'opened')
+        print(f'=== CIRCUIT BREAKER {cb.name}: {old_state.name if old_state else None} -> {new_state.name} ===')
+
+    def get(self, name: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters.get(name, dict()))
+
+
+class CircuitBreakers:
+    """
+    Реестр брейкеров по хостам (или эндпоинтам). Сам запрос идет вне breaker.call, потому что
+    pybreaker держит свой лок на все время вызова, и через один брейкер запросы шли бы по одному
+    """
+    def __init__(self, fail_max: int = int(os.getenv('REQUESTERS_BREAKER_FAIL_MAX', 5)),
+                 reset_timeout: float = float(os.getenv('REQUESTERS_BREAKER_RESET_TIMEOUT', 30))):
+        """
+        @param fail_max: Сколько ошибок подряд открывают брейкер
+        @param reset_timeout: Через сколько секунд открытый брейкер пропускает пробный запрос
+        """
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.metrics = BreakerMetrics()
+        self._breakers: Dict[str, pybreaker.CircuitBreaker] = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, fail_max: Union[int, None] = None,
+            reset_timeout: Union[float, None] = None) -> pybreaker.CircuitBreaker:
+        """
+        Брейкер по имени, создается при первом обращении
+        @param name: Имя, обычно хост сервиса
+        @param fail_max: fail_max нового брейкера, по умолчанию из реестра
+        @param reset_timeout: reset_timeout нового брейкера, по умолчанию из реестра
+        """
+        breaker = self._breakers.get(name)
+        if breaker is not None:
+            return breaker
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = pybreaker.CircuitBreaker(fail_max=fail_max or self.fail_max,
+                                                   reset_timeout=reset_timeout or self.reset_timeout,
+                                                   listeners=[self.metrics], name=name)
+                self._breakers[name] = breaker
+            return breaker
+
+    def register(self, breaker: pybreaker.CircuitBreaker, name: Union[str, None] = None):
+        """
+        Добавление готового брейкера (например, DB_BREAKER статы) в реестр и метрики
+        """
+        name = name or breaker.name
+        breaker._name = name
+        with self._lock:
+            self._breakers[name] = breaker
+        if self.metrics not in breaker.listeners:
+            breaker.add_listener(self.metrics)
+
+    def before_call(self, breaker: pybreaker.CircuitBreaker):
+        """
+        Проверка перед запросом. Открытый брейкер после reset_timeout пропускает один пробный запрос,
+        остальные отбиваются, пока его результат не записан через record
+        @raise pybreaker.CircuitBreakerError: Брейкер открыт
+        """
+        state = breaker.current_state
+        if state == pybreaker.STATE_CLOSED:
+            return
+        with breaker._lock:
+            state = breaker.current_state
+            if state == pybreaker.STATE_OPEN:
+                opened_at = breaker._state_storage.opened_at
+                reset_at = opened_at + datetime.timedelta(seconds=breaker.reset_timeout) if opened_at else None
+                if reset_at is None or datetime.datetime.utcnow() >= reset_at:
+                    breaker.half_open()
+                    return
+            elif state != pybreaker.STATE_HALF_OPEN:
+                return
+        self.metrics.inc(breaker.name, 'rejected')
+        raise pybreaker.CircuitBreakerError(f'Circuit breaker {breaker.name} is open')
+
+    @staticmethod
+    def is_open(breaker: pybreaker.CircuitBreaker) -> bool:
+        """
+        Отобьет ли брейкер запрос сейчас (без побочных эффектов before_call)
+        """
+        state = breaker.current_state
+        if state == pybreaker.STATE_HALF_OPEN:
+            return True
+        if state != pybreaker.STATE_OPEN:
+            return False
+        opened_at = breaker._state_storage.opened_at
+        return opened_at is not None and \
+            datetime.datetime.utcnow() < opened_at + datetime.timedelta(seconds=breaker.reset_timeout)
+
+    @staticmethod
+    def record(breaker: pybreaker.CircuitBreaker, error: Union[Exception, None] = None):
+        """
+        Запись результата запроса: успех, либо ошибка
+        """
+        try:
+            breaker.call(_replay, error)
+        except Exception:
+            # Ошибку запроса (или CircuitBreakerError при открытии) вызывающий обрабатывает сам
+            pass
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Состояние и счетчики всех брейкеров
+        """
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {name: {'state': breaker.current_state, 'fail_counter': breaker.fail_counter, **self.metrics.get(name)}
+                for name, breaker in breakers}
+
+
+BREAKERS = CircuitBreakers()
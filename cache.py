@@ -0,0 +1,99 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Dict, Optional
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш с ограничением размера (LRU) и временем жизни записей (TTL)
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 30):
+        """
+        @param maxsize: Максимум записей, при превышении вытесняется самая давно использованная
+        @param ttl: Время жизни записи по умолчанию, в секундах
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Получение значения
+        @param key: Ключ
+        @param default: Что вернуть, если записи нет или она протухла
+        @return: Значение из кэша, либо default
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Сохранение значения
+        @param key: Ключ
+        @param value: Значение
+        @param ttl: Время жизни, если нужно отличное от дефолтного; <= 0 -- не сохранять
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable = None):
+        """
+        Удаление записи, либо очистка всего кэша, если ключ не передан
+        @param key: Ключ
+        """
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Удаление всех записей, ключи которых подходят под predicate
+        @return: Сколько записей удалено
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Счетчики попаданий/промахов
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+            }
@@ -0,0 +1,71 @@
+import os
+import json
+from typing import Any, Callable, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """
+    Кодек джсона: dumps отдает байты, loads принимает байты или строку.
+    Ошибки те же, что у json: TypeError при кодировании, ValueError при разборе
+    """
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[Union[bytes, str]], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return f'JsonCodec({self.name})'
+
+
+def _stdlib_codec() -> JsonCodec:
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return JsonCodec('json', lambda obj: encoder.encode(obj).encode('utf-8'), json.loads)
+
+
+def _orjson_codec() -> JsonCodec:
+    # Ключи-не-строки (например, айди) json приводит к строкам, orjson без опции падает
+    return JsonCodec('orjson', lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), orjson.loads)
+
+
+def _ujson_codec() -> JsonCodec:
+    return JsonCodec('ujson', lambda obj: ujson.dumps(obj, ensure_ascii=False).encode('utf-8'), ujson.loads)
+
+
+def get_codec(name: str = 'auto') -> JsonCodec:
+    """
+    Кодек по имени
+    @param name: orjson, ujson, json, либо auto -- самый быстрый из установленных
+    @return: Кодек, stdlib json, если запрошенной библиотеки нет
+    """
+    if name in ('auto', 'orjson') and orjson is not None:
+        return _orjson_codec()
+    if name in ('auto', 'ujson') and ujson is not None:
+        return _ujson_codec()
+    return _stdlib_codec()
+
+
+CODEC = get_codec(os.getenv('REQUESTERS_JSON_CODEC', 'auto'))
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Кодирование в джсон текущим кодеком
+    """
+    return CODEC.dumps(obj)
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """
+    Разбор джсона текущим кодеком, прямо из байтов ответа
+    """
+    return CODEC.loads(data)
@@ -0,0 +1,57 @@
+import os
+from typing import Any, Dict, Union
+from .cache import TTLCache
+
+
+class ConditionalEntry:
+    """
+    Закэшированный ответ GET с валидаторами (ETag/Last-Modified). Хранятся байты и хэдеры, а не сам ответ:
+    на 304 каждому вызывающему собирается свой ответ и свой джсон (в ответе requests лежат хэдеры запроса,
+    в том числе чужой токен)
+    """
+    __slots__ = ('url', 'body', 'headers', 'etag', 'last_modified', 'token')
+
+    def __init__(self, response: Any, token: str):
+        self.url = str(response.url)
+        self.body = response.content
+        self.headers = dict(response.headers)
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.token = token
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def get_conditional_headers(self, token: str) -> Dict[str, str]:
+        """
+        Хэдеры условного запроса. Запись общая для всех токенов: ETag однозначно определяет содержимое,
+        а по Last-Modified разные юзеры могут видеть разное, поэтому его шлем только тому же токену
+        """
+        headers = dict()
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        elif self.last_modified and token == self.token:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+# Ответы условных GET, общие на процесс. Ограничен числом записей, время жизни -- по пути (conditional_get_ttls)
+CONDITIONAL_CACHE = TTLCache(maxsize=int(os.getenv('REQUESTERS_CONDITIONAL_CACHE_SIZE', 512)),
+                             ttl=float(os.getenv('REQUESTERS_CONDITIONAL_CACHE_TTL', 300)))
+
+
+def get_conditional_ttl(ttls: Dict[str, float], path_suffix: str) -> Union[float, None]:
+    """
+    Время жизни записи для пути: самый длинный подходящий префикс из ttls
+    @param ttls: Префикс path_suffix -> TTL в секундах. Префикс с $ на конце -- только точное совпадение
+    (например, 'profiles/$' -- список, но не profiles/5/)
+    @param path_suffix: Путь запроса
+    @return: TTL, либо None, если путь не кэшируется
+    """
+    best = None
+    for prefix, ttl in ttls.items():
+        matches = path_suffix == prefix[:-1] if prefix.endswith('$') else path_suffix.startswith(prefix)
+        if matches and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return None if best is None else ttls[best]
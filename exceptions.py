@@ -1,4 +1,5 @@
 import requests
+from .codec import loads
 
 
 class BaseApiRequestError(Exception):
@@ -23,7 +24,7 @@ class UnexpectedResponse(BaseApiRequestError):
         self.response = response
         self.code = response.status_code
         try:
-            self.body = response.json()
+            self.body = loads(response.content)
         except ValueError:
             self.body = response.text
         self.message += f' status code = {self.code}, response body = {self.body}'
@@ -34,3 +35,14 @@ class JsonDecodeError(BaseApiRequestError):
         super().__init__(message=message)
         self.body_text = body_text
         self.message += f' {self.body_text}'
+
+
+class DeadlineExceeded(RequestError):
+    def __init__(self, message: str = 'Deadline exceeded'):
+        super().__init__(message=message)
+
+
+class CircuitOpenError(RequestError):
+    def __init__(self, breaker_name: str, message: str = 'Circuit breaker is open'):
+        super().__init__(message=f'{message}: {breaker_name}')
+        self.breaker_name = breaker_name
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, Hashable, Union
+from .exceptions import DeadlineExceeded
+from .timeouts import deadline_at, get_deadline
+
+
+# Поток пула FanOut. Вложенный gather из такого потока (например, get_*_by_ids внутри gather) выполняется в нем же:
+# иначе при занятом пуле внешние вызовы ждут внутренние, которым уже не достанется потока
+_WORKER = threading.local()
+
+
+def _mark_worker():
+    _WORKER.active = True
+
+
+def in_fanout_worker() -> bool:
+    """
+    Выполняется ли текущий код в потоке пула FanOut
+    """
+    return getattr(_WORKER, 'active', False)
+
+
+class Call:
+    """
+    Отложенный вызов метода реквестера, например Call(r.get_places, user_id, token, timeout=0.5)
+    """
+    __slots__ = ('fn', 'args', 'kwargs', 'timeout')
+
+    def __init__(self, fn: Callable, *args, timeout: Union[float, None] = None, **kwargs):
+        """
+        @param fn: Функция (обычно метод реквестера)
+        @param args: Позиционные аргументы
+        @param timeout: Таймаут именно этого вызова, в секундах
+        @param kwargs: Именованные аргументы
+        """
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+
+
+class CallResult:
+    """
+    Результат одного вызова: либо значение, либо исключение
+    """
+    __slots__ = ('name', 'value', 'error', 'elapsed')
+
+    def __init__(self, name: Hashable, value: Any = None, error: Union[BaseException, None] = None,
+                 elapsed: float = 0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def unwrap(self) -> Any:
+        """
+        Значение вызова, либо его исключение
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __repr__(self):
+        return f'CallResult({self.name!r}, ok={self.ok}, elapsed={self.elapsed:.3f})'
+
+
+class FanOut:
+    """
+    Параллельный запуск независимых вызовов реквестеров на общем пуле потоков
+    """
+    def __init__(self, max_workers: int = int(os.getenv('REQUESTERS_FANOUT_WORKERS', 32))):
+        """
+        @param max_workers: Размер пула потоков
+        """
+        self.max_workers = max_workers
+        self._pool = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        # После форка потоки пула родителя не существуют
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='FanOut',
+                                                    initializer=_mark_worker)
+                    self._pid = os.getpid()
+        return self._pool
+
+    @staticmethod
+    def _run(name: Hashable, call: Call, at: Union[float, None]) -> CallResult:
+        start = time.monotonic()
+        try:
+            # Дедлайн вызова урезает таймауты запросов внутри него, чтобы поток пула не завис после ответа gather
+            with deadline_at(at):
+                value = call.fn(*call.args, **call.kwargs)
+            return CallResult(name, value=value, elapsed=time.monotonic() - start)
+        except Exception as e:
+            return CallResult(name, error=e, elapsed=time.monotonic() - start)
+
+    def gather(self, calls: Dict[Hashable, Union[Call, Callable[[], Any]]], deadline: Union[float, None] = None,
+               timeout: Union[float, None] = None) -> Dict[Hashable, CallResult]:
+        """
+        Запуск вызовов параллельно и ожидание всех результатов
+        @param calls: Словарь имя -> Call (или функция без аргументов)
+        @param deadline: Сколько максимум ждать все вызовы вместе, в секундах
+        @param timeout: Таймаут вызова по умолчанию (для Call без своего timeout)
+        @return: Словарь имя -> CallResult в порядке calls. Не успевшие вызовы получают ошибку DeadlineExceeded,
+        сами они доработают в фоне, их результат будет отброшен. Из потока пула вызовы выполняются по очереди
+        в нем же, а вызовы, до которых дошла очередь после дедлайна, сразу получают DeadlineExceeded
+        """
+        start = time.monotonic()
+        outer_at = get_deadline()
+        inline = in_fanout_worker()
+        results: Dict[Hashable, CallResult] = dict()
+        futures: Dict[Future, Hashable] = dict()
+        deadlines: Dict[Future, float] = dict()
+        for name, call in calls.items():
+            if not isinstance(call, Call):
+                call = Call(call)
+            call_timeout = call.timeout if call.timeout is not None else timeout
+            limits = [start + x for x in (call_timeout, deadline) if x is not None]
+            if outer_at is not None:
+                limits.append(outer_at)
+            at = min(limits) if limits else None
+            if inline:
+                now = time.monotonic()
+                expired = at is not None and at <= now
+                results[name] = CallResult(name, error=DeadlineExceeded(), elapsed=now - start) if expired \
+                    else self._run(name, call, at)
+                continue
+            # Контекст (contextvars, в том числе внешний дедлайн) вызывающего потока едет в поток пула
+            future = self.pool.submit(contextvars.copy_context().run, self._run, name, call, at)
+            futures[future] = name
+            if at is not None:
+                deadlines[future] = at
+
+        pending = set(futures)
+        while pending:
+            waits = [deadlines[f] for f in pending if f in deadlines]
+            wait_for = max(min(waits) - time.monotonic(), 0) if waits else None
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines.get(f, now + 1) <= now]:
+                pending.discard(future)
+                future.cancel()
+                results[futures[future]] = CallResult(futures[future], error=DeadlineExceeded(), elapsed=now - start)
+        return {name: results[name] for name in calls}
+
+
+FANOUT = FanOut()
+
+
+def gather(calls: Dict[Hashable, Union[Call, Callable[[], Any]]], deadline: Union[float, None] = None,
+           timeout: Union[float, None] = None) -> Dict[Hashable, CallResult]:
+    """
+    FANOUT.gather на общем пуле процесса
+    """
+    return FANOUT.gather(calls, deadline=deadline, timeout=timeout)
+
+
+async def agather(calls: Dict[Hashable, Awaitable], deadline: Union[float, None] = None,
+                  timeout: Union[float, None] = None) -> Dict[Hashable, CallResult]:
+    """
+    То же для асинхронных реквестеров: корутины запускаются конкурентно в текущем event loop'е
+    @param calls: Словарь имя -> корутина (например, r.get_places(...))
+    @param deadline: Сколько максимум ждать все вызовы вместе, в секундах
+    @param timeout: Таймаут каждого вызова
+    @return: Словарь имя -> CallResult в порядке calls
+    """
+    limits = [x for x in (timeout, deadline) if x is not None]
+    call_timeout = min(limits) if limits else None
+
+    async def run(name: Hashable, coro: Awaitable) -> CallResult:
+        start = time.monotonic()
+        try:
+            with deadline_at(None if call_timeout is None else start + call_timeout):
+                value = await asyncio.wait_for(coro, call_timeout)
+            return CallResult(name, value=value, elapsed=time.monotonic() - start)
+        except asyncio.TimeoutError:
+            return CallResult(name, error=DeadlineExceeded(), elapsed=time.monotonic() - start)
+        except Exception as e:
+            return CallResult(name, error=e, elapsed=time.monotonic() - start)
+
+    results = await asyncio.gather(*(run(name, coro) for name, coro in calls.items()))
+    return {result.name: result for result in results}
@@ -0,0 +1,292 @@
+import os
+import re
+import time
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+
+# Границы бакетов гистограммы латентности, в секундах
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Айдишники в пути заменяются на {id}, чтобы число эндпоинтов в метриках не росло с числом сущностей
+_ID_SEGMENT = re.compile(r'(?<=/)(\d+|[0-9a-f]{8}-[0-9a-f-]{27})(?=/|$)')
+
+
+def normalize_endpoint(path: str) -> str:
+    """
+    Путь запроса без айдишников: places/12/ -> places/{id}/
+    """
+    return _ID_SEGMENT.sub('{id}', '/' + path)[1:]
+
+
+class RequestCall:
+    """
+    Один исходящий вызов (вместе с повторами), который видят хуки
+    """
+    __slots__ = ('requester', 'host', 'method', 'uri', 'endpoint', 'headers', 'bytes_out', 'started_at', 'extra')
+
+    def __init__(self, requester: Any, method: str, uri: str, headers: Dict[str, Any], bytes_out: int):
+        self.requester = requester
+        self.host = requester.host
+        self.method = method
+        self.uri = uri
+        api_url = requester.api_url
+        self.endpoint = normalize_endpoint(uri[len(api_url):] if uri.startswith(api_url) else uri)
+        # Хэдеры запроса, before-хуки могут их дополнять
+        self.headers = headers
+        self.bytes_out = bytes_out
+        self.started_at = time.perf_counter()
+        # Место для данных хуков (например, спан трейсинга)
+        self.extra: Dict[str, Any] = dict()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными бакетами, как в Prometheus (кумулятивные только при выгрузке)
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        Пары (le, сколько наблюдений <= le), последняя -- +Inf
+        """
+        total, result = 0, []
+        for le, count in zip(self.buckets + (float('inf'), ), self.counts):
+            total += count
+            result.append(('+Inf' if le == float('inf') else repr(le), total))
+        return result
+
+    def quantile(self, q: float) -> Union[float, None]:
+        """
+        Оценка квантиля по бакетам (верхняя граница бакета, в который он попал), None -- нет наблюдений
+        """
+        if not self.count:
+            return None
+        rank, total = q * self.count, 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+class Instrumentation:
+    """
+    Хуки и метрики исходящих вызовов реквестеров. Выключенная стоит одну проверку атрибута enabled на вызов
+    """
+    def __init__(self, enabled: bool = os.getenv('REQUESTERS_INSTRUMENTATION', 'False') == 'True',
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        @param enabled: Собирать ли метрики и звать ли хуки
+        @param buckets: Границы бакетов латентности
+        """
+        self.enabled = enabled
+        self.buckets = buckets
+        self._before: List[Callable[[RequestCall], None]] = list()
+        self._after: List[Callable[[RequestCall, Any], None]] = list()
+        self._error: List[Callable[[RequestCall, Exception], None]] = list()
+        # (host, endpoint, method, status) -> гистограмма
+        self._latency: Dict[Tuple[str, str, str, str], Histogram] = dict()
+        # (host, endpoint, direction) -> байты
+        self._bytes: Dict[Tuple[str, str, str], int] = dict()
+        # (host, endpoint, method) -> повторы
+        self._retries: Dict[Tuple[str, str, str], int] = dict()
+        self._lock = threading.Lock()
+
+    def add_hooks(self, before: Union[Callable[[RequestCall], None], None] = None,
+                  after: Union[Callable[[RequestCall, Any], None], None] = None,
+                  error: Union[Callable[[RequestCall, Exception], None], None] = None):
+        """
+        Регистрация хуков. Исключения в хуках печатаются и не ломают запрос
+        @param before: (call) до запроса, может дописать call.headers
+        @param after: (call, response) после ответа, любого статуса
+        @param error: (call, exception) если запрос не удался (соединение, таймаут, открытый брейкер)
+        """
+        with self._lock:
+            if before is not None:
+                self._before = self._before + [before]
+            if after is not None:
+                self._after = self._after + [after]
+            if error is not None:
+                self._error = self._error + [error]
+
+    def remove_hooks(self, *hooks: Callable):
+        with self._lock:
+            self._before = [h for h in self._before if h not in hooks]
+            self._after = [h for h in self._after if h not in hooks]
+            self._error = [h for h in self._error if h not in hooks]
+
+    @staticmethod
+    def _run_hooks(hooks: List[Callable], *args):
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception as e:
+                print(f'=== INSTRUMENTATION HOOK ERROR {str(e)} ===')
+
+    def start(self, requester: Any, method: str, uri: str, headers: Union[Dict[str, Any], None],
+              body: Union[bytes, None]) -> RequestCall:
+        """
+        Начало вызова (до брейкера и повторов)
+        """
+        # Потоковое боди (multipart.MultipartEncoder) знает свой размер заранее, либо не знает (chunked)
+        bytes_out = len(body) if isinstance(body, (bytes, bytearray)) else getattr(body, 'len', None) or 0
+        call = RequestCall(requester, method, uri, headers if headers is not None else dict(), bytes_out)
+        self._run_hooks(self._before, call)
+        return call
+
+    def finish(self, call: RequestCall, response: Any):
+        """
+        Вызов завершился ответом
+        """
+        elapsed = call.elapsed
+        bytes_in = len(response.content)
+        with self._lock:
+            self._observe(call, str(response.status_code), elapsed)
+            self._add_bytes(call, 'in', bytes_in)
+        self._run_hooks(self._after, call, response)
+
+    def fail(self, call: RequestCall, error: Exception):
+        """
+        Вызов завершился исключением, статус в метриках -- имя его класса
+        """
+        elapsed = call.elapsed
+        with self._lock:
+            self._observe(call, type(error).__name__, elapsed)
+        self._run_hooks(self._error, call, error)
+
+    def retry(self, requester: Any, method: str, uri: str):
+        """
+        Повтор запроса по retry_policy
+        """
+        api_url = requester.api_url
+        endpoint = normalize_endpoint(uri[len(api_url):] if uri.startswith(api_url) else uri)
+        key = (requester.host, endpoint, method)
+        with self._lock:
+            self._retries[key] = self._retries.get(key, 0) + 1
+
+    def _observe(self, call: RequestCall, status: str, elapsed: float):
+        key = (call.host, call.endpoint, call.method, status)
+        histogram = self._latency.get(key)
+        if histogram is None:
+            histogram = self._latency[key] = Histogram(self.buckets)
+        histogram.observe(elapsed)
+        self._add_bytes(call, 'out', call.bytes_out)
+
+    def _add_bytes(self, call: RequestCall, direction: str, size: int):
+        key = (call.host, call.endpoint, direction)
+        self._bytes[key] = self._bytes.get(key, 0) + size
+
+    def reset(self):
+        with self._lock:
+            self._latency, self._bytes, self._retries = dict(), dict(), dict()
+
+    def get_latency(self, host: Union[str, None] = None, endpoint: Union[str, None] = None,
+                    status: Union[str, None] = None) -> Histogram:
+        """
+        Гистограмма латентности, сложенная по всем вызовам, подходящим под фильтр
+        """
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for (h, e, _, s), histogram in self._latency.items():
+                if (host is None or h == host) and (endpoint is None or e == endpoint) and \
+                        (status is None or s == status):
+                    merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+                    merged.sum += histogram.sum
+                    merged.count += histogram.count
+        return merged
+
+    def slowest(self, q: float = 0.99, limit: int = 10) -> List[Tuple[str, str, float, int]]:
+        """
+        Эндпоинты с наибольшим квантилем латентности
+        @return: Список (host, endpoint, квантиль, число вызовов)
+        """
+        with self._lock:
+            keys = {(h, e) for h, e, _, _ in self._latency}
+        result = []
+        for host, endpoint in keys:
+            histogram = self.get_latency(host, endpoint)
+            result.append((host, endpoint, histogram.quantile(q), histogram.count))
+        result.sort(key=lambda x: x[2], reverse=True)
+        return result[:limit]
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Все метрики словарем: латентности, байты, повторы, переиспользование соединений и брейкеры
+        """
+        from .sessions import SESSIONS
+        from .breakers import BREAKERS
+        with self._lock:
+            latency = {key: {'count': h.count, 'sum': h.sum, 'p50': h.quantile(0.5), 'p99': h.quantile(0.99)}
+                       for key, h in self._latency.items()}
+            bytes_ = dict(self._bytes)
+            retries = dict(self._retries)
+        return {'latency': latency, 'bytes': bytes_, 'retries': retries,
+                'connections': SESSIONS.connection_stats(), 'breakers': BREAKERS.stats}
+
+    def to_prometheus(self) -> str:
+        """
+        Метрики в текстовом формате Prometheus (для отдачи из вьюхи /metrics)
+        """
+        from .sessions import SESSIONS
+        from .breakers import BREAKERS
+        with self._lock:
+            latency = [(key, h.cumulative(), h.sum, h.count) for key, h in sorted(self._latency.items())]
+            bytes_ = sorted(self._bytes.items())
+            retries = sorted(self._retries.items())
+        lines = ['# HELP requesters_request_duration_seconds Outbound request latency, retries included',
+                 '# TYPE requesters_request_duration_seconds histogram']
+        for (host, endpoint, method, status), buckets, total, count in latency:
+            labels = dict(host=host, endpoint=endpoint, method=method, status=status)
+            for le, value in buckets:
+                lines.append(f'requesters_request_duration_seconds_bucket{_labels(**labels, le=le)} {value}')
+            lines.append(f'requesters_request_duration_seconds_sum{_labels(**labels)} {total}')
+            lines.append(f'requesters_request_duration_seconds_count{_labels(**labels)} {count}')
+        lines += ['# HELP requesters_bytes_total Request and response body bytes',
+                  '# TYPE requesters_bytes_total counter']
+        lines += [f'requesters_bytes_total{_labels(host=h, endpoint=e, direction=d)} {v}' for (h, e, d), v in bytes_]
+        lines += ['# HELP requesters_retries_total Retried requests',
+                  '# TYPE requesters_retries_total counter']
+        lines += [f'requesters_retries_total{_labels(host=h, endpoint=e, method=m)} {v}' for (h, e, m), v in retries]
+        lines += ['# HELP requesters_connections_total Requests on pooled connections, new vs reused',
+                  '# TYPE requesters_connections_total counter']
+        for host, conns in sorted(SESSIONS.connection_stats().items()):
+            lines.append(f'requesters_connections_total{_labels(host=host, state="new")} {conns["new"]}')
+            lines.append(f'requesters_connections_total{_labels(host=host, state="reused")} {conns["reused"]}')
+        breakers = sorted(BREAKERS.stats.items())
+        lines += ['# HELP requesters_breaker_open Whether the circuit breaker is open (1) or half-open (0.5)',
+                  '# TYPE requesters_breaker_open gauge']
+        states = {'closed': 0, 'half-open': 0.5, 'open': 1}
+        lines += [f'requesters_breaker_open{_labels(name=name)} {states.get(b["state"], 0)}' for name, b in breakers]
+        for counter in ('successes', 'failures', 'rejected', 'opened'):
+            lines += [f'# TYPE requesters_breaker_{counter}_total counter']
+            lines += [f'requesters_breaker_{counter}_total{_labels(name=name)} {b.get(counter, 0)}'
+                      for name, b in breakers]
+        return '\n'.join(lines) + '\n'
+
+
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,214 @@
+import os
+import time
+import queue
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Union
+from redis import exceptions
+from . import codec
+from .utils import get_redis_from_env
+
+
+class InvalidationEvent:
+    """
+    Изменение сущности на сервисе: хост, сущность (первый сегмент пути) и ее айди, None -- изменилась коллекция
+    """
+    __slots__ = ('host', 'entity', 'entity_id', 'path', 'hints', 'origin')
+
+    # Поля боди/ответа, которые едут в событии как подсказки для кэшей (например, тайлов мест)
+    hint_fields = ('place_id', 'latitude', 'longitude')
+
+    def __init__(self, host: str, entity: str, entity_id: Union[str, None], path: str,
+                 hints: Union[Dict[str, Any], None] = None, origin: str = ''):
+        self.host = host
+        self.entity = entity
+        self.entity_id = entity_id
+        self.path = path
+        self.hints = hints or dict()
+        self.origin = origin
+
+    @classmethod
+    def from_write(cls, host: str, path_suffix: str, data: Any = None, res_json: Any = None,
+                   origin: str = '') -> 'InvalidationEvent':
+        """
+        Событие по пути записи: places/12/ -> (places, 12), profiles/5/buy_pin/ -> (profiles, 5),
+        places/ -> (places, None)
+        """
+        segments = path_suffix.strip('/').split('/')
+        entity_id = segments[1] if len(segments) > 1 else None
+        hints = dict()
+        for source in (data, res_json):
+            if isinstance(source, dict):
+                hints.update((k, source[k]) for k in cls.hint_fields if source.get(k) is not None)
+        if entity_id is None and isinstance(res_json, dict) and res_json.get('id') is not None:
+            # Созданная сущность: коллекцию это не отменяет, айди -- для подписчиков, которым он нужен
+            hints['id'] = res_json['id']
+        return cls(host, segments[0], entity_id, path_suffix, hints, origin)
+
+    def matches_url(self, url: str) -> bool:
+        """
+        Затрагивает ли событие ответ по урлу: любые списки сущности, либо сама сущность (и ее подресурсы)
+        """
+        prefix = f'{self.host}/api/{self.entity}/'
+        if not url.startswith(prefix):
+            return False
+        rest = url[len(prefix):].split('/', 1)[0]
+        return not rest or not rest.isdigit() or rest == self.entity_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'host': self.host, 'entity': self.entity, 'entity_id': self.entity_id, 'path': self.path,
+                'hints': self.hints, 'origin': self.origin}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'InvalidationEvent':
+        return cls(data['host'], data['entity'], data.get('entity_id'), data.get('path', ''), data.get('hints'),
+                   data.get('origin', ''))
+
+    def __repr__(self):
+        return f'InvalidationEvent({self.host}, {self.entity}, {self.entity_id})'
+
+
+class InvalidationBus:
+    """
+    Шина инвалидации кэшей реквестеров. Запись через реквестер сразу чистит локальные кэши
+    и публикуется в редис (pub/sub), а подписанные процессы чистят у себя то же самое.
+    Pub/sub не хранит сообщения, так что после разрыва соединения подписчик чистит кэши целиком
+    """
+    def __init__(self, enabled: bool = os.getenv('REQUESTERS_INVALIDATION_BUS', 'False') == 'True',
+                 channel: str = os.getenv('REQUESTERS_INVALIDATION_CHANNEL', 'requesters:invalidate'),
+                 reconnect_delay: float = float(os.getenv('REQUESTERS_INVALIDATION_RECONNECT_DELAY', 1))):
+        """
+        @param enabled: Публиковать ли события в редис и слушать ли их (локальные кэши чистятся в любом случае)
+        @param channel: Канал pub/sub
+        @param reconnect_delay: Пауза перед переподключением подписчика
+        """
+        self.enabled = enabled
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.metrics = {
+            'published': 0,
+            'publish_errors': 0,
+            'received': 0,
+            'resyncs': 0,
+            'listener_errors': 0,
+        }
+        self._listeners: List[Callable[[Union[InvalidationEvent, None]], None]] = list()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._reset()
+
+    def _reset(self):
+        # Свой origin у каждого процесса: свои события он уже применил при публикации
+        self._pid = os.getpid()
+        self.origin = f'{socket.gethostname()}:{self._pid}:{id(self)}'
+        self._outbox = queue.Queue(maxsize=10000)
+        self._publisher = None
+        self._subscriber = None
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._redis = None
+                    self._reset()
+
+    def _get_redis(self):
+        if self._redis is None:
+            self._redis = get_redis_from_env(socket_timeout=5)
+        return self._redis
+
+    def add_listener(self, listener: Callable[[Union[InvalidationEvent, None]], None]):
+        """
+        Подписка кэша на события. Если шина включена, тут же запускается подписчик: процессу, который только читает,
+        события нужны так же, как пишущему
+        @param listener: (event), где event=None -- сбросить все (подписчик мог пропустить события)
+        """
+        with self._lock:
+            self._listeners = self._listeners + [listener]
+        self.start()
+
+    def apply(self, event: Union[InvalidationEvent, None]):
+        """
+        Применение события к локальным кэшам
+        """
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                self.metrics['listener_errors'] += 1
+                print(f'=== INVALIDATION LISTENER ERROR {str(e)} ===')
+
+    def publish(self, host: str, path_suffix: str, data: Any = None, res_json: Any = None):
+        """
+        Событие об удачной записи: сразу применяется локально, в редис уходит из фонового потока,
+        чтобы запись (в том числе из event loop'а) не ждала редис
+        """
+        self._check_fork()
+        event = InvalidationEvent.from_write(host, path_suffix, data, res_json, self.origin)
+        self.apply(event)
+        if not self.enabled:
+            return
+        self.start()
+        try:
+            self._outbox.put_nowait(event)
+        except queue.Full:
+            self.metrics['publish_errors'] += 1
+
+    def start(self):
+        """
+        Запуск потоков публикации и подписки. Зовется при подписке кэша и перед каждым запросом реквестера:
+        после форка потоки родителя в воркере мертвы, и первый же запрос (до него кэши воркера пусты) их поднимает
+        """
+        self._check_fork()
+        if not self.enabled or (self._publisher is not None and self._subscriber is not None):
+            return
+        with self._lock:
+            if self._publisher is None:
+                self._publisher = threading.Thread(target=self._publish_loop, name='InvalidationPublisher',
+                                                   daemon=True)
+                self._publisher.start()
+            if self._subscriber is None:
+                self._subscriber = threading.Thread(target=self._subscribe_loop, name='InvalidationSubscriber',
+                                                    daemon=True)
+                self._subscriber.start()
+
+    def _publish_loop(self):
+        while True:
+            event = self._outbox.get()
+            try:
+                self._get_redis().publish(self.channel, codec.dumps(event.to_dict()))
+                self.metrics['published'] += 1
+            except exceptions.RedisError as e:
+                self.metrics['publish_errors'] += 1
+                print(f'=== INVALIDATION PUBLISH ERROR {str(e)} ===')
+
+    def _subscribe_loop(self):
+        connected_before = False
+        while True:
+            try:
+                pubsub = get_redis_from_env().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                if connected_before:
+                    # Пока не были подписаны, события могли пройти мимо
+                    self.metrics['resyncs'] += 1
+                    self.apply(None)
+                connected_before = True
+                for message in pubsub.listen():
+                    self._handle(message)
+            except exceptions.RedisError as e:
+                print(f'=== INVALIDATION SUBSCRIBER ERROR {str(e)} ===')
+            time.sleep(self.reconnect_delay)
+
+    def _handle(self, message: Dict[str, Any]):
+        if message.get('type') != 'message':
+            return
+        try:
+            event = InvalidationEvent.from_dict(codec.loads(message['data']))
+        except (ValueError, KeyError, TypeError):
+            return
+        self.metrics['received'] += 1
+        if event.origin != self.origin:
+            self.apply(event)
+
+
+INVALIDATION_BUS = InvalidationBus()
@@ -0,0 +1,203 @@
+from typing import Any, Dict, FrozenSet, Iterator, List, Sequence, Tuple, Type, TypeVar, Union
+
+
+M = TypeVar('M', bound='Model')
+
+
+class Model:
+    """
+    Компактная запись вместо словаря из джсона: поля в __slots__, лишние ключи -- в _extra.
+    Поддерживает чтение как словарь (obj['id'], obj.get('id')), чтобы код на словарях работал и с ней
+    """
+    __slots__ = ('_extra', )
+    _fields: Tuple[str, ...] = ()
+    _field_set: FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = tuple(f for klass in reversed(cls.__mro__) for f in klass.__dict__.get('__slots__', ())
+                            if not f.startswith('_'))
+        cls._field_set = frozenset(cls._fields)
+
+    def __init__(self, **kwargs):
+        for field in self._fields:
+            setattr(self, field, kwargs.pop(field, None))
+        self._extra = kwargs or None
+
+    @classmethod
+    def from_json(cls: Type[M], data: Dict[str, Any]) -> M:
+        """
+        Запись из словаря джсона
+        """
+        obj = cls.__new__(cls)
+        get = data.get
+        for field in cls._fields:
+            setattr(obj, field, get(field))
+        obj._extra = None if cls._field_set.issuperset(data) else \
+            {k: v for k, v in data.items() if k not in cls._field_set}
+        return obj
+
+    @classmethod
+    def many(cls: Type[M], data: List[Dict[str, Any]]) -> 'ModelList[M]':
+        """
+        Ленивый список записей поверх списка словарей
+        """
+        return ModelList(cls, data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self._fields}
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields or bool(self._extra and key in self._extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        if isinstance(other, Model):
+            return type(self) is type(other) and self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}(id={getattr(self, "id", None)!r})'
+
+
+class ModelList(Sequence):
+    """
+    Список записей, которые создаются из словарей при первом обращении и заменяют их в списке,
+    так что словарь освобождается, а нетронутые строки вообще не материализуются
+    """
+    __slots__ = ('model', '_items')
+
+    def __init__(self, model: Type[M], items: List[Union[Dict[str, Any], M]]):
+        self.model = model
+        self._items = items
+
+    def _get(self, i: int) -> M:
+        item = self._items[i]
+        if isinstance(item, dict):
+            item = self._items[i] = self.model.from_json(item)
+        return item
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ModelList(self.model, [self._get(j) for j in range(*i.indices(len(self._items)))])
+        return self._get(i)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[M]:
+        for i in range(len(self._items)):
+            yield self._get(i)
+
+    def materialize(self) -> 'ModelList[M]':
+        """
+        Создать все записи сразу (например, перед тем как положить список в кэш надолго)
+        """
+        for i in range(len(self._items)):
+            self._get(i)
+        return self
+
+    def __repr__(self):
+        return f'ModelList({self.model.__name__}, {len(self._items)} items)'
+
+
+def parse(model: Type[M], res_json: Union[Dict[str, Any], List[Dict[str, Any]]]) -> \
+        Union[M, ModelList, Dict[str, Any]]:
+    """
+    Джсон ответа реквестера -- в записи
+    @param model: Класс записи, например Place
+    @param res_json: Джсон одной сущности, список, либо пагинированный ответ с results
+    @return: Запись, ModelList, либо пагинированный ответ, где results -- ModelList
+    """
+    if isinstance(res_json, list):
+        return model.many(res_json)
+    if isinstance(res_json, dict) and isinstance(res_json.get('results'), list):
+        return {**res_json, 'results': model.many(res_json['results'])}
+    return model.from_json(res_json)
+
+
+# MARK: - Places
+
+class Place(Model):
+    __slots__ = ('id', 'name', 'latitude', 'longitude', 'address', 'checked_by_moderator', 'rating', 'accept_type',
+                 'accepts_cnt', 'deleted_flg', 'is_created_by_me', 'created_dt', 'my_rating', 'is_accepted_by_me')
+
+
+class Accept(Model):
+    __slots__ = ('id', 'created_by', 'place_id', 'created_dt', 'deleted_flg')
+
+
+class Rating(Model):
+    __slots__ = ('id', 'created_by', 'place_id', 'rating', 'current_rating', 'created_dt', 'deleted_flg')
+
+
+class PlaceImage(Model):
+    __slots__ = ('id', 'created_by', 'place_id', 'pic_id', 'created_dt', 'deleted_flg')
+
+
+# MARK: - Awards
+
+class Pin(Model):
+    __slots__ = ('id', 'name', 'descr', 'pic_id', 'price', 'ptype', 'created_dt', 'deleted_flg')
+
+
+class Achievement(Model):
+    __slots__ = ('id', 'name', 'descr', 'pic_id', 'created_dt', 'deleted_flg')
+
+
+# MARK: - Users
+
+class Profile(Model):
+    __slots__ = ('id', 'user_id', 'pin_sprite', 'geopin_sprite', 'unlocked_pins', 'unlocked_geopins', 'achievements',
+                 'pic_id', 'created_dt')
+
+
+# MARK: - Media
+
+class Image(Model):
+    __slots__ = ('id', 'object_type', 'object_id', 'image_url', 'created_by', 'created_dt', 'deleted_flg')
+
+
+# MARK: - Stats
+
+class RequestStat(Model):
+    __slots__ = ('id', 'method', 'user_id', 'endpoint', 'status_code', 'process_time', 'request_dt')
+
+
+class PlaceStat(Model):
+    __slots__ = ('id', 'action', 'place_id', 'user_id', 'action_dt')
+
+
+class AcceptStat(Model):
+    __slots__ = ('id', 'action', 'user_id', 'place_id', 'action_dt')
+
+
+class RatingStat(Model):
+    __slots__ = ('id', 'place_id', 'user_id', 'old_rating', 'new_rating', 'action_dt')
+
+
+class PinPurchaseStat(Model):
+    __slots__ = ('id', 'pin_id', 'user_id', 'purchase_dt')
+
+
+class AchievementStat(Model):
+    __slots__ = ('id', 'achievement_id', 'user_id', 'achievement_dt')
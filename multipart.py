@@ -0,0 +1,153 @@
+import os
+import uuid
+import mimetypes
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Tuple, Union
+
+
+# Сколько байт читается из файла за раз
+CHUNK_SIZE = int(os.getenv('REQUESTERS_UPLOAD_CHUNK_SIZE', 64 * 1024))
+
+
+class _FilePart:
+    """
+    Источник данных файловой части: байты/memoryview (отдаются срезами без копий), UploadedFile джанги
+    (через chunks), файлоподобный объект (read по кускам) или итерируемое байтов
+    """
+    __slots__ = ('source', 'size', 'start', '_consumed')
+
+    def __init__(self, source: Any):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = memoryview(source).cast('B')
+        self.source = source
+        self.start = None
+        self.size = self._get_size(source)
+        self._consumed = False
+
+    def _get_size(self, source: Any) -> Union[int, None]:
+        if isinstance(source, memoryview):
+            return source.nbytes
+        if hasattr(source, 'chunks') and getattr(source, 'size', None) is not None:
+            # UploadedFile: chunks() сам перематывает в начало
+            return source.size
+        if hasattr(source, 'read') and hasattr(source, 'seek'):
+            try:
+                self.start = source.tell()
+                end = source.seek(0, os.SEEK_END)
+                source.seek(self.start)
+                return end - self.start
+            except (OSError, ValueError, AttributeError):
+                self.start = None
+        return None
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[Union[bytes, memoryview]]:
+        """
+        Куски данных. Повторный обход (повтор запроса) начинается сначала, если источник это позволяет
+        @raise ValueError: Источник одноразовый и уже прочитан
+        """
+        source = self.source
+        if isinstance(source, memoryview):
+            for offset in range(0, source.nbytes, chunk_size):
+                yield source[offset:offset + chunk_size]
+        elif hasattr(source, 'chunks') and self.size is not None:
+            yield from source.chunks(chunk_size)
+        elif hasattr(source, 'read'):
+            if self.start is not None:
+                source.seek(self.start)
+            elif self._consumed:
+                raise ValueError('File part is not seekable and was already sent')
+            self._consumed = True
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            # Итератор одноразовый, а итерируемое (список кусков и т.п.) можно обойти заново
+            if self._consumed and iter(source) is source:
+                raise ValueError('File part is an iterator and was already sent')
+            self._consumed = True
+            yield from source
+
+
+class MultipartEncoder:
+    """
+    Потоковое multipart/form-data боди: части отдаются кусками по мере отправки, файл целиком в память не читается.
+    Передается как data= в post реквестера. Если размеры всех файлов известны, запрос идет с Content-Length,
+    иначе -- chunked (Transfer-Encoding)
+    """
+    def __init__(self, fields: Dict[str, Any], files: Dict[str, Tuple[str, Any, Union[str, None]]],
+                 chunk_size: int = CHUNK_SIZE, progress: Union[Callable[[int, Union[int, None]], None], None] = None,
+                 boundary: Union[str, None] = None):
+        """
+        @param fields: Обычные поля формы, значения приводятся к строке
+        @param files: Имя поля -> (имя файла, источник, content type). Источник -- байты, memoryview,
+        UploadedFile, файл или итерируемое байтов; content type None -- угадывается по имени файла
+        @param chunk_size: Размер куска при чтении файлов
+        @param progress: Колбэк (отправлено байт, всего байт либо None), вызывается после каждого куска
+        @param boundary: Разделитель частей, по умолчанию случайный
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self._parts: List[Tuple[bytes, Union[_FilePart, None]]] = list()
+        for name, value in fields.items():
+            head = self._get_part_head(name)
+            self._parts.append((head + str(value).encode('utf-8') + b'\r\n', None))
+        for name, (filename, source, content_type) in files.items():
+            content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            self._parts.append((self._get_part_head(name, filename, content_type), _FilePart(source)))
+        self._tail = f'--{self.boundary}--\r\n'.encode('ascii')
+        sizes = [part.size for _, part in self._parts if part is not None]
+        if None in sizes:
+            self.len = None
+        else:
+            # Каждая файловая часть заканчивается \r\n после данных
+            self.len = sum(len(head) for head, _ in self._parts) + sum(sizes) + 2 * len(sizes) + len(self._tail)
+
+    def _get_part_head(self, name: str, filename: Union[str, None] = None,
+                       content_type: Union[str, None] = None) -> bytes:
+        disposition = f'form-data; name="{self._quote(name)}"'
+        if filename is not None:
+            disposition += f'; filename="{self._quote(filename)}"'
+        head = f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'
+        if content_type is not None:
+            head += f'Content-Type: {content_type}\r\n'
+        return (head + '\r\n').encode('utf-8')
+
+    @staticmethod
+    def _quote(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\r', ' ').replace('\n', ' ')
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __iter__(self) -> Iterator[Union[bytes, memoryview]]:
+        sent = 0
+        for head, part in self._parts:
+            yield head
+            sent += len(head)
+            if part is None:
+                continue
+            for chunk in part.iter_chunks(self.chunk_size):
+                if not chunk:
+                    continue
+                yield chunk
+                sent += len(chunk)
+                if self.progress is not None:
+                    self.progress(sent, self.len)
+            yield b'\r\n'
+            sent += 2
+        yield self._tail
+        if self.progress is not None:
+            self.progress(sent + len(self._tail), self.len)
+
+    async def aiter(self) -> AsyncIterator[bytes]:
+        """
+        То же для httpx.AsyncClient (ему нужен асинхронный итератор)
+        """
+        for chunk in self:
+            yield bytes(chunk) if isinstance(chunk, memoryview) else chunk
+
+    def __repr__(self):
+        return f'MultipartEncoder(parts={len(self._parts)}, len={self.len})'
@@ -0,0 +1,366 @@
+import os
+import math
+import time
+import zlib
+import random
+import hashlib
+import threading
+from typing import Any, Dict, Hashable, List, Set, Union
+from redis import exceptions
+from . import codec
+from .cache import TTLCache
+from .utils import get_redis_from_env
+from .fanout import FANOUT
+from .invalidation import INVALIDATION_BUS, InvalidationEvent
+
+
+class CachedResponse:
+    """
+    Закэшированный ответ GET: тело как есть (джсон в байтах), пара хэдеров, время пересчета delta и моменты
+    по часам (time.time -- записи общие для процессов и машин): до expires_at ответ свежий, до stale_until
+    его отдают, обновляя в фоне (stale-while-revalidate), до error_until -- если сервис недоступен (stale-if-error)
+    """
+    __slots__ = ('body', 'headers', 'delta', 'expires_at', 'stale_until', 'error_until')
+
+    # Хэдеры, которые переживают кэш
+    kept_headers = ('Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, body: bytes, headers: Dict[str, str], delta: float, expires_at: float,
+                 stale_until: Union[float, None] = None, error_until: Union[float, None] = None):
+        self.body = body
+        self.headers = headers
+        self.delta = delta
+        self.expires_at = expires_at
+        self.stale_until = expires_at if stale_until is None else stale_until
+        self.error_until = expires_at if error_until is None else error_until
+
+    @classmethod
+    def from_response(cls, response: Any, delta: float, ttl: float, stale_ttl: float = 0,
+                      stale_if_error_ttl: float = 0) -> 'CachedResponse':
+        """
+        @param response: Ответ requests или httpx
+        @param delta: Сколько занял запрос, в секундах
+        @param ttl: Сколько ответ свежий
+        @param stale_ttl: Сколько после этого его можно отдавать, обновляя в фоне
+        @param stale_if_error_ttl: Сколько после ttl его можно отдавать, пока брейкер сервиса открыт
+        """
+        headers = {name: response.headers[name] for name in cls.kept_headers if name in response.headers}
+        expires_at = time.time() + ttl
+        return cls(response.content, headers, delta, expires_at, expires_at + stale_ttl,
+                   expires_at + stale_if_error_ttl)
+
+    @property
+    def allows_stale(self) -> bool:
+        return self.stale_until > self.expires_at or self.error_until > self.expires_at
+
+    @property
+    def keep_until(self) -> float:
+        """
+        До какого момента запись хранится
+        """
+        return max(self.expires_at, self.stale_until, self.error_until)
+
+    def is_stale(self, now: Union[float, None] = None) -> bool:
+        return (time.time() if now is None else now) >= self.expires_at
+
+    def should_refresh(self, beta: float, now: Union[float, None] = None) -> bool:
+        """
+        Вероятностное досрочное обновление (XFetch): чем ближе протухание и чем дольше пересчет,
+        тем вероятнее, что этот вызывающий пойдет за свежим ответом, пока остальные берут из кэша
+        """
+        now = time.time() if now is None else now
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.expires_at
+
+    def encode(self, compress_min: int) -> bytes:
+        """
+        Компактная запись для редиса: флаг сжатия, строка-заголовок [delta, сроки, headers] и тело
+        """
+        head = [round(self.delta, 4), round(self.expires_at, 3), self.headers]
+        if self.allows_stale:
+            head += [round(self.stale_until, 3), round(self.error_until, 3)]
+        head = codec.dumps(head)
+        if len(self.body) >= compress_min:
+            return b'z' + head + b'\n' + zlib.compress(self.body, 1)
+        return b'r' + head + b'\n' + self.body
+
+    @classmethod
+    def decode(cls, data: bytes) -> 'CachedResponse':
+        head, _, body = data[1:].partition(b'\n')
+        delta, expires_at, headers, *stale = codec.loads(head)
+        if data[:1] == b'z':
+            body = zlib.decompress(body)
+        return cls(body, headers, delta, expires_at, *stale)
+
+
+class TieredResponseCache:
+    """
+    Двухуровневый кэш ответов _base_get: LRU в памяти процесса (L1) перед общим редисом (L2).
+    L1 живет недолго (l1_ttl), чтобы воркеры не расходились надолго, если шина инвалидации выключена
+    (кроме записей, которым разрешено устаревать -- там расхождение на время их жизни принято явно).
+    При ошибке редиса L2 отключается на error_backoff секунд, кэш работает только на L1
+    """
+    def __init__(self, l1_size: int = int(os.getenv('REQUESTERS_GET_CACHE_L1_SIZE', 2048)),
+                 l1_ttl: float = float(os.getenv('REQUESTERS_GET_CACHE_L1_TTL', 5)),
+                 l2_enabled: bool = os.getenv('REQUESTERS_GET_CACHE_L2', 'True') == 'True',
+                 key_prefix: str = os.getenv('REQUESTERS_GET_CACHE_PREFIX', 'requesters:get:'),
+                 beta: float = float(os.getenv('REQUESTERS_GET_CACHE_BETA', 1)),
+                 compress_min: int = int(os.getenv('REQUESTERS_GET_CACHE_COMPRESS_MIN', 1024)),
+                 redis_timeout: float = float(os.getenv('REQUESTERS_GET_CACHE_REDIS_TIMEOUT', 0.05)),
+                 error_backoff: float = float(os.getenv('REQUESTERS_GET_CACHE_ERROR_BACKOFF', 5)),
+                 index_ttl: int = int(os.getenv('REQUESTERS_GET_CACHE_INDEX_TTL', 3600)),
+                 refresh_lock_ttl: float = float(os.getenv('REQUESTERS_GET_CACHE_REFRESH_LOCK_TTL', 10))):
+        """
+        @param l1_size: Максимум записей в памяти процесса
+        @param l1_ttl: Потолок времени жизни записи в L1, в секундах
+        @param l2_enabled: Использовать ли редис
+        @param key_prefix: Префикс ключей в редисе
+        @param beta: Агрессивность досрочного обновления, 0 -- выключено
+        @param compress_min: Тела от этого размера (в байтах) хранятся в редисе сжатыми
+        @param redis_timeout: Таймаут операций с редисом
+        @param error_backoff: На сколько секунд отключать L2 после ошибки редиса
+        @param index_ttl: Время жизни индексов ключей по сущностям (для инвалидации)
+        @param refresh_lock_ttl: Сколько держится блокировка фонового обновления в редисе (если процесс упал)
+        """
+        self.l1 = TTLCache(maxsize=l1_size, ttl=l1_ttl)
+        self.l1_ttl = l1_ttl
+        self.l2_enabled = l2_enabled
+        self.key_prefix = key_prefix
+        self.beta = beta
+        self.compress_min = compress_min
+        self.redis_timeout = redis_timeout
+        self.error_backoff = error_backoff
+        self.index_ttl = index_ttl
+        self.refresh_lock_ttl = refresh_lock_ttl
+        self.metrics = {
+            'l1': {'hits': 0, 'stale_hits': 0, 'misses': 0, 'early_refreshes': 0},
+            'l2': {'hits': 0, 'stale_hits': 0, 'misses': 0, 'early_refreshes': 0, 'errors': 0, 'invalidated': 0},
+            'refresh': {'completed': 0, 'skipped': 0, 'failed': 0, 'stale_if_error': 0},
+        }
+        self._redis = None
+        self._l2_down_until = 0.0
+        # Ключи, которые этот процесс сейчас обновляет в фоне
+        self._refreshing: Set[Hashable] = set()
+        # Обращался ли процесс к кэшу: если нет, ни один реквестер тут его не использует, и записи не трогают редис
+        self._used = False
+        # События, ключи которых еще удаляются из редиса в фоне: до конца удаления L2 по ним не читается
+        self._pending: List[InvalidationEvent] = list()
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = get_redis_from_env(socket_timeout=self.redis_timeout,
+                                             socket_connect_timeout=self.redis_timeout)
+        return self._redis
+
+    @property
+    def l2_available(self) -> bool:
+        return self.l2_enabled and time.monotonic() >= self._l2_down_until
+
+    def _get_l2_key(self, key: Hashable) -> str:
+        # В ключе запроса токен, в редис он попадает только хэшем
+        return self.key_prefix + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+    def _get_index_key(self, url: str) -> str:
+        """
+        Индекс ключей по сущности: тот же префикс, что у InvalidationEvent.matches_url
+        """
+        head, _, rest = url.partition('/api/')
+        return f'{self.key_prefix}idx:{head}/api/{rest.split("/", 1)[0]}/'
+
+    def _l2_failed(self, e: exceptions.RedisError):
+        self.metrics['l2']['errors'] += 1
+        self._l2_down_until = time.monotonic() + self.error_backoff
+        print(f'=== GET CACHE REDIS ERROR {str(e)} ===')
+
+    def _check(self, tier: str, entry: Union[CachedResponse, None], now: float) -> Union[CachedResponse, None]:
+        """
+        Можно ли отдать запись: свежая, либо устаревшая в пределах stale_until (вызывающий обновит ее в фоне).
+        None -- промах, либо этому вызывающему выпало обновить запись досрочно
+        """
+        counters = self.metrics[tier]
+        if entry is None or now >= entry.stale_until:
+            counters['misses'] += 1
+            return None
+        if now >= entry.expires_at:
+            counters['stale_hits'] += 1
+            return entry
+        if self.beta and not entry.allows_stale and entry.should_refresh(self.beta, now):
+            counters['early_refreshes'] += 1
+            return None
+        counters['hits'] += 1
+        return entry
+
+    def get_local(self, key: Hashable) -> Union[CachedResponse, None]:
+        self._used = True
+        return self._check('l1', self.l1.get(key), time.time())
+
+    def _is_pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return any(event.matches_url(key[1]) for event in self._pending)
+
+    def get_shared(self, key: Hashable) -> Union[CachedResponse, None]:
+        """
+        Запись из редиса (блокирующе). Найденная кладется в L1, даже если отдать ее нельзя:
+        она может пригодиться как stale-if-error. Ключи, удаление которых из редиса еще идет, -- промах
+        """
+        if self._is_pending(key):
+            self.metrics['l2']['misses'] += 1
+            return None
+        try:
+            data = self.redis.get(self._get_l2_key(key))
+        except exceptions.RedisError as e:
+            self._l2_failed(e)
+            return None
+        entry = None
+        if data is not None:
+            try:
+                entry = CachedResponse.decode(data)
+            except (ValueError, TypeError, zlib.error):
+                pass
+        if entry is not None:
+            self.set_local(key, entry)
+        return self._check('l2', entry, time.time())
+
+    def get(self, key: Hashable) -> Union[CachedResponse, None]:
+        """
+        Запись из L1, либо из редиса, если в L1 ее нет или она устарела (в редисе может быть уже обновленная)
+        """
+        entry = self.get_local(key)
+        if (entry is None or entry.is_stale()) and self.l2_available:
+            entry = self.get_shared(key) or entry
+        return entry
+
+    def get_stale_if_error(self, key: Hashable) -> Union[CachedResponse, None]:
+        """
+        Запись из L1, которую еще можно отдать при недоступном сервисе (из редиса она попала в L1 при поиске)
+        """
+        entry = self.l1.get(key)
+        if entry is None or time.time() >= entry.error_until:
+            return None
+        self.metrics['refresh']['stale_if_error'] += 1
+        return entry
+
+    def set_local(self, key: Hashable, entry: CachedResponse):
+        self._used = True
+        ttl = entry.keep_until - time.time()
+        self.l1.set(key, entry, ttl=ttl if entry.allows_stale else min(self.l1_ttl, ttl))
+
+    def set_shared(self, key: Hashable, entry: CachedResponse):
+        """
+        Запись в редис (блокирующе) вместе с индексом сущности
+        @param key: Ключ запроса, второй элемент -- урл
+        """
+        l2_key = self._get_l2_key(key)
+        index_key = self._get_index_key(key[1])
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(l2_key, entry.encode(self.compress_min), ex=max(1, math.ceil(entry.keep_until - time.time())))
+            pipe.sadd(index_key, f'{l2_key} {key[1]}')
+            pipe.expire(index_key, self.index_ttl)
+            pipe.execute()
+        except exceptions.RedisError as e:
+            self._l2_failed(e)
+
+    def set(self, key: Hashable, entry: CachedResponse):
+        self.set_local(key, entry)
+        if self.l2_available:
+            self.set_shared(key, entry)
+
+    def begin_refresh(self, key: Hashable) -> bool:
+        """
+        Пометка фонового обновления в этом процессе
+        @return: False -- ключ уже обновляется
+        """
+        with self._lock:
+            if key in self._refreshing:
+                self.metrics['refresh']['skipped'] += 1
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def claim_refresh(self, key: Hashable) -> bool:
+        """
+        Блокировка фонового обновления между процессами (SET NX в редисе, блокирующе)
+        @return: False -- ключ обновляет другой процесс. Без редиса -- всегда True
+        """
+        if not self.l2_available:
+            return True
+        try:
+            claimed = self.redis.set(self._get_l2_key(key) + ':refresh', INVALIDATION_BUS.origin, nx=True,
+                                     ex=max(1, math.ceil(self.refresh_lock_ttl)))
+        except exceptions.RedisError as e:
+            self._l2_failed(e)
+            return True
+        if not claimed:
+            self.metrics['refresh']['skipped'] += 1
+        return bool(claimed)
+
+    def end_refresh(self, key: Hashable, claimed: bool = False, failed: bool = False):
+        with self._lock:
+            self._refreshing.discard(key)
+        if failed:
+            self.metrics['refresh']['failed'] += 1
+        else:
+            self.metrics['refresh']['completed'] += 1
+        if claimed and self.l2_available:
+            try:
+                self.redis.delete(self._get_l2_key(key) + ':refresh')
+            except exceptions.RedisError as e:
+                self._l2_failed(e)
+
+    def invalidate(self, event: Union[InvalidationEvent, None]):
+        """
+        Подписчик шины инвалидации. Из редиса удаляет только процесс, который сделал запись, и только если
+        он сам пользуется кэшем, остальным достаточно почистить свой L1. None (пропущенные события) -- тоже только L1.
+        Удаление из редиса идет в пуле FANOUT, чтобы запись (в том числе из event loop'а) не ждала редис
+        """
+        if event is None:
+            self.l1.invalidate()
+            return
+        self.l1.invalidate_where(lambda key: event.matches_url(key[1]))
+        if event.origin == INVALIDATION_BUS.origin and self._used and self.l2_available:
+            with self._lock:
+                self._pending.append(event)
+            FANOUT.pool.submit(self._invalidate_shared, event)
+
+    def _invalidate_shared(self, event: InvalidationEvent):
+        try:
+            self._delete_shared(event)
+        finally:
+            with self._lock:
+                self._pending.remove(event)
+
+    def _delete_shared(self, event: InvalidationEvent):
+        index_key = f'{self.key_prefix}idx:{event.host}/api/{event.entity}/'
+        try:
+            members = [m.decode('utf-8') for m in self.redis.smembers(index_key)]
+            matched = [m for m in members if event.matches_url(m.split(' ', 1)[1])]
+            if not matched:
+                return
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*(m.split(' ', 1)[0] for m in matched))
+            pipe.srem(index_key, *matched)
+            pipe.execute()
+            self.metrics['l2']['invalidated'] += len(matched)
+        except exceptions.RedisError as e:
+            self._l2_failed(e)
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """
+        Счетчики по уровням, с долей попаданий (устаревшие ответы тоже попадания)
+        """
+        stats = {tier: dict(counters) for tier, counters in self.metrics.items()}
+        for tier in ('l1', 'l2'):
+            counters = self.metrics[tier]
+            served = counters['hits'] + counters['stale_hits']
+            lookups = served + counters['misses'] + counters['early_refreshes']
+            stats[tier]['hit_ratio'] = served / lookups if lookups else 0.0
+        stats['l1']['size'] = len(self.l1)
+        return stats
+
+
+# Ответы GET, L1 -- на процесс, L2 -- общий редис. Что кэшировать, решают реквестеры (get_cache_ttls)
+GET_CACHE = TieredResponseCache()
+INVALIDATION_BUS.add_listener(GET_CACHE.invalidate)
@@ -0,0 +1,105 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Tuple
+
+
+class SessionsRegistry:
+    """
+    Процессный реестр keep-alive сессий, по одной на хост сервиса
+    """
+    def __init__(self, pool_connections: int = int(os.getenv('REQUESTERS_POOL_CONNECTIONS', 4)),
+                 pool_maxsize: int = int(os.getenv('REQUESTERS_POOL_MAXSIZE', 32)),
+                 pool_block: bool = os.getenv('REQUESTERS_POOL_BLOCK', 'False') == 'True',
+                 keep_alive: bool = os.getenv('REQUESTERS_KEEP_ALIVE', 'True') == 'True'):
+        """
+        @param pool_connections: Сколько пулов соединений держит адаптер (по одному на хост:порт)
+        @param pool_maxsize: Максимум соединений в одном пуле
+        @param pool_block: Ждать ли свободное соединение, если пул исчерпан, вместо открытия нового
+        @param keep_alive: Держать ли соединения открытыми между запросами
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self._sessions: Dict[Tuple[str, int], requests.Session] = dict()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _create_session(self, pool_maxsize: int) -> requests.Session:
+        """
+        Создание сессии с настроенным HTTP-адаптером
+        @param pool_maxsize: Максимум соединений в пуле
+        @return: Новая сессия
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def get(self, host: str, pool_maxsize: int = None) -> requests.Session:
+        """
+        Получение (или создание) сессии для хоста
+        @param host: Хост сервиса, например settings.ENV['AUTH_HOST']
+        @param pool_maxsize: Размер пула, если нужен отличный от дефолтного
+        @return: Сессия, общая для всех реквестеров этого хоста
+        """
+        pool_maxsize = pool_maxsize or self.pool_maxsize
+        key = (host, pool_maxsize)
+        # После форка (gunicorn --preload) сокеты родителя переиспользовать нельзя
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._sessions = dict()
+                    self._pid = os.getpid()
+        try:
+            return self._sessions[key]
+        except KeyError:
+            pass
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._create_session(pool_maxsize)
+                self._sessions[key] = session
+            return session
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Сколько запросов по хостам ушло по новым соединениям, а сколько -- по переиспользованным
+        (по счетчикам пулов urllib3; пулы, вытесненные из адаптера, в сумму не попадают)
+        @return: Словарь вида {host: {'new': ..., 'reused': ...}}
+        """
+        with self._lock:
+            sessions = list(self._sessions.items())
+        stats = dict()
+        for (host, _), session in sessions:
+            counters = stats.setdefault(host, {'new': 0, 'reused': 0})
+            adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+            for adapter in adapters.values():
+                pools = getattr(getattr(adapter, 'poolmanager', None), 'pools', None)
+                if pools is None:
+                    continue
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        counters['new'] += pool.num_connections
+                        counters['reused'] += max(pool.num_requests - pool.num_connections, 0)
+        return stats
+
+    def close(self, host: str = None):
+        """
+        Закрытие сессий (всех, либо только для одного хоста)
+        @param host: Хост, сессии которого закрываем
+        """
+        with self._lock:
+            for key in list(self._sessions.keys()):
+                if host is None or key[0] == host:
+                    self._sessions.pop(key).close()
+
+
+SESSIONS = SessionsRegistry()
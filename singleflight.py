@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """
+    Один запрос в полете
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых параллельных вызовов: первый поток делает вызов,
+    остальные с тем же ключом ждут и получают его результат (или его исключение)
+    """
+    def __init__(self, max_tracked_keys: int = 1024):
+        """
+        @param max_tracked_keys: Для скольких последних ключей хранить метрики ожидающих
+        """
+        self.max_tracked_keys = max_tracked_keys
+        self.calls = 0
+        self.shared = 0
+        self._in_flight: Dict[Hashable, _Call] = dict()
+        self._key_waiters: 'OrderedDict[Hashable, int]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any], metrics_key: Hashable = None) -> Tuple[Any, bool]:
+        """
+        Вызов fn, либо ожидание уже идущего вызова с тем же ключом
+        @param key: Ключ вызова
+        @param fn: Функция без аргументов
+        @param metrics_key: Ключ для метрик ожидающих (чтобы не светить в них токены), по умолчанию key
+        @return: Результат и флаг, что он общий с другими потоками (тогда его нельзя мутировать)
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+                leader = True
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error.with_traceback(None)
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.waiters:
+                    self._track_waiters(key if metrics_key is None else metrics_key, call.waiters)
+            call.done.set()
+        return call.result, call.waiters > 0
+
+    def _track_waiters(self, key: Hashable, waiters: int):
+        self._key_waiters[key] = self._key_waiters.get(key, 0) + waiters
+        self._key_waiters.move_to_end(key)
+        while len(self._key_waiters) > self.max_tracked_keys:
+            self._key_waiters.popitem(last=False)
+
+    def waiters(self, key: Hashable) -> int:
+        """
+        Сколько потоков сейчас ждут вызов с этим ключом
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            return call.waiters if call is not None else 0
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Метрики: сделано вызовов, сколько раз результат был переиспользован, топ ключей по ожидающим
+        """
+        with self._lock:
+            top = sorted(self._key_waiters.items(), key=lambda x: x[1], reverse=True)[:10]
+            return {
+                'calls': self.calls,
+                'shared': self.shared,
+                'in_flight': len(self._in_flight),
+                'top_waiters': top,
+            }
@@ -0,0 +1,42 @@
+import json
+import threading
+import requests
+from typing import Any, Dict, List, Union
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+
+
+def make_response(status_code: int = 200, body: Any = None, headers: Union[Dict[str, str], None] = None,
+                  url: str = 'http://service/api/', request_headers: Union[Dict[str, str], None] = None) \
+        -> requests.Response:
+    """
+    Ответ requests без сети
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = b'' if body is None else json.dumps(body).encode('utf-8')
+    response._content_consumed = True
+    response.headers = requests.structures.CaseInsensitiveDict(headers or dict())
+    response.url = url
+    response.request = requests.Request('GET', url, headers=request_headers or dict()).prepare()
+    return response
+
+
+class StubRequester(BaseApiRequester):
+    """
+    Реквестер, у которого GET не ходит в сеть: ответы берутся из replies (функция (path_suffix, headers) -> ответ),
+    вызовы записываются в calls
+    """
+    def __init__(self, reply):
+        super().__init__()
+        self.host = 'http://service'
+        self.reply = reply
+        self.calls: List[Dict[str, Any]] = list()
+        self._calls_lock = threading.Lock()
+
+    def get(self, path_suffix, headers=None, params=None, timeout=None):
+        with self._calls_lock:
+            self.calls.append({'path_suffix': path_suffix, 'headers': dict(headers or dict()), 'params': params})
+        response = self.reply(path_suffix, headers or dict())
+        if isinstance(response, BaseException):
+            raise response
+        return response
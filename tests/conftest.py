@@ -0,0 +1,21 @@
+import os
+import sys
+import importlib
+import django
+import dotenv
+from django.conf import settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if not settings.configured:
+    # Хосты из dev.env, сами сервисы в тестах не нужны: запросы подменяются или идут в локальный сервер
+    settings.configure(DEBUG=True, INSTALLED_APPS=[], APP_ID='Tests', APP_SECRET='TestsSecret', TESTING=True,
+                       ALLOW_REQUESTS=False, ALLOW_REQUESTS_TEST=False,
+                       ENV=dotenv.main.dotenv_values(os.path.join(ROOT, 'dev.env')))
+    django.setup()
+
+# Сабмодуль подключается как ApiRequesters, а склонирован может быть в директорию с другим именем
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.modules.setdefault('ApiRequesters', importlib.import_module(os.path.basename(ROOT)))
+# Редис в памяти из бенчмарков
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
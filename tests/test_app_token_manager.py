@@ -0,0 +1,48 @@
+import time
+import base64
+import json
+from ApiRequesters.Auth.AppTokenManager import AppTokenManager
+
+
+def make_token(lifetime: float) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({'exp': time.time() + lifetime}).encode()).rstrip(b'=')
+    return f'e30.{claims.decode()}.sig'
+
+
+class FakeAuthRequester:
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self.calls = 0
+
+    def app_get_token(self, app_id, app_secret, **kwargs):
+        self.calls += 1
+        return None, {'access': make_token(self.lifetime), 'refresh': make_token(self.lifetime * 10)}
+
+    def app_refresh_token(self, refresh):
+        self.calls += 1
+        return None, make_token(self.lifetime)
+
+
+def make_manager(lifetime: float) -> (AppTokenManager, FakeAuthRequester):
+    manager = AppTokenManager('app', 'secret', 'http://auth')
+    r = FakeAuthRequester(lifetime)
+    manager._get_requester = lambda: r
+    return manager, r
+
+
+def test_token_is_reused_until_margin():
+    manager, r = make_manager(lifetime=300)
+    token = manager.get_access_token()
+    assert manager.get_access_token() == token
+    assert r.calls == 1
+    manager.invalidate()
+
+
+def test_short_lived_token_is_not_refreshed_in_a_loop():
+    manager, r = make_manager(lifetime=10)
+    token = manager.get_access_token()
+    for _ in range(10):
+        assert manager.get_access_token() == token
+    assert r.calls == 1
+    assert 0 < manager._access_margin <= 5
+    manager.invalidate()
@@ -0,0 +1,96 @@
+import itertools
+import pybreaker
+import pytest
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+from ApiRequesters.breakers import BREAKERS
+from ApiRequesters.cache import TTLCache
+from ApiRequesters.exceptions import CircuitOpenError, DeadlineExceeded, UnexpectedResponse
+from ApiRequesters.timeouts import deadline
+from _responses import make_response
+
+HOSTS = itertools.count()
+
+
+class BreakerRequester(BaseApiRequester):
+    """
+    Реквестер с брейкером, у которого запросы не ходят в сеть: статус ответа берется из self.status
+    """
+    breaker_enabled = True
+    breaker_fail_max = 2
+    breaker_reset_timeout = 60
+    get_cache = None
+    coalesce_gets = False
+
+    def __init__(self, **attrs):
+        super().__init__()
+        # У каждого теста свой хост, а значит и свой брейкер в общем реестре
+        self.host = f'http://breaker-{next(HOSTS)}'
+        self.status = 200
+        self.sent = 0
+        for name, value in attrs.items():
+            setattr(self, name, value)
+
+    def _send_request(self, method, uri, headers, params, body, timeout=None):
+        self._get_timeout(timeout)
+        self.sent += 1
+        return make_response(self.status, [{'id': self.sent}], url=uri)
+
+
+def fail(r, times):
+    r.status = 500
+    for _ in range(times):
+        with pytest.raises(UnexpectedResponse):
+            r._base_get('token', 'pins/', None)
+
+
+def test_breaker_opens_after_fail_max_and_rejects_without_request():
+    r = BreakerRequester()
+    fail(r, 2)
+    r.status = 200
+    with pytest.raises(CircuitOpenError):
+        r._base_get('token', 'pins/', None)
+    assert r.sent == 2
+    stats = BREAKERS.stats[r.host]
+    assert stats['opened'] == 1 and stats['rejected'] == 1
+
+
+def test_breaker_success_resets_fail_counter():
+    r = BreakerRequester()
+    fail(r, 1)
+    r.status = 200
+    r._base_get('token', 'pins/', None)
+    fail(r, 1)
+    r.status = 200
+    assert r._base_get('token', 'pins/', None)[1] == [{'id': 4}]
+
+
+def test_open_breaker_serves_last_good_response():
+    r = BreakerRequester(breaker_stale_cache=TTLCache(maxsize=8, ttl=60))
+    response, res_json = r._base_get('token', 'pins/', None)
+    res_json.append('mutated')
+    fail(r, 2)
+    stale_response, stale_json = r._base_get('token', 'pins/', None)
+    assert stale_response is response and stale_json == [{'id': 1}]
+    with pytest.raises(CircuitOpenError):
+        r._base_get('other', 'pins/', None)
+
+
+def test_open_breaker_serves_default_fallback():
+    r = BreakerRequester(breaker_fallbacks={'pins/': [], 'places/': lambda path_suffix, params: {'path': path_suffix}})
+    fail(r, 2)
+    assert r._base_get('token', 'pins/', None) == (None, [])
+    assert r._base_get('token', 'places/1/', None) == (None, {'path': 'places/1/'})
+    with pytest.raises(CircuitOpenError):
+        r._base_get('token', 'users/', None)
+
+
+def test_expired_deadline_is_not_a_host_failure():
+    r = BreakerRequester()
+    with deadline(0):
+        for _ in range(5):
+            with pytest.raises(DeadlineExceeded):
+                r._base_get('token', 'pins/', None)
+    assert r.sent == 0
+    breaker = r._get_breaker(r.api_url + 'pins/')
+    assert breaker.current_state == pybreaker.STATE_CLOSED and breaker.fail_counter == 0
+    assert r._base_get('token', 'pins/', None)[1] == [{'id': 1}]
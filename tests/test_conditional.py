@@ -0,0 +1,55 @@
+import pytest
+from ApiRequesters.conditional import CONDITIONAL_CACHE
+from _responses import make_response, StubRequester
+
+PINS = [{'id': 1, 'name': 'pin', 'tags': ['a']}]
+
+
+class ConditionalRequester(StubRequester):
+    conditional_get_ttls = {'pins/': 300}
+    get_cache = None
+    coalesce_gets = False
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    CONDITIONAL_CACHE.invalidate()
+    yield
+    CONDITIONAL_CACHE.invalidate()
+
+
+def reply(path_suffix, headers):
+    if headers.get('If-None-Match') == '"v1"':
+        return make_response(304, request_headers=headers)
+    return make_response(200, PINS, headers={'ETag': '"v1"', 'Content-Type': 'application/json'},
+                         request_headers=headers)
+
+
+def test_not_modified_serves_cached_body_with_conditional_header():
+    r = ConditionalRequester(reply)
+    _, first = r._base_get('t1', 'pins/', None)
+    response, second = r._base_get('t2', 'pins/', None)
+    assert r.calls[1]['headers']['If-None-Match'] == '"v1"'
+    assert response.status_code == 200
+    assert first == second == PINS
+
+
+def test_not_modified_does_not_share_json():
+    r = ConditionalRequester(reply)
+    _, first = r._base_get('t1', 'pins/', None)
+    first[0]['tags'].append('mutated')
+    _, second = r._base_get('t2', 'pins/', None)
+    assert second == PINS and second is not first
+    second[0]['name'] = 'changed'
+    _, third = r._base_get('t3', 'pins/', None)
+    assert third == PINS
+
+
+def test_not_modified_response_carries_callers_request():
+    r = ConditionalRequester(reply)
+    r._base_get('t1', 'pins/', None)
+    first, _ = r._base_get('t2', 'pins/', None)
+    second, _ = r._base_get('t3', 'pins/', None)
+    assert first is not second
+    assert first.request.headers['Authorization'].endswith('t2')
+    assert second.request.headers['Authorization'].endswith('t3')
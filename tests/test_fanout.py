@@ -0,0 +1,88 @@
+import time
+import threading
+from ApiRequesters.exceptions import DeadlineExceeded
+from ApiRequesters.fanout import FanOut, Call
+from ApiRequesters.timeouts import get_deadline
+
+
+def test_results_keep_order_and_errors():
+    fanout = FanOut(max_workers=4)
+
+    def fail():
+        raise ValueError('boom')
+    results = fanout.gather({'b': lambda: 2, 'a': Call(lambda x: x, 1), 'err': fail})
+    assert list(results) == ['b', 'a', 'err']
+    assert results['b'].unwrap() == 2 and results['a'].value == 1
+    assert not results['err'].ok and isinstance(results['err'].error, ValueError)
+
+
+def test_deadline_returns_in_time_and_marks_slow_calls():
+    fanout = FanOut(max_workers=4)
+    release = threading.Event()
+    start = time.monotonic()
+    results = fanout.gather({'fast': lambda: 'ok', 'slow': lambda: release.wait(5)}, deadline=0.2)
+    elapsed = time.monotonic() - start
+    release.set()
+    assert elapsed < 1
+    assert results['fast'].unwrap() == 'ok'
+    assert isinstance(results['slow'].error, DeadlineExceeded)
+
+
+def test_call_timeout_is_per_call():
+    fanout = FanOut(max_workers=4)
+    release = threading.Event()
+    results = fanout.gather({'slow': Call(release.wait, 5, timeout=0.1), 'ok': lambda: time.sleep(0.3) or 'ok'})
+    release.set()
+    assert isinstance(results['slow'].error, DeadlineExceeded)
+    assert results['ok'].unwrap() == 'ok'
+
+
+def test_queued_calls_are_cancelled_after_deadline():
+    fanout = FanOut(max_workers=1)
+    release, started = threading.Event(), list()
+
+    def blocker():
+        started.append('blocker')
+        release.wait(5)
+
+    results = fanout.gather({'blocker': blocker, 'queued': lambda: started.append('queued')}, deadline=0.2)
+    release.set()
+    fanout.pool.submit(lambda: None).result(5)
+    assert isinstance(results['queued'].error, DeadlineExceeded)
+    assert started == ['blocker']
+
+
+def test_deadline_is_visible_inside_calls():
+    fanout = FanOut(max_workers=2)
+    results = fanout.gather({'deadline': get_deadline}, deadline=5)
+    assert results['deadline'].unwrap() is not None
+
+
+def test_nested_gather_runs_inline_in_saturated_pool():
+    fanout = FanOut(max_workers=2)
+
+    def outer(i):
+        inner = fanout.gather({j: Call(lambda x: x, i * 10 + j) for j in range(3)})
+        return [r.unwrap() for r in inner.values()]
+
+    start = time.monotonic()
+    results = fanout.gather({i: Call(outer, i) for i in range(4)}, deadline=5)
+    assert time.monotonic() - start < 2
+    assert [results[i].unwrap() for i in range(4)] == [[i * 10 + j for j in range(3)] for i in range(4)]
+
+
+def test_nested_gather_skips_calls_after_outer_deadline():
+    fanout = FanOut(max_workers=2)
+    calls, inner, done = list(), dict(), threading.Event()
+
+    def outer():
+        time.sleep(0.3)
+        inner.update(fanout.gather({'late': lambda: calls.append('late')}))
+        done.set()
+
+    results = fanout.gather({'outer': outer}, deadline=0.1)
+    assert isinstance(results['outer'].error, DeadlineExceeded)
+    assert done.wait(5)
+    # Внешний дедлайн к запуску вложенного gather уже истек, так что вызов не выполняется
+    assert isinstance(inner['late'].error, DeadlineExceeded)
+    assert calls == []
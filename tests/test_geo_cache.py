@@ -0,0 +1,53 @@
+from ApiRequesters.Places._geo_cache import GeoTileCache
+
+BBOX = (0.0, 0.0, 1.0, 1.0)
+
+
+def place(place_id, lat=0.5, long=0.5):
+    return {'id': place_id, 'latitude': lat, 'longitude': long}
+
+
+def test_merge_skips_places_without_coordinates():
+    tiles = [[place(1), {'id': 2, 'latitude': 0.5}, {'id': 3}], [place(4, None, None), place(5, 0.5, 'x')]]
+    assert [p['id'] for p in GeoTileCache.merge(tiles, BBOX)] == [1]
+
+
+def test_merge_dedupes_by_id_but_keeps_places_without_id():
+    tiles = [[place(1), place(None), place(2, 5, 5)], [place(1), place(None)]]
+    merged = GeoTileCache.merge(tiles, BBOX)
+    assert [p['id'] for p in merged] == [1, None, None]
+
+
+def test_plan_merges_cells_into_rectangles():
+    cache = GeoTileCache(tile_size=1)
+    plan = cache.plan([(0, 0), (0, 1), (1, 0), (1, 1), (3, 0)])
+    assert plan == [((0, 0, 2, 2), [(0, 0), (0, 1), (1, 0), (1, 1)]), ((3, 0, 4, 1), [(3, 0)])]
+
+
+def test_put_and_get_tiles():
+    cache = GeoTileCache(tile_size=1, ttl=60)
+    cells = cache.get_cells((0.5, 0.5, 1.5, 0.5))
+    assert cells == [(0, 0), (1, 0)]
+    found, missing = cache.get_tiles('all', cells)
+    assert found == {} and missing == cells
+    cache.put('all', cells, 'response', [place(1), place(2, 1.5, 0.5), {'id': 3}])
+    found, missing = cache.get_tiles('all', cells)
+    assert missing == []
+    assert found == {(0, 0): ('response', [place(1)]), (1, 0): ('response', [place(2, 1.5, 0.5)])}
+    assert cache.get_tiles('other', cells)[1] == cells
+
+
+def test_get_cells_bypasses_large_queries():
+    cache = GeoTileCache(tile_size=1, max_tiles_per_query=4)
+    assert cache.get_cells((0, 0, 2, 2)) is None
+    assert cache.stats['bypassed'] == 1
+
+
+def test_invalidate_place_drops_its_tiles_in_every_scope():
+    cache = GeoTileCache(tile_size=1, ttl=60)
+    cache.put('a', [(0, 0), (1, 0)], 'response', [place(1), place(2, 1.5, 0.5)])
+    cache.put('b', [(0, 0)], 'response', [place(1)])
+    cache.invalidate_place(1)
+    assert cache.get_tiles('a', [(0, 0), (1, 0)])[1] == [(0, 0)]
+    assert cache.get_tiles('b', [(0, 0)])[1] == [(0, 0)]
+    assert len(cache) == 1
@@ -0,0 +1,130 @@
+import os
+import threading
+import pytest
+from ApiRequesters import BaseApiRequester as base
+from ApiRequesters.BaseApiRequester import BY_ID_CACHE
+from ApiRequesters.conditional import CONDITIONAL_CACHE
+from ApiRequesters.invalidation import InvalidationBus, InvalidationEvent
+from _responses import make_response, StubRequester
+
+
+class WriteRequester(StubRequester):
+    """
+    StubRequester, у которого POST и DELETE тоже не ходят в сеть
+    """
+    get_cache = None
+    coalesce_gets = False
+    conditional_get_ttls = {'places/': 300}
+
+    def post(self, path_suffix, headers=None, data=None, params=None, timeout=None):
+        return make_response(201, {'id': 7, **data}, url=self.api_url + path_suffix)
+
+    def delete(self, path_suffix, headers=None, data=None, params=None, timeout=None):
+        return make_response(204, url=self.api_url + path_suffix)
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    BY_ID_CACHE.invalidate()
+    CONDITIONAL_CACHE.invalidate()
+    yield
+    BY_ID_CACHE.invalidate()
+    CONDITIONAL_CACHE.invalidate()
+
+
+def reply(path_suffix, headers):
+    obj_id = path_suffix.strip('/').split('/')[-1]
+    return make_response(200, {'id': int(obj_id)} if obj_id.isdigit() else [], headers={'ETag': '"v1"'})
+
+
+def test_event_from_write_and_matches_url():
+    event = InvalidationEvent.from_write('http://service', 'places/12/accept/', {'place_id': 12, 'x': 1})
+    assert (event.entity, event.entity_id, event.hints) == ('places', '12', {'place_id': 12})
+    assert event.matches_url('http://service/api/places/')
+    assert event.matches_url('http://service/api/places/12/')
+    assert event.matches_url('http://service/api/places/12/rates/')
+    assert event.matches_url('http://service/api/places/search/')
+    assert not event.matches_url('http://service/api/places/13/')
+    assert not event.matches_url('http://service/api/pins/12/')
+    assert not event.matches_url('http://other/api/places/12/')
+    created = InvalidationEvent.from_write('http://service', 'places/', res_json={'id': 5})
+    assert created.entity_id is None and created.hints == {'id': 5}
+    # Созданная сущность меняет списки, но не другие сущности
+    assert created.matches_url('http://service/api/places/')
+    assert not created.matches_url('http://service/api/places/3/')
+
+
+def test_publish_applies_event_locally_even_when_disabled():
+    bus, events = InvalidationBus(enabled=False), list()
+    bus.add_listener(events.append)
+    bus.add_listener(lambda event: 1 / 0)
+    bus.publish('http://service', 'places/3/')
+    assert [(e.entity, e.entity_id) for e in events] == [('places', '3')]
+    assert bus.metrics['listener_errors'] == 1 and bus.metrics['published'] == 0
+
+
+def test_writes_evict_by_id_and_conditional_caches():
+    r = WriteRequester(reply)
+    r._get_by_ids([1, 2], 'token', lambda x: r._base_get('token', f'places/{x}/', None), 'places/', dict())
+    r._base_get('token', 'places/', None)
+    assert len(BY_ID_CACHE) == 2 and len(CONDITIONAL_CACHE) == 3
+    r._base_delete('token', 'places/1/')
+    assert BY_ID_CACHE.get(r._get_by_ids_key('token', 'places/', dict(), 1)) is None
+    assert BY_ID_CACHE.get(r._get_by_ids_key('token', 'places/', dict(), 2)) == {'id': 2}
+    # Список мест тоже зависит от удаленного места
+    assert len(CONDITIONAL_CACHE) == 1
+    r._base_get('token', 'places/', None)
+    r._base_post('token', 'places/', {'name': 'new'})
+    assert len(BY_ID_CACHE) == 1 and len(CONDITIONAL_CACHE) == 1
+    assert CONDITIONAL_CACHE.get(r._get_conditional_key('places/', None)) is None
+
+
+def test_writes_are_not_published_when_disabled():
+    r = WriteRequester(reply)
+    r.publish_invalidations = False
+    r._base_get('token', 'places/1/', None)
+    r._base_delete('token', 'places/1/')
+    assert len(CONDITIONAL_CACHE) == 1
+
+
+class StartedBus(InvalidationBus):
+    """
+    Включенная шина без редиса: вместо циклов потоков -- отметки о запуске
+    """
+    def __init__(self):
+        super().__init__(enabled=True)
+        self.started = {'publisher': threading.Event(), 'subscriber': threading.Event()}
+
+    def _publish_loop(self):
+        self.started['publisher'].set()
+
+    def _subscribe_loop(self):
+        self.started['subscriber'].set()
+
+
+def test_subscriber_starts_when_a_cache_subscribes():
+    bus = StartedBus()
+    assert bus._subscriber is None
+    bus.add_listener(lambda event: None)
+    assert bus.started['subscriber'].wait(5) and bus.metrics['published'] == 0
+
+
+def test_disabled_bus_starts_no_threads():
+    bus = InvalidationBus(enabled=False)
+    bus.add_listener(lambda event: None)
+    bus.start()
+    assert bus._publisher is None and bus._subscriber is None
+
+
+def test_first_request_after_fork_restarts_subscriber(monkeypatch):
+    bus = StartedBus()
+    bus.add_listener(lambda event: None)
+    inherited = bus._subscriber
+    # Как в воркере после форка: pid другой, потоки родителя не работают
+    bus._pid = -1
+    monkeypatch.setattr(base, 'INVALIDATION_BUS', bus)
+    r = base.BaseApiRequester()
+    r._make_request(lambda uri, params=None, data=None, headers=None, timeout=None: make_response(200),
+                    'http://service/api/places/', None, None, None)
+    assert bus._subscriber is not None and bus._subscriber is not inherited
+    assert bus._pid == os.getpid()
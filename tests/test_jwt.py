@@ -0,0 +1,67 @@
+import hmac
+import time
+import base64
+import hashlib
+import json
+from ApiRequesters.Auth._jwt import LocalJwtVerifier
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def make_token(key: str, exp_in: float = 60) -> str:
+    head = b64(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+    body = b64(json.dumps({'exp': time.time() + exp_in, 'token_type': 'access'}).encode())
+    signature = hmac.new(key.encode(), f'{head}.{body}'.encode(), hashlib.sha256).digest()
+    return f'{head}.{body}.{b64(signature)}'
+
+
+class KeyLoader:
+    def __init__(self, key=None, error=None):
+        self.key = key
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {'key': self.key, 'algorithm': 'HS256'} if self.key else None
+
+
+def test_valid_and_expired_tokens():
+    verifier = LocalJwtVerifier(enabled=True, key_loader=KeyLoader('k1'))
+    assert verifier.verify(make_token('k1')) is True
+    assert verifier.verify(make_token('k1', exp_in=-60)) is False
+
+
+def test_failed_key_load_is_remembered():
+    loader = KeyLoader(error=ConnectionError('auth is down'))
+    verifier = LocalJwtVerifier(enabled=True, key_loader=loader, key_retry_interval=60)
+    for _ in range(5):
+        assert verifier.verify(make_token('k1')) is None
+    assert loader.calls == 1
+
+    loader.error, loader.key = None, 'k1'
+    verifier.key_retry_interval = 0
+    assert verifier.verify(make_token('k1')) is True
+    assert loader.calls == 2
+
+
+def test_rotated_key_is_reloaded():
+    loader = KeyLoader('old')
+    verifier = LocalJwtVerifier(enabled=True, key_loader=loader, key_retry_interval=0)
+    assert verifier.verify(make_token('old')) is True
+    loader.key = 'new'
+    assert verifier.verify(make_token('new')) is True
+    assert verifier.verify(make_token('forged')) is False
+
+
+def test_mismatch_goes_to_service_until_reload_is_allowed():
+    loader = KeyLoader('old')
+    verifier = LocalJwtVerifier(enabled=True, key_loader=loader, key_retry_interval=60)
+    assert verifier.verify(make_token('old')) is True
+    loader.key = 'new'
+    assert verifier.verify(make_token('new')) is None
+    assert loader.calls == 1
@@ -0,0 +1,45 @@
+import copy
+import pytest
+from ApiRequesters import models
+
+PLACE = {'id': 1, 'name': 'name', 'latitude': 12.12, 'longitude': 12.12, 'address': 'address', 'rating': 5}
+
+
+def test_from_json_reads_like_a_dict():
+    place = models.Place.from_json({**PLACE, 'extra': 'x'})
+    assert place.name == place['name'] == place.get('name') == 'name'
+    assert place.accepts_cnt is None and place['accepts_cnt'] is None
+    assert place['extra'] == 'x' and 'extra' in place and 'missing' not in place
+    assert place.get('missing', 0) == 0
+    with pytest.raises(KeyError):
+        place['missing']
+    assert place.to_dict() == {**{f: None for f in models.Place._fields}, **PLACE, 'extra': 'x'}
+    assert place == place.to_dict() and place == models.Place.from_json(place.to_dict())
+
+
+def test_record_has_no_instance_dict():
+    place = models.Place.from_json(PLACE)
+    assert not hasattr(place, '__dict__')
+    assert place._extra is None
+    assert copy.deepcopy(place) == place
+
+
+def test_model_list_builds_records_lazily():
+    rows = [dict(PLACE, id=i) for i in range(5)]
+    places = models.Place.many(rows)
+    assert len(places) == 5 and all(isinstance(row, dict) for row in rows)
+    assert places[2].id == 2
+    # Созданная запись заменяет словарь в списке, остальные строки не тронуты
+    assert isinstance(rows[2], models.Place) and places[2] is rows[2]
+    assert sum(isinstance(row, dict) for row in rows) == 4
+    assert [p.id for p in places[1:3]] == [1, 2]
+    places.materialize()
+    assert all(isinstance(row, models.Place) for row in rows)
+    assert [p.id for p in places] == list(range(5))
+
+
+def test_parse_handles_single_list_and_paginated_json():
+    assert isinstance(models.parse(models.Place, PLACE), models.Place)
+    assert isinstance(models.parse(models.Place, [PLACE]), models.ModelList)
+    page = models.parse(models.Place, {'count': 1, 'next': None, 'results': [PLACE]})
+    assert page['count'] == 1 and page['results'][0].name == 'name'
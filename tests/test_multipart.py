@@ -0,0 +1,240 @@
+import io
+import asyncio
+import httpx
+import pytest
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+from ApiRequesters.AsyncBaseApiRequester import AsyncBaseApiRequester
+from ApiRequesters.Media._MediaRequester import MediaRequester
+from ApiRequesters.multipart import MultipartEncoder
+from ApiRequesters.timeouts import RetryPolicy
+from _responses import make_response
+
+DATA = bytes(range(256)) * 40
+FIELDS = {'object_type': 'place', 'object_id': 7}
+
+
+def encoder(source, **kwargs) -> MultipartEncoder:
+    return MultipartEncoder(FIELDS, {'image': ('photo.png', source, None)}, chunk_size=1000, boundary='b', **kwargs)
+
+
+def expected_body(filename: str = 'photo.png', content_type: str = 'image/png') -> bytes:
+    return (b'--b\r\nContent-Disposition: form-data; name="object_type"\r\n\r\nplace\r\n'
+            b'--b\r\nContent-Disposition: form-data; name="object_id"\r\n\r\n7\r\n'
+            + f'--b\r\nContent-Disposition: form-data; name="image"; filename="{filename}"\r\n'
+              f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8')
+            + DATA + b'\r\n--b--\r\n')
+
+
+def chunks(data: bytes, size: int = 700):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+class Iterable:
+    """
+    Многоразовое итерируемое байтов: размер неизвестен, но повторный обход возможен
+    """
+    def __iter__(self):
+        return chunks(DATA)
+
+
+class Stream:
+    """
+    Файлоподобный объект без seek (сокет, пайп)
+    """
+    def __init__(self):
+        self.buffer = io.BytesIO(DATA)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.buffer.read(size)
+
+
+@pytest.mark.parametrize('make_source', [
+    lambda: DATA,
+    lambda: bytearray(DATA),
+    lambda: memoryview(DATA),
+    lambda: io.BytesIO(DATA),
+    lambda: SimpleUploadedFile('photo.png', DATA),
+], ids=['bytes', 'bytearray', 'memoryview', 'file', 'uploaded_file'])
+def test_len_matches_body_for_sized_sources(make_source):
+    body = encoder(make_source())
+    sent = b''.join(body)
+    assert sent == expected_body()
+    assert body.len == len(sent)
+
+
+def test_len_counts_file_from_current_position(tmp_path):
+    path = tmp_path / 'photo.png'
+    path.write_bytes(b'header' + DATA)
+    with open(path, 'rb') as f:
+        f.read(6)
+        body = encoder(f)
+        assert b''.join(body) == expected_body() and body.len == len(expected_body())
+
+
+def test_len_counts_bytes_not_characters_in_heads():
+    body = MultipartEncoder({'описание': 'фото'}, {'image': ('фото.png', DATA, None)}, boundary='b')
+    assert body.len == len(b''.join(body))
+
+
+@pytest.mark.parametrize('make_source', [lambda: chunks(DATA), Iterable, Stream],
+                         ids=['iterator', 'iterable', 'unseekable_stream'])
+def test_unknown_size_goes_chunked(make_source):
+    body = encoder(make_source())
+    assert body.len is None
+    headers, encoded = BaseApiRequester._encode_body({'Authorization': 'Bearer token'}, body)
+    assert 'Content-Length' not in headers and headers['Content-Type'] == 'multipart/form-data; boundary=b'
+    prepared = requests.Request('POST', 'http://service/api/images/', headers=headers, data=encoded).prepare()
+    assert prepared.headers['Transfer-Encoding'] == 'chunked' and 'Content-Length' not in prepared.headers
+    assert b''.join(prepared.body) == expected_body()
+
+
+def test_known_size_goes_with_content_length():
+    headers, encoded = BaseApiRequester._encode_body(None, encoder(io.BytesIO(DATA)))
+    prepared = requests.Request('POST', 'http://service/api/images/', headers=headers, data=encoded).prepare()
+    assert prepared.headers['Content-Length'] == str(len(expected_body()))
+    assert 'Transfer-Encoding' not in prepared.headers
+
+
+@pytest.mark.parametrize('make_source', [
+    lambda: DATA,
+    lambda: io.BytesIO(DATA),
+    lambda: SimpleUploadedFile('photo.png', DATA),
+    Iterable,
+], ids=['bytes', 'file', 'uploaded_file', 'iterable'])
+def test_resend_starts_from_the_beginning(make_source):
+    body = encoder(make_source())
+    assert b''.join(body) == b''.join(body) == expected_body()
+
+
+@pytest.mark.parametrize('make_source', [lambda: chunks(DATA), Stream], ids=['iterator', 'unseekable_stream'])
+def test_resend_of_one_shot_source_raises(make_source):
+    body = encoder(make_source())
+    assert b''.join(body) == expected_body()
+    with pytest.raises(ValueError):
+        b''.join(body)
+
+
+def test_progress_reports_bytes_sent_after_every_chunk():
+    calls = list()
+    body = encoder(DATA, progress=lambda sent, total: calls.append((sent, total)))
+    sent = b''.join(body)
+    total = len(sent)
+    head = sent.index(DATA)
+    # Куски файла по chunk_size, затем последний вызов -- все боди целиком
+    file_chunks = [(head + min(offset + 1000, len(DATA)), total) for offset in range(0, len(DATA), 1000)]
+    assert calls == file_chunks + [(total, total)]
+
+
+def test_progress_total_is_none_for_unknown_size():
+    calls = list()
+    body = encoder(chunks(DATA), progress=lambda sent, total: calls.append((sent, total)))
+    sent = b''.join(body)
+    assert [total for _, total in calls] == [None] * len(calls)
+    assert calls[-1][0] == len(sent) and [x for x, _ in calls] == sorted(x for x, _ in calls)
+
+
+class Uploads:
+    """
+    Метод сессии без сети: читает боди так же, как requests при отправке, отвечает по очереди из statuses
+    """
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.bodies, self.headers = list(), list()
+
+    def post(self, uri, params=None, data=None, headers=None, timeout=None):
+        self.bodies.append(b''.join(bytes(x) for x in data))
+        self.headers.append(headers)
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return make_response(status, body={'id': 1}, url=uri)
+
+
+def test_retry_resends_the_whole_body():
+    uploads = Uploads(503, 201)
+    r = BaseApiRequester()
+    r.retry_policy = RetryPolicy(max_attempts=2, backoff_base=0.001, backoff_max=0.001, methods=('POST',))
+    headers, body = r._encode_body(None, encoder(io.BytesIO(DATA)))
+    assert r._send_request(uploads.post, 'http://service/api/images/', headers, None, body).status_code == 201
+    assert uploads.bodies == [expected_body()] * 2
+    assert headers['Content-Length'] == str(len(expected_body()))
+
+
+def test_retry_of_one_shot_source_raises():
+    uploads = Uploads(503, 201)
+    r = BaseApiRequester()
+    r.retry_policy = RetryPolicy(max_attempts=2, backoff_base=0.001, backoff_max=0.001, methods=('POST',))
+    headers, body = r._encode_body(None, encoder(chunks(DATA)))
+    with pytest.raises(ValueError):
+        r._send_request(uploads.post, 'http://service/api/images/', headers, None, body)
+    assert uploads.bodies == [expected_body()]
+
+
+class Media(MediaRequester):
+    def __init__(self, uploads: Uploads):
+        super().__init__()
+        self.uploads = uploads
+
+    @property
+    def session(self):
+        return self.uploads
+
+
+def test_create_image_streams_uploaded_file():
+    uploads, calls = Uploads(201), list()
+    r = Media(uploads)
+    source = SimpleUploadedFile('photo.png', DATA)
+    _, json = r.create_image(r.IMAGE_OBJ_TYPES.PLACE, 7, 3, source, 'ignored.jpg', 'token',
+                             progress=lambda sent, total: calls.append((sent, total)))
+    assert json == {'id': 1}
+    body, headers = uploads.bodies[0], uploads.headers[0]
+    assert headers['Content-Length'] == str(len(body)) and calls[-1] == (len(body), len(body))
+    boundary = headers['Content-Type'].split('boundary=')[1].encode('ascii')
+    assert body.startswith(b'--' + boundary) and body.endswith(b'--' + boundary + b'--\r\n')
+    assert b'name="created_by"\r\n\r\n3\r\n' in body
+    assert b'filename="photo.png"\r\nContent-Type: image/png\r\n\r\n' + DATA + b'\r\n' in body
+
+
+class AsyncRequester(AsyncBaseApiRequester):
+    def __init__(self, handler):
+        super().__init__()
+        self.host = 'http://service'
+        self.retry_policy = RetryPolicy(max_attempts=2, backoff_base=0.001, backoff_max=0.001, methods=('POST',))
+        self._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    @property
+    def client(self):
+        return self._client
+
+
+@pytest.mark.parametrize('make_source, content_length', [
+    (lambda: io.BytesIO(DATA), True),
+    (Iterable, False),
+], ids=['file', 'iterable'])
+def test_async_upload_streams_body_on_every_attempt(make_source, content_length):
+    requests_seen = list()
+
+    def handler(request):
+        requests_seen.append((request.headers, request.content))
+        return httpx.Response(503 if len(requests_seen) == 1 else 201)
+
+    async def run():
+        r = AsyncRequester(handler)
+        headers, body = r._encode_body(None, encoder(make_source()))
+        return await r._send_request('POST', 'http://service/api/images/', headers, None, body)
+    assert asyncio.run(run()).status_code == 201
+    assert [content for _, content in requests_seen] == [expected_body()] * 2
+    for headers, _ in requests_seen:
+        if content_length:
+            assert headers['Content-Length'] == str(len(expected_body()))
+        else:
+            assert headers['Transfer-Encoding'] == 'chunked' and 'Content-Length' not in headers
+
+
+def test_async_iterator_yields_bytes_not_memoryviews():
+    async def collect():
+        return [chunk async for chunk in encoder(DATA).aiter()]
+    collected = asyncio.run(collect())
+    assert all(type(chunk) is bytes for chunk in collected)
+    assert b''.join(collected) == expected_body()
@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+from ApiRequesters.AsyncBaseApiRequester import AsyncBaseApiRequester
+
+ROWS = [{'id': i} for i in range(250)]
+
+
+def drf(limit, offset):
+    results = ROWS[offset:offset + limit]
+    return {'count': len(ROWS), 'next': 'next' if offset + limit < len(ROWS) else None, 'results': results}
+
+
+def bare(limit, offset):
+    return ROWS[offset:offset + limit]
+
+
+def ignores_pagination(rows):
+    return lambda limit, offset: rows
+
+
+SOURCES = {
+    'drf': (drf, ROWS),
+    'bare': (bare, ROWS),
+    'full list': (ignores_pagination(ROWS[:150]), ROWS[:150]),
+    'same page': (ignores_pagination(ROWS[:100]), ROWS[:100]),
+    'empty': (ignores_pagination([]), []),
+}
+
+
+class Pages:
+    """
+    get_page для _iter_paginated, запоминает запрошенные offset
+    """
+    def __init__(self, source):
+        self.source = source
+        self.offsets = list()
+
+    def __call__(self, limit, offset):
+        self.offsets.append(offset)
+        return None, self.source(limit, offset)
+
+    async def aget(self, limit, offset):
+        return self(limit, offset)
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('name', list(SOURCES))
+def test_iter_paginated(name, prefetch):
+    source, expected = SOURCES[name]
+    pages = Pages(source)
+    assert list(BaseApiRequester()._iter_paginated(pages, 100, prefetch)) == expected
+    assert len(pages.offsets) <= 4
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('name', list(SOURCES))
+def test_async_iter_paginated(name, prefetch):
+    source, expected = SOURCES[name]
+    pages = Pages(source)
+
+    async def collect():
+        return [item async for item in AsyncBaseApiRequester()._iter_paginated(pages.aget, 100, prefetch)]
+    assert asyncio.run(collect()) == expected
+    assert len(pages.offsets) <= 4
+
+
+def test_pages_are_requested_by_offset():
+    pages = Pages(drf)
+    list(BaseApiRequester()._iter_paginated(pages, 100, False))
+    assert pages.offsets == [0, 100, 200]
+    pages = Pages(bare)
+    list(BaseApiRequester()._iter_paginated(pages, 125, False))
+    # Последняя страница полная, так что нужен еще один запрос, чтобы увидеть пустую
+    assert pages.offsets == [0, 125, 250]
+
+
+def test_parse_page():
+    parse = BaseApiRequester._parse_page
+    assert parse([1, 2], 2) == ([1, 2], True)
+    assert parse([1, 2, 3], 2) == ([1, 2, 3], False)
+    assert parse([1], 2) == ([1], False)
+    assert parse({'results': [1, 2], 'next': None}, 2) == ([1, 2], False)
+    assert parse({'results': [1], 'next': 'url'}, 2) == ([1], True)
+    assert parse({'results': [], 'next': 'url'}, 2) == ([], False)
+    assert parse({'id': 1}, 2) == ([{'id': 1}], False)
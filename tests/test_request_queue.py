@@ -0,0 +1,94 @@
+import pytest
+from _fake_redis import FakeRedis
+from ApiRequesters import codec
+from ApiRequesters.Stats._request_queue import StatsRequestsQueue
+from ApiRequesters.Stats._spill import SpillBuffer
+
+
+class FakeStatsRequester:
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.sent = list()
+
+    def create_request_statistics_bulk(self, events, token):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.sent += events
+
+
+class FakeResponse:
+    status_code = 400
+    content = b'{}'
+    text = '{}'
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = StatsRequestsQueue()
+    queue.r = FakeRedis(rtt=0)
+    queue.spill = SpillBuffer(directory=str(tmp_path), fsync=False)
+    return queue
+
+
+def fill(queue, n):
+    for i in range(n):
+        queue.add_requests_stat('GET', i, 'endpoint', 0.01, 200, '2020-01-01T00:00:00', 'token')
+
+
+def queued_user_ids(queue):
+    return [codec.loads(x)['user_id'] for x in reversed(queue.r.lists.get('requests', []))]
+
+
+def test_fire_sends_in_order(queue):
+    r = FakeStatsRequester()
+    queue._get_requester = lambda: r
+    queue.fire_workers = 1
+    fill(queue, 10)
+    queue.fire()
+    assert [e['user_id'] for e in r.sent] == list(range(10))
+    assert len(queue) == 0
+    assert queue.metrics['fired'] == 10
+
+
+def test_failed_group_is_requeued(queue):
+    queue._get_requester = lambda: FakeStatsRequester(ConnectionError('stats is down'))
+    fill(queue, 10)
+    queue.fire()
+    assert queued_user_ids(queue) == list(range(10))
+    assert queue.metrics['requeued'] == 10
+    assert queue.metrics['dropped'] == 0
+
+    r = FakeStatsRequester()
+    queue._get_requester = lambda: r
+    # Один поток -- чтобы порядок отправки был виден в r.sent
+    queue.fire_workers = 1
+    queue.fire()
+    assert [e['user_id'] for e in r.sent] == list(range(10))
+    assert len(queue) == 0
+
+
+def test_requeued_batch_goes_back_before_newer_records(queue):
+    queue.batch_size = 5
+    queue._get_requester = lambda: FakeStatsRequester(ConnectionError('stats is down'))
+    fill(queue, 12)
+    queue.fire()
+    # Разбор остановился на первой пачке, она вернулась в хвост списка -- перед остальными
+    assert queued_user_ids(queue) == list(range(12))
+    assert queue.metrics['requeued'] == 5
+
+    r = FakeStatsRequester()
+    queue._get_requester = lambda: r
+    # Один поток -- чтобы порядок отправки был виден в r.sent
+    queue.fire_workers = 1
+    queue.fire()
+    assert [e['user_id'] for e in r.sent] == list(range(12))
+    assert len(queue) == 0
+
+
+def test_rejected_group_is_dropped(queue):
+    from ApiRequesters.exceptions import UnexpectedResponse
+    queue._get_requester = lambda: FakeStatsRequester(UnexpectedResponse(FakeResponse()))
+    fill(queue, 5)
+    queue.fire()
+    assert len(queue) == 0
+    assert queue.metrics['dropped'] == 5
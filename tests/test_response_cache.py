@@ -0,0 +1,206 @@
+import time
+import threading
+import pytest
+from ApiRequesters.exceptions import CircuitOpenError
+from ApiRequesters.invalidation import INVALIDATION_BUS, InvalidationEvent
+from ApiRequesters.response_cache import CachedResponse, TieredResponseCache
+from _fake_redis import FakeRedis
+from _responses import StubRequester, make_response
+
+KEY = ('GET', 'http://service/api/pins/', (), 'token')
+
+
+def entry(expires_in: float, stale_in: float, error_in: float, body: bytes = b'[1]') -> CachedResponse:
+    now = time.time()
+    return CachedResponse(body, {}, 0.01, now + expires_in, now + stale_in, now + error_in)
+
+
+@pytest.fixture
+def cache():
+    return TieredResponseCache(l2_enabled=False, beta=0)
+
+
+def test_fresh_entry_is_a_hit(cache):
+    cache.set(KEY, entry(10, 60, 600))
+    assert cache.get(KEY).body == b'[1]'
+    assert cache.metrics['l1']['hits'] == 1
+
+
+def test_stale_entry_is_served_within_stale_window(cache):
+    cache.set(KEY, entry(-1, 60, 600))
+    served = cache.get(KEY)
+    assert served is not None and served.is_stale()
+    assert cache.metrics['l1']['stale_hits'] == 1
+
+
+def test_entry_past_stale_window_is_a_miss_but_serves_stale_if_error(cache):
+    cache.set(KEY, entry(-2, -1, 600))
+    assert cache.get(KEY) is None
+    assert cache.get_stale_if_error(KEY).body == b'[1]'
+    assert cache.metrics['refresh']['stale_if_error'] == 1
+
+
+def test_entry_past_error_window_is_gone(cache):
+    cache.set(KEY, entry(-3, -2, -1))
+    assert cache.get(KEY) is None
+    assert cache.get_stale_if_error(KEY) is None
+
+
+def test_refresh_is_started_once_per_key(cache):
+    assert cache.begin_refresh(KEY)
+    assert not cache.begin_refresh(KEY)
+    cache.end_refresh(KEY)
+    assert cache.begin_refresh(KEY)
+
+
+class PinsRequester(StubRequester):
+    get_cache_ttls = {'pins/$': 10}
+    get_cache_stale_ttls = {'pins/$': 60}
+    get_cache_stale_if_error_ttls = {'pins/$': 600}
+
+
+@pytest.fixture
+def requester(cache):
+    version = {'n': 1}
+    refreshed = threading.Event()
+
+    def reply(path_suffix, headers):
+        refreshed.set()
+        return make_response(body=[{'id': 1, 'version': version['n']}], url=f'http://service/api/{path_suffix}')
+
+    r = PinsRequester(reply)
+    r.get_cache = cache
+    r.version, r.refreshed = version, refreshed
+    return r
+
+
+def age(requester, seconds: float):
+    """
+    Сдвинуть все записи кэша в прошлое
+    """
+    for key in list(requester.get_cache.l1._data):
+        cached = requester.get_cache.l1.get(key)
+        for field in ('expires_at', 'stale_until', 'error_until'):
+            setattr(cached, field, getattr(cached, field) - seconds)
+
+
+def test_stale_response_is_served_and_refreshed_in_background(requester):
+    assert requester._base_get('token', 'pins/', dict())[1][0]['version'] == 1
+    requester.version['n'] = 2
+    requester.refreshed.clear()
+    age(requester, 11)
+
+    _, stale = requester._base_get('token', 'pins/', dict())
+    assert stale[0]['version'] == 1
+    assert requester.refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while requester.get_cache.metrics['refresh']['completed'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert requester._base_get('token', 'pins/', dict())[1][0]['version'] == 2
+    assert len(requester.calls) == 2
+
+
+def test_cached_json_is_not_shared(requester):
+    _, first = requester._base_get('token', 'pins/', dict())
+    first[0]['version'] = 'mutated'
+    assert requester._base_get('token', 'pins/', dict())[1][0]['version'] == 1
+
+
+def test_stale_if_error_when_breaker_is_open(requester):
+    requester._base_get('token', 'pins/', dict())
+    age(requester, 100)
+    error = CircuitOpenError('service')
+    assert requester._get_breaker_fallback(error, 'token', 'pins/', dict())[1][0]['version'] == 1
+
+    age(requester, 600)
+    with pytest.raises(CircuitOpenError):
+        requester._get_breaker_fallback(error, 'token', 'pins/', dict())
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def shared_caches(n: int):
+    """
+    Кэши разных воркеров над одним редисом
+    """
+    redis, caches = FakeRedis(rtt=0), list()
+    for _ in range(n):
+        cache = TieredResponseCache(beta=0, compress_min=64)
+        cache._redis = redis
+        caches.append(cache)
+    return caches
+
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'[' + b'1, ' * 100 + b'1]'])
+def test_encode_decode_roundtrip(body):
+    original = CachedResponse(body, {'ETag': '"v1"'}, 0.25, time.time() + 10, time.time() + 20, time.time() + 30)
+    data = original.encode(compress_min=64)
+    assert data[:1] == (b'z' if len(body) >= 64 else b'r')
+    decoded = CachedResponse.decode(data)
+    assert decoded.body == body and decoded.headers == {'ETag': '"v1"'} and decoded.delta == 0.25
+    for name in ('expires_at', 'stale_until', 'error_until'):
+        assert getattr(decoded, name) == pytest.approx(getattr(original, name), abs=0.001)
+
+
+def test_l2_hit_in_another_worker():
+    a, b = shared_caches(2)
+    a.set(KEY, entry(10, 10, 10))
+    assert b.get(KEY).body == b'[1]'
+    assert b.metrics['l1']['misses'] == 1 and b.metrics['l2']['hits'] == 1
+    # Найденное в редисе легло в L1
+    assert b.get(KEY) is not None and b.metrics['l1']['hits'] == 1
+
+
+def test_entity_invalidation_removes_l2_entries_through_index():
+    a, b = shared_caches(2)
+    other = ('GET', 'http://service/api/pins/2/', (), 'token')
+    places = ('GET', 'http://service/api/places/1/', (), 'token')
+    for key in (KEY, other, places):
+        a.set(key, entry(10, 10, 10))
+    a.invalidate(InvalidationEvent.from_write('http://service', 'pins/2/', origin=INVALIDATION_BUS.origin))
+    wait_for(lambda: not a._pending)
+    assert a.metrics['l2']['invalidated'] == 2
+    assert b.get(KEY) is None and b.get(other) is None
+    assert b.get(places) is not None
+    assert a.get(places) is not None and a.get(KEY) is None
+
+
+def test_foreign_event_only_clears_l1():
+    a, b = shared_caches(2)
+    a.set(KEY, entry(10, 10, 10))
+    a.invalidate(InvalidationEvent.from_write('http://service', 'pins/', origin='other-process'))
+    assert a.metrics['l2']['invalidated'] == 0
+    assert a.l1.get(KEY) is None and b.get(KEY) is not None
+
+
+def test_writes_do_not_touch_redis_when_cache_is_unused():
+    cache = shared_caches(1)[0]
+    for i in range(5):
+        cache.invalidate(InvalidationEvent.from_write('http://service', f'pins/{i}/', origin=INVALIDATION_BUS.origin))
+    assert cache._redis.round_trips == 0 and not cache._pending
+
+
+def test_invalidation_runs_off_the_writer_thread_and_hides_pending_keys():
+    a, b = shared_caches(2)
+    a.set(KEY, entry(10, 10, 10))
+    release, threads = threading.Event(), list()
+    delete_shared = a._delete_shared
+
+    def slow_delete(event):
+        threads.append(threading.current_thread())
+        release.wait(5)
+        delete_shared(event)
+    a._delete_shared = slow_delete
+    a.invalidate(InvalidationEvent.from_write('http://service', 'pins/', origin=INVALIDATION_BUS.origin))
+    # Пока удаление из редиса не закончилось, запись оттуда не берется даже тем, кто ее записал
+    assert a.get(KEY) is None
+    wait_for(lambda: threads)
+    assert threads[0] is not threading.current_thread()
+    release.set()
+    wait_for(lambda: not a._pending)
+    assert b.get(KEY) is None
@@ -0,0 +1,92 @@
+import threading
+from ApiRequesters.singleflight import SingleFlight
+from _responses import StubRequester, make_response
+
+
+def run_concurrently(n, fn):
+    results, errors = [None] * n, [None] * n
+    barrier = threading.Barrier(n)
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+    threads = [threading.Thread(target=worker, args=(i, )) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results, errors
+
+
+def test_followers_share_leader_result():
+    flight = SingleFlight()
+    release, calls = threading.Event(), list()
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    def call():
+        return flight.do('key', slow)
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = run_concurrently(5, call)
+    assert errors == [None] * 5
+    assert [value for value, _ in results] == [42] * 5
+    assert len(calls) == 1
+    assert flight.shared == 4
+
+
+def test_leader_error_is_raised_in_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError('service is down')
+
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = run_concurrently(5, lambda: flight.do('key', failing))
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flight.calls == 1
+    # После ошибки ключ свободен, следующий вызов идет заново
+    assert flight.do('key', lambda: 'ok') == ('ok', False)
+
+
+def test_coalesced_gets_return_own_json_copies():
+    release = threading.Event()
+
+    def reply(path_suffix, headers):
+        release.wait(5)
+        return make_response(body={'id': 1, 'tags': ['a']})
+
+    r = StubRequester(reply)
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    results, errors = run_concurrently(4, lambda: r._base_get('token', 'places/1/', dict()))
+    assert errors == [None] * 4
+    assert len(r.calls) == 1
+    jsons = [res_json for _, res_json in results]
+    jsons[0]['tags'].append('mutated')
+    assert all(j['tags'] == ['a'] for j in jsons[1:])
+
+
+def test_coalesced_get_error_reaches_every_caller():
+    from ApiRequesters.exceptions import UnexpectedResponse
+    release = threading.Event()
+
+    def reply(path_suffix, headers):
+        release.wait(5)
+        return make_response(status_code=500, body={'detail': 'boom'})
+
+    r = StubRequester(reply)
+    timer = threading.Timer(0.2, release.set)
+    timer.start()
+    _, errors = run_concurrently(4, lambda: r._base_get('token', 'places/1/', dict()))
+    assert all(isinstance(e, UnexpectedResponse) and e.code == 500 for e in errors)
+    assert len(r.calls) == 1
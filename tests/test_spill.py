@@ -0,0 +1,53 @@
+import pytest
+from ApiRequesters.Stats._spill import SpillBuffer
+
+
+def payloads(start, stop):
+    return [str(i).encode() for i in range(start, stop)]
+
+
+@pytest.fixture
+def spill(tmp_path):
+    return SpillBuffer(directory=str(tmp_path), ring_size=3, flush_interval=60, segment_bytes=8, fsync=False)
+
+
+def test_replay_keeps_order_across_segments_and_ring(spill):
+    spill.append(*payloads(0, 4))
+    spill.append(*payloads(4, 8))
+    spill.append(b'8')
+    assert len(spill._segments) == 2 and list(spill._ring) == [b'8']
+    assert len(spill) == 9
+    sent = []
+    assert spill.replay(sent.extend, batch_size=3) == 9
+    assert sent == payloads(0, 9)
+    assert not spill.is_active and len(spill) == 0
+
+
+def test_failed_sink_compacts_segment_and_replay_continues(spill):
+    spill.append(*payloads(0, 6))
+    sent, calls = [], []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) == 2:
+            raise ConnectionError('redis down')
+        sent.extend(batch)
+
+    assert spill.replay(flaky, batch_size=2) == 0
+    assert sent == payloads(0, 2)
+    assert spill.metrics['compactions'] == 1 and len(spill) == 4
+    spill.append(b'6')
+    assert spill.replay(sent.extend, batch_size=2) == 5
+    assert sent == payloads(0, 7)
+
+
+def test_max_bytes_drops_oldest_segments(tmp_path):
+    spill = SpillBuffer(directory=str(tmp_path), ring_size=2, flush_interval=60, segment_bytes=4, max_bytes=8,
+                        fsync=False)
+    for i in range(0, 10, 2):
+        spill.append(*payloads(i, i + 2))
+    assert spill.metrics['dropped'] == 6
+    assert len(list(tmp_path.iterdir())) == 2
+    sent = []
+    spill.replay(sent.extend)
+    assert sent == payloads(6, 10)
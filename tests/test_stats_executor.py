@@ -0,0 +1,90 @@
+import time
+import threading
+from ApiRequesters.Stats._executor import StatsExecutor
+from ApiRequesters.Stats._batcher import StatsBatcher
+
+
+def test_counters_add_up_under_concurrent_submits():
+    executor = StatsExecutor(workers=4, queue_size=100000, overflow='drop')
+    n_threads, per_thread = 8, 500
+
+    def produce():
+        for _ in range(per_thread):
+            executor.submit(lambda: None)
+    threads = [threading.Thread(target=produce) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert executor.flush(timeout=10)
+    stats = executor.stats
+    assert stats['submitted'] == stats['completed'] == n_threads * per_thread
+    executor.shutdown()
+
+
+def test_overflow_is_spilled_then_dropped():
+    executor = StatsExecutor(workers=1, queue_size=1, overflow='spill')
+    release = threading.Event()
+    executor.submit(release.wait)
+    spilled = list()
+    while executor.submit(lambda: None, spill=lambda: spilled.append(1)):
+        pass
+    executor.submit(lambda: None)
+    release.set()
+    executor.flush(timeout=5)
+    assert executor.stats['spilled'] == len(spilled) == 1
+    assert executor.stats['dropped'] == 1
+    executor.shutdown()
+
+
+class FakeStatsRequester:
+    def __init__(self):
+        self.batches = list()
+
+    def create_request_statistics_bulk(self, events, token):
+        self.batches.append((token, list(events)))
+
+
+def test_batcher_flush_counts_sent_events():
+    batcher = StatsBatcher(enabled=True, max_items=3, max_delay_ms=60000)
+    r = FakeStatsRequester()
+    batcher._get_requester = lambda: r
+    for i in range(7):
+        batcher.add('request', 'token', {'user_id': i})
+    batcher.flush()
+    assert sorted(e['user_id'] for _, events in r.batches for e in events) == list(range(7))
+    assert batcher.stats == {'buffered': 0, 'sent_batches': len(r.batches), 'sent_events': 7, 'failed_events': 0}
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_batcher_thread_survives_unexpected_errors():
+    batcher = StatsBatcher(enabled=True, max_items=2, max_delay_ms=10)
+    r = FakeStatsRequester()
+    batcher._get_requester = lambda: r
+    # Неизвестный тип статы -- AttributeError, а не BaseApiRequestError
+    batcher.add('unknown', 'token', {'user_id': 0})
+    batcher.add('unknown', 'token', {'user_id': 1})
+    assert wait_for(lambda: batcher.stats['failed_events'] == 2)
+    assert batcher._thread.is_alive()
+    for i in range(6):
+        batcher.add('request', 'token', {'user_id': i})
+    assert wait_for(lambda: batcher.stats['sent_events'] == 6)
+    assert batcher.stats['buffered'] == 0
+
+
+def test_batcher_restarts_dead_thread():
+    batcher = StatsBatcher(enabled=True, max_items=2, max_delay_ms=10)
+    r = FakeStatsRequester()
+    batcher._get_requester = lambda: r
+    batcher._thread = threading.Thread(target=lambda: None)
+    batcher._thread.start()
+    batcher._thread.join()
+    batcher.add('request', 'token', {'user_id': 0})
+    batcher.add('request', 'token', {'user_id': 1})
+    assert wait_for(lambda: batcher.stats['sent_events'] == 2)
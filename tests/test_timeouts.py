@@ -0,0 +1,163 @@
+import time
+import asyncio
+import httpx
+import pytest
+import requests
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+from ApiRequesters.AsyncBaseApiRequester import AsyncBaseApiRequester
+from ApiRequesters.exceptions import DeadlineExceeded, RequestError
+from ApiRequesters.timeouts import RetryPolicy, clamp_timeout, deadline, remaining_time
+from _responses import make_response
+
+
+class FixedBackoff(RetryPolicy):
+    """
+    Политика без джиттера и без проверки дедлайна -- чтобы пауза гарантированно его пересекла
+    """
+    def __init__(self, backoff: float, **kwargs):
+        super().__init__(**kwargs)
+        self.backoff = backoff
+
+    def get_backoff(self, attempt):
+        return self.backoff
+
+
+class Server:
+    """
+    Метод сессии без сети: отвечает по очереди из replies (код ответа или исключение), запоминает таймауты
+    """
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.timeouts = list()
+
+    def reply(self, timeout):
+        self.timeouts.append(timeout)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, BaseException):
+            raise reply
+        return make_response(reply)
+
+    def method(self, name):
+        def call(uri, params=None, data=None, headers=None, timeout=None):
+            return self.reply(timeout)
+        call.__name__ = name
+        return call
+
+
+@pytest.fixture
+def requester():
+    r = BaseApiRequester()
+    r.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0.001, backoff_max=0.001)
+    return r
+
+
+def send(r, server, name='get', timeout=None):
+    return r._send_request(server.method(name), 'http://service/api/pins/', None, None, None, timeout)
+
+
+def test_policy_retries_only_idempotent_methods_and_transient_errors():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry('GET', 0) and policy.should_retry('get', 1, 503)
+    assert not policy.should_retry('GET', 2, 503)
+    assert not policy.should_retry('POST', 0) and not policy.should_retry('DELETE', 0, 503)
+    assert not policy.should_retry('GET', 0, 500) and not policy.should_retry('GET', 0, 404)
+    assert RetryPolicy(methods=('GET', 'DELETE')).should_retry('DELETE', 0, 502)
+
+
+def test_backoff_is_jittered_and_fits_deadline():
+    policy = RetryPolicy(backoff_base=0.1, backoff_max=0.3)
+    assert all(0 <= policy.get_backoff(3) <= 0.3 for _ in range(100))
+    with deadline(0.001):
+        assert RetryPolicy(backoff_base=10, backoff_max=10).get_backoff(0) is None
+
+
+def test_get_is_retried_on_5xx_and_connection_errors(requester):
+    server = Server(503, requests.exceptions.ConnectionError(), 200)
+    assert send(requester, server).status_code == 200
+    assert len(server.timeouts) == 3
+
+
+def test_attempts_are_capped(requester):
+    server = Server(requests.exceptions.ConnectionError())
+    with pytest.raises(RequestError):
+        send(requester, server)
+    assert len(server.timeouts) == 3
+    server = Server(503)
+    assert send(requester, server).status_code == 503
+    assert len(server.timeouts) == 3
+
+
+def test_post_is_not_retried(requester):
+    server = Server(503, 201)
+    assert send(requester, server, 'post').status_code == 503
+    assert len(server.timeouts) == 1
+
+
+def test_clamp_timeout():
+    assert clamp_timeout(1, 2) == (1, 2)
+    with deadline(0.5):
+        connect, read = clamp_timeout(1, 0.1)
+        assert connect <= 0.5 and read == 0.1
+        assert clamp_timeout(None, None)[1] <= 0.5
+        # Вложенный дедлайн не продлевает внешний
+        with deadline(10):
+            assert remaining_time() <= 0.5
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            clamp_timeout(1, 1)
+
+
+def test_request_timeouts_are_clamped_to_deadline(requester):
+    requester.connect_timeout, requester.read_timeout = 5, 10
+    server = Server(200)
+    with deadline(0.5):
+        send(requester, server)
+    connect, read = server.timeouts[0]
+    assert 0 < connect <= 0.5 and 0 < read <= 0.5
+    send(requester, server, timeout=(1, 2))
+    assert server.timeouts[1] == (1, 2)
+
+
+def test_backoff_past_deadline_returns_last_result(requester):
+    requester.retry_policy = FixedBackoff(0.05)
+    server = Server(503, 200)
+    with deadline(0.02):
+        assert send(requester, server).status_code == 503
+    assert len(server.timeouts) == 1
+    server = Server(requests.exceptions.ConnectionError(), 200)
+    with deadline(0.02):
+        with pytest.raises(RequestError):
+            send(requester, server)
+    assert len(server.timeouts) == 1
+
+
+class AsyncRequester(AsyncBaseApiRequester):
+    def __init__(self, handler):
+        super().__init__()
+        self.host = 'http://service'
+        self.retry_policy = RetryPolicy(max_attempts=3, backoff_base=0.001, backoff_max=0.001)
+        self._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    @property
+    def client(self):
+        return self._client
+
+
+def test_async_retries_and_deadline():
+    statuses = [503, 502, 200]
+    calls = list()
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    async def run():
+        r = AsyncRequester(handler)
+        assert (await r._send_request('GET', 'http://service/api/pins/', None, None, None)).status_code == 200
+        assert (await r._send_request('POST', 'http://service/api/pins/', None, None, None)).status_code == 200
+        calls.clear()
+        r.retry_policy = FixedBackoff(0.05)
+        with deadline(0.02):
+            assert (await r._send_request('GET', 'http://service/api/pins/', None, None, None)).status_code == 503
+    asyncio.run(run())
+    assert calls == ['GET']
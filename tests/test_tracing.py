@@ -0,0 +1,112 @@
+import pytest
+from _fake_redis import FakeRedis
+from ApiRequesters import codec
+from ApiRequesters.BaseApiRequester import BaseApiRequester
+from ApiRequesters.Stats._executor import StatsExecutor
+from ApiRequesters.Stats._request_queue import StatsRequestsQueue
+from ApiRequesters.Stats._spill import SpillBuffer
+from ApiRequesters.tracing import TRACER, InMemoryExporter, SpanContext
+from _responses import make_response
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = InMemoryExporter()
+    monkeypatch.setattr(TRACER, 'enabled', True)
+    monkeypatch.setattr(TRACER, 'sample_rate', 1)
+    monkeypatch.setattr(TRACER, 'exporter', exporter)
+    return exporter
+
+
+class TracedRequester(BaseApiRequester):
+    def __init__(self):
+        super().__init__()
+        self.host = 'http://service'
+        self.sent_headers = list()
+
+    def _send_request(self, method, uri, headers, params, body, timeout=None):
+        self.sent_headers.append(headers)
+        return make_response(503 if 'broken' in uri else 200, url=uri)
+
+
+def test_outgoing_request_gets_traceparent_and_client_span(exporter):
+    r = TracedRequester()
+    with TRACER.span('handler') as handler:
+        r.make_request('GET', 'places/12/')
+        r.make_request('GET', 'broken/')
+    sent = SpanContext.from_traceparent(r.sent_headers[0]['traceparent'])
+    client, broken = exporter.get_trace(handler.context.trace_id)[:2]
+    assert sent.trace_id == handler.context.trace_id and sent.span_id == client.context.span_id
+    assert client.kind == 'client' and client.parent_id == handler.context.span_id
+    assert client.name == 'GET places/{id}/'
+    assert client.attributes['http.host'] == 'http://service' and client.attributes['http.path'] == 'places/12/'
+    assert client.attributes['http.status_code'] == 200 and client.status == 'ok'
+    assert broken.attributes['http.status_code'] == 503 and broken.status == 'Server error 503'
+
+
+def test_no_spans_or_headers_when_disabled(exporter, monkeypatch):
+    monkeypatch.setattr(TRACER, 'enabled', False)
+    r = TracedRequester()
+    r.make_request('GET', 'places/')
+    assert r.sent_headers == [None] and exporter.spans == []
+
+
+def test_context_is_carried_into_stats_executor_tasks(exporter):
+    executor = StatsExecutor(workers=1, queue_size=10)
+    seen = list()
+    with TRACER.span('handler') as handler:
+        executor.submit(lambda: seen.append(TRACER.get_traceparent()))
+    executor.submit(lambda: seen.append(TRACER.get_traceparent()))
+    assert executor.flush(timeout=5)
+    assert seen == [handler.context.traceparent, None]
+    executor.shutdown()
+
+
+class FakeStatsRequester:
+    def __init__(self):
+        self.sent = list()
+
+    def create_request_statistics_bulk(self, events, token):
+        self.sent.append(TRACER.get_traceparent())
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = StatsRequestsQueue()
+    queue.r = FakeRedis(rtt=0)
+    queue.spill = SpillBuffer(directory=str(tmp_path), fsync=False)
+    queue.fire_workers = 1
+    return queue
+
+
+def add_stat(queue, user_id):
+    queue.add_requests_stat('GET', user_id, 'endpoint', 0.01, 200, '2020-01-01T00:00:00', 'token')
+
+
+def test_queue_payload_carries_traceparent_into_fire_span(exporter, queue):
+    with TRACER.span('handler') as handler:
+        add_stat(queue, 1)
+        add_stat(queue, 2)
+    assert [codec.loads(x)['traceparent'] for x in queue.r.lists['requests']] == [handler.context.traceparent] * 2
+    r = FakeStatsRequester()
+    queue._get_requester = lambda: r
+    queue.fire()
+    fire = [s for s in exporter.spans if s.name == 'stats.queue.fire']
+    assert len(fire) == 1 and fire[0].context.trace_id == handler.context.trace_id
+    assert fire[0].parent_id == handler.context.span_id and fire[0].attributes['stats.events'] == 2
+    assert SpanContext.from_traceparent(r.sent[0]).span_id == fire[0].context.span_id
+
+
+def test_batch_from_many_traces_links_them(exporter, queue):
+    handlers = list()
+    for user_id in range(3):
+        with TRACER.span('handler') as handler:
+            add_stat(queue, user_id)
+        handlers.append(handler)
+    add_stat(queue, 3)
+    queue._get_requester = FakeStatsRequester
+    queue.fire()
+    fire = [s for s in exporter.spans if s.name == 'stats.queue.fire'][0]
+    assert fire.parent_id is None
+    assert fire.context.trace_id not in {h.context.trace_id for h in handlers}
+    assert sorted(link.traceparent for link in fire.links) == sorted(h.context.traceparent for h in handlers)
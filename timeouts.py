@@ -0,0 +1,119 @@
+import os
+import time
+import random
+import contextvars
+from contextlib import contextmanager
+from typing import Iterable, Tuple, Union, Optional
+from .exceptions import DeadlineExceeded
+
+
+# Абсолютный дедлайн текущего запроса/задачи по time.monotonic(), None -- без дедлайна
+_DEADLINE: contextvars.ContextVar = contextvars.ContextVar('requesters_deadline', default=None)
+
+
+def get_deadline() -> Union[float, None]:
+    """
+    Абсолютный дедлайн (по time.monotonic) в текущем контексте
+    """
+    return _DEADLINE.get()
+
+
+def remaining_time() -> Union[float, None]:
+    """
+    Сколько секунд осталось до дедлайна, None -- если дедлайна нет
+    """
+    deadline_at = _DEADLINE.get()
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+@contextmanager
+def deadline_at(at: Union[float, None]):
+    """
+    Дедлайн по абсолютному времени time.monotonic(). Вложенный дедлайн не может быть позже внешнего
+    """
+    current = _DEADLINE.get()
+    if at is None or (current is not None and current <= at):
+        yield
+        return
+    token = _DEADLINE.set(at)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+@contextmanager
+def deadline(seconds: Union[float, None]):
+    """
+    Бюджет времени на все запросы внутри блока: таймауты каждого запроса урезаются до оставшегося времени,
+    а когда он кончился, запросы сразу падают с DeadlineExceeded
+        with deadline(0.8):
+            places = r.get_places(token)
+            pins = a.get_pins(token)
+    @param seconds: Бюджет в секундах, None -- без ограничения
+    """
+    with deadline_at(None if seconds is None else time.monotonic() + seconds):
+        yield
+
+
+def clamp_timeout(connect: Optional[float], read: Optional[float]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Таймауты запроса с учетом дедлайна
+    @param connect: Таймаут на соединение
+    @param read: Таймаут на чтение
+    @return: (connect, read), урезанные до оставшегося бюджета
+    """
+    left = remaining_time()
+    if left is None:
+        return connect, read
+    if left <= 0:
+        raise DeadlineExceeded()
+    return (left if connect is None else min(connect, left)), (left if read is None else min(read, left))
+
+
+class RetryPolicy:
+    """
+    Политика повторов: только идемпотентные методы, экспоненциальная задержка с джиттером (full jitter)
+    """
+    def __init__(self, max_attempts: int = int(os.getenv('REQUESTERS_RETRY_ATTEMPTS', 3)),
+                 backoff_base: float = float(os.getenv('REQUESTERS_RETRY_BACKOFF_BASE', 0.05)),
+                 backoff_max: float = float(os.getenv('REQUESTERS_RETRY_BACKOFF_MAX', 1)),
+                 methods: Iterable[str] = tuple(os.getenv('REQUESTERS_RETRY_METHODS', 'GET').split(',')),
+                 statuses: Iterable[int] = (502, 503, 504)):
+        """
+        @param max_attempts: Всего попыток, включая первую
+        @param backoff_base: Задержка перед первым повтором (верхняя граница), в секундах
+        @param backoff_max: Максимальная задержка между попытками
+        @param methods: Какие HTTP-методы можно повторять
+        @param statuses: На какие коды ответа повторять
+        """
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.methods = frozenset(x.strip().upper() for x in methods if x.strip())
+        self.statuses = frozenset(statuses)
+
+    def should_retry(self, method: str, attempt: int, status_code: Union[int, None] = None) -> bool:
+        """
+        Повторять ли запрос
+        @param method: HTTP-метод
+        @param attempt: Номер сделанной попытки, с нуля
+        @param status_code: Код ответа, None -- запрос упал с ошибкой соединения/таймаутом
+        """
+        if attempt + 1 >= self.max_attempts or method.upper() not in self.methods:
+            return False
+        return status_code is None or status_code in self.statuses
+
+    def get_backoff(self, attempt: int) -> Union[float, None]:
+        """
+        Задержка перед следующей попыткой, None -- если она не влезает в дедлайн
+        @param attempt: Номер сделанной попытки, с нуля
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        left = remaining_time()
+        if left is not None and delay >= left:
+            return None
+        return delay
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
@@ -0,0 +1,249 @@
+import os
+import re
+import time
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Union
+
+
+# traceparent по W3C Trace Context: версия-trace_id-span_id-флаги
+_TRACEPARENT = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+
+
+class SpanContext:
+    """
+    То, что передается между сервисами: айди трейса, айди спана и флаг семплирования
+    """
+    __slots__ = ('trace_id', 'span_id', 'sampled')
+
+    def __init__(self, trace_id: str, span_id: str, sampled: bool = True):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+    @property
+    def traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-{"01" if self.sampled else "00"}'
+
+    @classmethod
+    def from_traceparent(cls, header: Union[str, None]) -> Union['SpanContext', None]:
+        """
+        Разбор хэдера traceparent, None -- если его нет или он битый
+        """
+        match = _TRACEPARENT.match((header or '').strip().lower())
+        if match is None:
+            return None
+        version, trace_id, span_id, flags = match.groups()
+        if version == 'ff' or trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+            return None
+        return cls(trace_id, span_id, bool(int(flags, 16) & 1))
+
+    def __repr__(self):
+        return f'SpanContext({self.traceparent})'
+
+
+class Span:
+    """
+    Отрезок работы внутри трейса (вызов сервиса, обработка запроса, разбор очереди)
+    """
+    __slots__ = ('name', 'kind', 'context', 'parent_id', 'attributes', 'links', 'start_time', 'end_time', 'status',
+                 '_started_at')
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Union[str, None] = None, kind: str = 'internal',
+                 attributes: Union[Dict[str, Any], None] = None):
+        self.name = name
+        self.kind = kind
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes or dict()
+        # Контексты других трейсов, с которыми связан спан (например, события статы, отправленные одной пачкой)
+        self.links: List[SpanContext] = list()
+        self.start_time = time.time()
+        self.end_time = None
+        # ok, либо описание ошибки
+        self.status = 'ok'
+        self._started_at = time.perf_counter()
+
+    @property
+    def duration(self) -> Union[float, None]:
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: Exception):
+        self.status = f'{type(error).__name__}: {error}'
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = self.start_time + time.perf_counter() - self._started_at
+
+    def __repr__(self):
+        return f'Span({self.name!r}, {self.context.traceparent}, parent={self.parent_id})'
+
+
+class InMemoryExporter:
+    """
+    Экспортер, который копит законченные спаны в списке (для тестов и отладки)
+    """
+    def __init__(self, maxlen: int = 10000):
+        self.maxlen = maxlen
+        self.spans: List[Span] = list()
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+            if len(self.spans) > self.maxlen:
+                del self.spans[:len(self.spans) - self.maxlen]
+
+    def get_trace(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return [s for s in self.spans if s.context.trace_id == trace_id]
+
+    def clear(self):
+        with self._lock:
+            self.spans = list()
+
+
+_CURRENT = contextvars.ContextVar('requesters_span_context', default=None)
+
+
+class Tracer:
+    """
+    Трейсер реквестеров: открывает спаны, держит текущий контекст в contextvar и пробрасывает его в traceparent.
+    Выключенный стоит одну проверку атрибута enabled на вызов
+    """
+    def __init__(self, enabled: bool = os.getenv('REQUESTERS_TRACING', 'False') == 'True',
+                 sample_rate: float = float(os.getenv('REQUESTERS_TRACE_SAMPLE_RATE', 1)),
+                 exporter: Any = None):
+        """
+        @param enabled: Создавать ли спаны и слать ли traceparent
+        @param sample_rate: Доля семплируемых новых трейсов (входящий traceparent решает сам за себя)
+        @param exporter: Объект с методом export(span), по умолчанию InMemoryExporter
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter if exporter is not None else InMemoryExporter()
+
+    @staticmethod
+    def _new_id(bits: int) -> str:
+        value = 0
+        while not value:
+            value = random.getrandbits(bits)
+        return f'{value:0{bits // 4}x}'
+
+    @staticmethod
+    def current_context() -> Union[SpanContext, None]:
+        """
+        Контекст текущего спана, либо None, если трейса нет
+        """
+        return _CURRENT.get()
+
+    def get_traceparent(self) -> Union[str, None]:
+        """
+        traceparent текущего спана, для полезных нагрузок, уходящих из процесса (очередь статы)
+        """
+        context = _CURRENT.get()
+        return None if context is None else context.traceparent
+
+    @staticmethod
+    def extract(carrier: Union[Dict[str, Any], None]) -> Union[SpanContext, None]:
+        """
+        Контекст из входящих хэдеров, либо из request.META джанги
+        """
+        if not carrier:
+            return None
+        return SpanContext.from_traceparent(carrier.get('traceparent') or carrier.get('HTTP_TRACEPARENT'))
+
+    @staticmethod
+    def inject(headers: Union[Dict[str, Any], None]) -> Union[Dict[str, Any], None]:
+        """
+        Хэдеры с traceparent текущего спана (копия, исходный словарь не меняется)
+        """
+        context = _CURRENT.get()
+        if context is None:
+            return headers
+        return {**(headers or dict()), 'traceparent': context.traceparent}
+
+    def start_span(self, name: str, kind: str = 'internal', parent: Union[SpanContext, None] = None,
+                   attributes: Union[Dict[str, Any], None] = None) -> Span:
+        """
+        Новый спан, дочерний к parent (по умолчанию -- к текущему). Текущим он не становится, см. span()
+        """
+        parent = parent if parent is not None else _CURRENT.get()
+        if parent is None:
+            context = SpanContext(self._new_id(128), self._new_id(64), random.random() < self.sample_rate)
+            return Span(name, context, None, kind, attributes)
+        return Span(name, SpanContext(parent.trace_id, self._new_id(64), parent.sampled), parent.span_id, kind,
+                    attributes)
+
+    def end_span(self, span: Span, error: Union[Exception, None] = None):
+        """
+        Закрытие спана и отправка в экспортер (только семплированные)
+        """
+        if error is not None:
+            span.set_error(error)
+        span.end()
+        if span.context.sampled:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                print(f'=== TRACE EXPORT ERROR {str(e)} ===')
+
+    @contextmanager
+    def span(self, name: str, kind: str = 'internal', parent: Union[SpanContext, None] = None,
+             attributes: Union[Dict[str, Any], None] = None) -> Iterator[Union[Span, None]]:
+        """
+        Спан на время блока, внутри него он текущий. Если трейсинг выключен, отдает None
+        """
+        if not self.enabled:
+            yield None
+            return
+        span = self.start_span(name, kind, parent, attributes)
+        token = _CURRENT.set(span.context)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            _CURRENT.reset(token)
+
+    @contextmanager
+    def batch_span(self, name: str, traceparents: List[Union[str, None]],
+                   attributes: Union[Dict[str, Any], None] = None) -> Iterator[Union[Span, None]]:
+        """
+        Спан работы над пачкой событий из разных трейсов (батчер и очередь статы). Если трейс у всех один,
+        спан становится его дочерним, иначе открывает новый трейс со ссылками (links) на все исходные
+        """
+        if not self.enabled:
+            yield None
+            return
+        contexts = {c.traceparent: c for c in map(SpanContext.from_traceparent, traceparents) if c is not None}
+        trace_ids = {c.trace_id for c in contexts.values()}
+        parent = next(iter(contexts.values())) if len(trace_ids) == 1 else None
+        with self.use_context(None), self.span(name, parent=parent, attributes=attributes) as span:
+            if parent is None:
+                span.links = list(contexts.values())
+            yield span
+
+    @contextmanager
+    def use_context(self, context: Union[SpanContext, None]) -> Iterator[None]:
+        """
+        Сделать контекст текущим на время блока (например, в фоновом потоке, куда его передали явно)
+        """
+        token = _CURRENT.set(context)
+        try:
+            yield
+        finally:
+            _CURRENT.reset(token)
+
+
+TRACER = Tracer()
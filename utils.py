@@ -1,3 +1,9 @@
+import os
+import base64
+from redis import StrictRedis
+from .codec import loads
+
+
 def get_token_from_request(request):
     try:
         token = request.META['HTTP_AUTHORIZATION']
@@ -7,3 +13,29 @@ def get_token_from_request(request):
             return token[7:]
     except (IndexError, KeyError):
         return None
+
+
+def get_jwt_claims(token: str) -> dict:
+    """
+    Пейлоад JWT без проверки подписи
+    @param token: Токен
+    @return: Словарь клеймов, пустой, если токен не похож на JWT
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = loads(base64.urlsafe_b64decode(payload.encode('ascii')))
+    except (AttributeError, IndexError, ValueError, UnicodeError):
+        return dict()
+    return claims if isinstance(claims, dict) else dict()
+
+
+def get_redis_from_env(**kwargs) -> StrictRedis:
+    """
+    Клиент редиса по REDIS_URL (localhost -- локальный редис, db 1), как у очереди статы
+    @param kwargs: Доп. параметры клиента, например socket_timeout
+    """
+    redis_url = os.getenv('REDIS_URL', 'localhost')
+    if redis_url == 'localhost':
+        return StrictRedis(db=1, **kwargs)
+    return StrictRedis.from_url(redis_url, **kwargs)